@@ -1,23 +1,43 @@
 import cupy as cp
 
-apply_rules_multi_kernel = cp.RawKernel(r'''
+# Neuron idx tries its rules [rule_ptr[idx], rule_ptr[idx + 1]) in priority order and applies
+# the first one whose condition and consume are met, once per tick as in the other engines.
+# Regular-expression rules (kind 3) check their (base, modulus, exact) predicates
+# [pred_ptr[r], pred_ptr[r + 1]); fire_counts[idx] is 1 if the neuron fired.
+apply_rule_table_kernel = cp.RawKernel(r'''
 extern "C" __global__
-void apply_rules_multi(long long* spike_counts, const long long* thresholds, const long long* consumes,
-                       const long long* produces, const long long* delays, long long* fire_counts, long long num_neurons) {
+void apply_rule_table(long long* spike_counts, const long long* rule_ptr, const signed char* kinds,
+                      const long long* thresholds, const long long* consumes,
+                      const long long* pred_ptr, const long long* pred_bases,
+                      const long long* pred_moduli, const bool* pred_exact,
+                      long long* selected, long long* fire_counts, long long num_neurons) {
     long long idx = blockDim.x * blockIdx.x + threadIdx.x;
     if (idx >= num_neurons) return;
 
     long long spikes = spike_counts[idx];
-    long long threshold = thresholds[idx];
-    long long consume = consumes[idx];
+    selected[idx] = -1;
+    fire_counts[idx] = 0;
 
-    if (spikes >= threshold && spikes >= consume) {
-        long long times = spikes / consume;
-        spike_counts[idx] -= times * consume;
-        fire_counts[idx] = times;
-    } else {
-        fire_counts[idx] = 0;
+    for (long long r = rule_ptr[idx]; r < rule_ptr[idx + 1]; r++) {
+        bool met = false;
+        if (kinds[r] == 0) {
+            met = spikes >= thresholds[r];
+        } else if (kinds[r] == 3) {
+            for (long long p = pred_ptr[r]; p < pred_ptr[r + 1] && !met; p++) {
+                long long base = pred_bases[p];
+                met = pred_exact[p] ? spikes == base
+                                    : spikes >= base && (spikes - base) % pred_moduli[p] == 0;
+            }
+        } else {
+            continue;  // Callable conditions never reach the device
+        }
+        long long consume = consumes[r];
+        if (met && spikes >= consume) {
+            spike_counts[idx] = spikes - consume;
+            selected[idx] = r;
+            fire_counts[idx] = 1;
+            return;
+        }
     }
 }
-''', 'apply_rules_multi')
-
+''', 'apply_rule_table')
@@ -0,0 +1,96 @@
+# Source -> targets index over neuron positions, kept in compressed sparse row (CSR) form
+class Adjacency:
+    def __init__(self):
+        self.sources = []
+        self.targets = []
+        self.weights = []
+        self._csr = None
+        self._merged = None
+
+    def add(self, source, target, weight=1):
+        self.sources.append(source)
+        self.targets.append(target)
+        self.weights.append(weight)
+        self._csr = None
+        self._merged = None
+
+    # Removes every edge from source to target
+    def remove(self, source, target):
+        kept = [i for i, (s, t) in enumerate(zip(self.sources, self.targets))
+                if s != source or t != target]
+        if len(kept) == len(self.sources):
+            raise KeyError((source, target))
+        self.sources = [self.sources[i] for i in kept]
+        self.targets = [self.targets[i] for i in kept]
+        self.weights = [self.weights[i] for i in kept]
+        self._csr = None
+        self._merged = None
+
+    def __len__(self):
+        return len(self.sources)
+
+    # (indptr, indices): targets of source i are indices[indptr[i]:indptr[i + 1]], one entry
+    # per synapse, in the order they were added
+    def csr(self, num_nodes):
+        if self._csr is None or len(self._csr[0]) != num_nodes + 1:
+            self._csr = build_csr(self.sources, self.targets, num_nodes)
+        return self._csr
+
+    # (indptr, indices, weights) with parallel synapses merged, see merge_edges
+    def merged(self, num_nodes):
+        if self._merged is None or len(self._merged[0]) != num_nodes + 1:
+            self._merged = merge_edges(self.sources, self.targets, self.weights, num_nodes)
+        return self._merged
+
+    def targets_of(self, source, num_nodes):
+        indptr, indices = self.csr(num_nodes)
+        return indices[indptr[source]:indptr[source + 1]]
+
+
+def build_csr(sources, targets, num_nodes):
+    import numpy as np
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+    return indptr, targets[order]
+
+
+# CSR (indptr, indices, weights) of weighted edges with the parallel ones merged, their
+# weights summed; the targets of every source come out sorted
+def merge_edges(sources, targets, weights, num_nodes):
+    import numpy as np
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.int64), sources.shape)
+    keys = sources * num_nodes + targets
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else keys
+    merged = np.add.reduceat(weights[order], starts) if len(keys) else weights[:0].copy()
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys[starts] // max(num_nodes, 1), minlength=num_nodes), out=indptr[1:])
+    return indptr, keys[starts] % max(num_nodes, 1), merged
+
+
+# Out-edges of the given sources: (position in sources, edge index) per edge.
+# xp is the array module the arrays live in (numpy by default, or cupy)
+def fan_out_edges(indptr, sources, xp=None):
+    if xp is None:
+        import numpy as xp
+
+    starts = indptr[sources]
+    degrees = indptr[sources + 1] - starts
+    ends = xp.cumsum(degrees)
+    edges = xp.arange(int(ends[-1]) if len(ends) else 0)
+    owner = xp.searchsorted(ends, edges, side="right")
+    return owner, starts[owner] + edges - (ends - degrees)[owner]
+
+
+# Expands the out-edges of the given sources: (position in sources, target) per edge
+def fan_out(indptr, indices, sources, xp=None):
+    owner, edges = fan_out_edges(indptr, sources, xp)
+    return owner, indices[edges]
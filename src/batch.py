@@ -0,0 +1,127 @@
+from collections.abc import Mapping
+import numpy as np
+from src.adjacency import fan_out_edges
+from src.delay_queue import DelayQueue
+from src.engines.numpy_engine import NumpyEngine
+
+
+# Builds the (instances x neurons) matrix of initial spike counts. `initial` is either such a
+# matrix in model order, or a sequence of mappings neuron id -> spikes that override the
+# model's own initial counts.
+def initial_matrix(model, initial):
+    if len(initial) and isinstance(initial[0], Mapping):
+        counts = np.tile(model.spikes, (len(initial), 1))
+        for row, overrides in zip(counts, initial):
+            for n_id, spikes in overrides.items():
+                row[model.index[n_id]] = spikes
+        return counts
+    return np.array(initial, dtype=np.int64).reshape(-1, model.num_neurons)
+
+
+# Final spike counts of every instance, with the tick each one halted at
+class BatchResult:
+    def __init__(self, ids, counts, ticks, halted):
+        self.ids = ids
+        self.index = {n_id: i for i, n_id in enumerate(ids)}
+        self.counts = counts            # instances x neurons
+        self.ticks = ticks              # Ticks each instance ran, up to and including the idle one
+        self.halted = halted            # False where the tick budget ran out first
+
+    # Final spike count of a neuron across all instances
+    def __getitem__(self, neuron_id):
+        return self.counts[:, self.index[neuron_id]]
+
+    def __len__(self):
+        return len(self.counts)
+
+
+# Advances many instances of one CompiledModel together, as an (instances x neurons) state.
+# Spikes of instance b for neuron i live in column b * neurons + i of one shared DelayQueue.
+# An instance halts when no rule fired in a tick and nothing is left in flight; halted rows
+# are dropped from the working arrays (in batches, to amortize the copy).
+class BatchEngine(NumpyEngine):
+    def __init__(self, model, initial):
+        spikes = initial_matrix(model, initial)
+        super().__init__(model, DelayQueue(spikes.size, model.max_delay))
+        self.spike_counts = spikes
+
+        num_instances = len(spikes)
+        self.tick_count = 0
+        self.instances = np.arange(num_instances)                      # Row -> instance
+        self.pending_until = np.full(num_instances, -1, dtype=np.int64)  # Last tick a spike of the row arrives
+        self.done = np.zeros(num_instances, dtype=np.bool_)              # Rows halted but not yet dropped
+
+        self.final_counts = np.zeros_like(spikes)
+        self.halt_ticks = np.full(num_instances, -1, dtype=np.int64)
+
+    @property
+    def num_live(self):
+        return len(self.instances) - int(self.done.sum())
+
+    # Advances every live instance one tick; returns the number still running
+    def tick(self):
+        m = self.model
+        num_neurons = m.num_neurons
+        selected = self.select_rules()
+        rows, firing = np.nonzero(selected >= 0)
+        rules = selected[rows, firing]
+
+        self.spike_counts[rows, firing] -= m.consumes[rules]
+        fired = np.zeros(len(self.instances), dtype=np.bool_)
+        fired[rows] = True
+
+        sending = m.produces[rules] > 0
+        rows, firing, rules = rows[sending], firing[sending], rules[sending]
+        owner, edges = fan_out_edges(m.indptr, firing)
+        self.queue.schedule(m.delays[rules][owner], rows[owner] * num_neurons + m.indices[edges],
+                            m.produces[rules][owner] * m.weights[edges])
+        linked = m.indptr[firing + 1] > m.indptr[firing]
+        np.maximum.at(self.pending_until, rows[linked], self.tick_count + m.delays[rules[linked]])
+
+        self.queue.deliver(self.spike_counts.reshape(-1))
+
+        # Nothing fired and nothing arrived: the configuration is final
+        halting = ~fired & ~self.done & (self.pending_until < self.tick_count)
+        self.tick_count += 1
+        self.halt_ticks[self.instances[halting]] = self.tick_count
+        self.done |= halting
+        if self.done.sum() * 8 > len(self.instances):
+            self.drop_done()
+        return self.num_live
+
+    # Moves the rows of halted instances to the results and out of the working arrays
+    def drop_done(self):
+        num_neurons = self.model.num_neurons
+        self.final_counts[self.instances[self.done]] = self.spike_counts[self.done]
+        keep = np.flatnonzero(~self.done)
+        self.queue.take((keep[:, None] * num_neurons + np.arange(num_neurons)).reshape(-1))
+        self.spike_counts = self.spike_counts[keep]
+        self.instances = self.instances[keep]
+        self.pending_until = self.pending_until[keep]
+        self.done = self.done[keep]
+
+    def result(self):
+        final = self.final_counts.copy()
+        final[self.instances] = self.spike_counts
+        ticks = np.where(self.halt_ticks >= 0, self.halt_ticks, self.tick_count)
+        return BatchResult(self.model.ids, final, ticks, self.halt_ticks >= 0)
+
+    # Spike counts of the live rows at the given neuron positions (all neurons if None)
+    def counts_array(self, positions=None):
+        if positions is None:
+            return self.spike_counts.copy()
+        return self.spike_counts[:, positions]
+
+    # A batch is read through its count arrays (counts_array(), result()), not written back
+    # into Neuron objects
+    def sync(self, neurons):
+        raise TypeError("A batch has no single configuration to write back")
+
+
+# Runs every instance for at most `ticks` ticks, stopping early once all have halted
+def run_batch(model, initial, ticks):
+    engine = BatchEngine(model, initial)
+    for _ in range(ticks):
+        if not engine.tick():
+            break
+    return engine.result()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+ENGINE_MAX_SIZE = {"python": 10000}     # The reference engine is skipped above this size
+SPIKES = 1 << 30                        # Enough spikes for sources to fire on every tick
+
+
+# Model of n neurons sharing the same k rules (arrays of length k, in priority order), with
+# the given synapses
+def uniform_model(n, spikes, sources, targets, consumes, produces, delays, thresholds):
+    from src.builders import build_model
+
+    return build_model(n, spikes, np.tile(consumes, n), np.tile(produces, n), np.tile(delays, n),
+                       np.tile(thresholds, n), rule_counts=len(consumes), sources=sources, targets=targets)
+
+
+# Ring of n neurons passing spikes on
+def ring(n, rng):
+    nodes = np.arange(n)
+    return uniform_model(n, np.full(n, 8), nodes, (nodes + 1) % n, [1], [1], [0], [1])
+
+
+# n - 1 neurons firing into one sink
+def fan_in(n, rng):
+    spikes = np.full(n, SPIKES)
+    spikes[0] = 0
+    sources = np.arange(1, n)
+    return uniform_model(n, spikes, sources, np.zeros(n - 1, dtype=np.int64), [1], [1], [0], [1])
+
+
+# One neuron firing into n - 1 others, which keep what they receive
+def fan_out(n, rng):
+    spikes = np.zeros(n, dtype=np.int64)
+    spikes[0] = SPIKES
+    model = uniform_model(n, spikes, np.zeros(n - 1, dtype=np.int64), np.arange(1, n),
+                          [1], [1], [0], [1])
+    model.thresholds[1:] = SPIKES
+    return model
+
+
+# n neurons with two random targets each, mixed delays
+def random_sparse(n, rng):
+    sources = np.repeat(np.arange(n), 2)
+    targets = rng.integers(0, n, size=2 * n)
+    model = uniform_model(n, rng.integers(0, 6, size=n), sources, targets, [2], [1], [0], [2])
+    model.delays[:] = rng.integers(0, 3, size=n)
+    return model
+
+
+# Ring where every neuron picks among four rules by spike count
+def multi_rule(n, rng):
+    nodes = np.arange(n)
+    return uniform_model(n, rng.integers(0, 12, size=n), nodes, (nodes + 1) % n,
+                         [4, 3, 2, 1], [3, 2, 2, 1], [0, 1, 0, 2], [9, 6, 3, 1])
+
+
+# Ring with delays of up to 63 ticks
+def long_delays(n, rng):
+    nodes = np.arange(n)
+    model = uniform_model(n, np.full(n, 4), nodes, (nodes + 1) % n, [1], [1], [0], [1])
+    model.delays[:] = rng.integers(0, 64, size=n)
+    return model
+
+
+TOPOLOGIES = {
+    "ring": ring,
+    "fan_in": fan_in,
+    "fan_out": fan_out,
+    "random_sparse": random_sparse,
+    "multi_rule": multi_rule,
+    "long_delays": long_delays,
+}
+
+
+# Engines whose backend can be imported here (engines with an optional compiler or device,
+# such as jit and cuda, say whether they can run through an `available` attribute). CuPy
+# reports a missing driver or a failed CUDA initialization with RuntimeError subclasses.
+def usable_engines():
+    from src.engines import available_engines, get_engine
+
+    usable = []
+    for name in available_engines():
+        try:
+            engine = get_engine(name)
+            if getattr(engine, "available", True):
+                usable.append(name)
+        except (ImportError, RuntimeError):
+            continue
+    return usable
+
+
+# A system over the model with its engine started; history recording is off
+def start_system(model, engine):
+    from src.system import SNSystem
+
+    system = SNSystem(engine=engine)
+    system.load_model(model)
+    system.record(neurons=[])
+    system.init_engine()
+    return system
+
+
+# Times `ticks` ticks of one engine on one model: `warmup` untimed runs, then `repeats` timed
+# runs, each on a fresh system, plus one run under tracemalloc for the peak memory (numpy
+# allocations included; the partitioned engine's shared memory and workers are not)
+def measure(model, engine, ticks, repeats=3, warmup=1):
+    for _ in range(warmup):
+        system = start_system(model, engine)
+        system.run(ticks, fast_forward=False)
+        system.release_engine()
+
+    seconds, setup = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        system = start_system(model, engine)
+        ready = time.perf_counter()
+        system.run(ticks, fast_forward=False)
+        seconds.append(time.perf_counter() - ready)
+        setup.append(ready - start)
+        system.release_engine()
+
+    tracemalloc.start()
+    try:
+        system = start_system(model, engine)
+        system.run(ticks, fast_forward=False)
+        system.release_engine()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(seconds)
+    return {
+        "seconds": seconds,
+        "best": min(seconds),
+        "median": median,
+        "ticks_per_second": ticks / median if median > 0 else None,
+        "setup_seconds": statistics.median(setup),
+        "peak_bytes": peak,
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# Runs every topology x size x engine and returns the report as a dict. The generated models
+# depend only on the topology, the size and `seed`.
+def run_benchmarks(topologies=None, sizes=DEFAULT_SIZES, engines=None, ticks=50, repeats=3,
+                   warmup=1, seed=0, log=None):
+    topologies = list(topologies or TOPOLOGIES)
+    engines = list(engines or usable_engines())
+    results = []
+    for topology in topologies:
+        for size in sizes:
+            model = TOPOLOGIES[topology](size, np.random.default_rng(seed))
+            for engine in engines:
+                if size > ENGINE_MAX_SIZE.get(engine, size):
+                    continue
+                entry = {"topology": topology, "size": size, "engine": engine,
+                         "neurons": model.num_neurons, "synapses": model.num_synapses,
+                         "ticks": ticks, "repeats": repeats}
+                entry.update(measure(model, engine, ticks, repeats, warmup))
+                results.append(entry)
+                if log is not None:
+                    log(entry)
+    return {"environment": environment(), "seed": seed, "results": results}
+
+
+def result_key(entry):
+    return entry["topology"], entry["size"], entry["engine"]
+
+
+# Entries whose median time is more than `threshold` (a fraction) above the baseline's,
+# as (entry, baseline entry, ratio) sorted by ratio
+def compare(report, baseline, threshold=0.1):
+    previous = {result_key(entry): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in report["results"]:
+        old = previous.get(result_key(entry))
+        if old is None or old["median"] <= 0:
+            continue
+        ratio = entry["median"] / old["median"]
+        if ratio > 1 + threshold:
+            regressions.append((entry, old, ratio))
+    return sorted(regressions, key=lambda r: -r[2])
+
+
+def format_entry(entry):
+    rate = entry["ticks_per_second"]
+    return (f"{entry['topology']:14} {entry['size']:>9} {entry['engine']:12} "
+            f"{entry['median']:9.4f}s {rate or 0:12.1f} ticks/s {entry['peak_bytes'] / 2 ** 20:9.1f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.benchmark",
+                                     description="Time every engine on generated SN P topologies.")
+    parser.add_argument("--topologies", nargs="+", choices=list(TOPOLOGIES), default=None)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--engines", nargs="+", default=None, help="default: every engine that imports")
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="slowdown (fraction of the baseline time) reported as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.topologies, args.sizes, args.engines, args.ticks, args.repeats,
+                            args.warmup, args.seed, log=lambda entry: print(format_entry(entry), flush=True))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for entry, old, ratio in regressions:
+            print(f"REGRESSION {entry['topology']} {entry['size']} {entry['engine']}: "
+                  f"{old['median']:.4f}s -> {entry['median']:.4f}s ({ratio:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import numpy as np
+from src.adjacency import merge_edges
+from src.compiled import THRESHOLD, CompiledModel, NumberedIds
+
+
+def _column(values, size, name):
+    try:
+        return np.broadcast_to(np.asarray(values, dtype=np.int64), (size,)).copy()
+    except ValueError:
+        raise ValueError(f"{name} must be a scalar or have {size} values") from None
+
+
+# Builds a CompiledModel straight from arrays, without Neuron or Synapse objects.
+# - neurons: a count (ids are prefix + position, see NumberedIds) or the list of ids
+# - spikes, verbose: per neuron, or one value for all
+# - rule_counts: rules of every neuron (or one count for all), laid out in neuron order; the
+#   rule columns consumes, produces, delays and thresholds have one value per rule, or one
+#   for all (thresholds default to consumes). Rules apply when spike_count >= threshold.
+# - sources, targets, weights: neuron positions and weights (or one weight for all) of the
+#   synapses; parallel synapses are merged into one edge of their total weight
+def build_model(neurons, spikes=0, consumes=1, produces=1, delays=0, thresholds=None,
+                rule_counts=1, sources=(), targets=(), weights=1, verbose=False, prefix="n"):
+    if isinstance(neurons, (int, np.integer)):
+        ids = NumberedIds(prefix, int(neurons))
+    else:
+        ids = list(neurons)
+    n = len(ids)
+
+    rule_counts = _column(rule_counts, n, "rule_counts")
+    rule_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(rule_counts, out=rule_ptr[1:])
+    num_rules = int(rule_ptr[-1])
+    consumes = _column(consumes, num_rules, "consumes")
+    thresholds = consumes.copy() if thresholds is None else _column(thresholds, num_rules, "thresholds")
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if sources.shape != targets.shape or sources.ndim != 1:
+        raise ValueError("sources and targets must be 1-D arrays of the same length")
+    if len(sources) and (min(sources.min(), targets.min()) < 0 or max(sources.max(), targets.max()) >= n):
+        raise ValueError(f"Synapse endpoints must be positions in [0, {n})")
+    indptr, indices, weights = merge_edges(sources, targets, _column(weights, len(sources), "weights"), n)
+
+    return CompiledModel(ids, _column(spikes, n, "spikes"), rule_ptr, consumes,
+                         _column(produces, num_rules, "produces"), _column(delays, num_rules, "delays"),
+                         thresholds, np.full(num_rules, THRESHOLD, dtype=np.int8), {}, indptr, indices,
+                         verbose=np.broadcast_to(np.asarray(verbose, dtype=np.bool_), (n,)).copy(),
+                         rule_owner=np.repeat(np.arange(n, dtype=np.int64), rule_counts), weights=weights)
+
+
+# Families of models built from arrays. Relay neurons fire one spike on as long as they
+# hold one (consume 1, produce 1, threshold 1).
+
+# n relays in a line, the first holding `spikes`
+def chain(n, spikes=1, delay=0):
+    nodes = np.arange(n - 1)
+    initial = np.zeros(n, dtype=np.int64)
+    initial[:1] = spikes
+    return build_model(n, initial, delays=delay, sources=nodes, targets=nodes + 1)
+
+
+# n relays in a cycle, the first holding `spikes`
+def ring(n, spikes=1, delay=0):
+    nodes = np.arange(n)
+    initial = np.zeros(n, dtype=np.int64)
+    initial[:1] = spikes
+    return build_model(n, initial, delays=delay, sources=nodes, targets=(nodes + 1) % n)
+
+
+# n neurons with `degree` random targets each, random spikes below 6 and delays up to
+# max_delay; every neuron fires one spike for two
+def random_sparse(n, degree=2, max_delay=2, seed=None):
+    rng = np.random.default_rng(seed)
+    return build_model(n, rng.integers(0, 6, size=n), consumes=2, produces=1,
+                       delays=rng.integers(0, max_delay + 1, size=n),
+                       sources=np.repeat(np.arange(n), degree), targets=rng.integers(0, n, size=degree * n))
+
+
+# Layers of relays of the given widths, every neuron of a layer feeding every neuron of the
+# next; the neurons of the first layer hold `spikes`
+def layered(widths, spikes=1, delay=0):
+    widths = np.asarray(widths, dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(widths)])
+    n = int(starts[-1])
+    initial = np.zeros(n, dtype=np.int64)
+    initial[:widths[0] if len(widths) else 0] = spikes
+    sources, targets = [], []
+    for layer in range(len(widths) - 1):
+        here = np.arange(starts[layer], starts[layer + 1])
+        after = np.arange(starts[layer + 1], starts[layer + 2])
+        sources.append(np.repeat(here, len(after)))
+        targets.append(np.tile(after, len(here)))
+    ids = [f"L{layer}_{i}" for layer, width in enumerate(widths.tolist()) for i in range(width)]
+    return build_model(ids, initial, delays=delay,
+                       sources=np.concatenate(sources) if sources else (),
+                       targets=np.concatenate(targets) if targets else ())
+
+
+# Product a * b: A holds a spikes and sends b for each of them to Output (as tests/multiply.py);
+# Output holds a * b after a + 1 ticks
+def multiply(a, b):
+    return build_model(["A", "Output"], [a, 0], produces=b, delays=1, rule_counts=[1, 0],
+                       sources=[0], targets=[1])
+
+
+# Polynomial c0 + c1 x + c2 x^2 + ... of spike counts: Ck holds ck spikes and passes them
+# through k multipliers CkX1 ... CkXk (each sending x spikes per spike) into Output, which
+# holds the value once the system halts
+def polynomial(coefficients, x):
+    ids, spikes, produces, sources, targets = [], [], [], [], []
+    for k, coefficient in enumerate(coefficients):
+        ids.append(f"C{k}")
+        spikes.append(coefficient)
+        produces.append(x if k else 1)
+        for j in range(1, k + 1):
+            sources.append(len(ids) - 1)
+            targets.append(len(ids))
+            ids.append(f"C{k}X{j}")
+            spikes.append(0)
+            produces.append(x if j < k else 1)
+        sources.append(len(ids) - 1)
+        targets.append(-1)
+    output = len(ids)
+    targets = [output if t < 0 else t for t in targets]
+    return build_model(ids + ["Output"], spikes + [0], produces=produces,
+                       rule_counts=[1] * output + [0], sources=sources, targets=targets)
+
+
+FAMILIES = {
+    "chain": chain,
+    "ring": ring,
+    "random_sparse": random_sparse,
+    "layered": layered,
+    "multiply": multiply,
+    "polynomial": polynomial,
+}
@@ -0,0 +1,91 @@
+import copy
+import os
+import numpy as np
+
+FORMAT_VERSION = 1
+HISTORY_PREFIX = "history_"
+
+
+# Spike counts of every neuron in position order, wherever the current state lives
+def current_counts(system):
+    if system.backend is not None:
+        return np.asarray(system.backend.counts_array(), dtype=np.int64)
+    if system.model is not None:
+        return np.asarray(system.model.spikes, dtype=np.int64)
+    return np.array([system.neurons[n_id].spike_count for n_id in system.neuron_ids], dtype=np.int64)
+
+
+# In-flight spikes in position order, row d arriving d ticks from now. Engines that keep the
+# queue columns in another order provide pending_array().
+def current_pending(system):
+    pending_array = getattr(system.backend, "pending_array", None)
+    if pending_array is not None:
+        return pending_array()
+    if system.delay_queue is None:
+        return np.zeros((0, len(system.neuron_ids)), dtype=np.int64)
+    return system.delay_queue.pending()
+
+
+# Writes the simulation state of a system (spike counts, in-flight spikes, tick and recorded
+# history) to a compressed .npz file. The structure is not saved: a checkpoint is restored
+# into a system built from the same model, with any engine. The file is written next to
+# `path` first and then moved over it, so an interrupted save keeps the previous checkpoint.
+def save_checkpoint(system, path):
+    queue = system.delay_queue
+    state = {
+        "version": np.array(FORMAT_VERSION),
+        "ids": np.array(system.neuron_ids, dtype=str),
+        "counts": current_counts(system),
+        "pending": current_pending(system),
+        "tick": np.array(0 if queue is None else queue.tick),
+        "halted": np.array(bool(system.halted)),
+    }
+    if system.history is not None:
+        for key, value in system.history.state().items():
+            state[HISTORY_PREFIX + key] = value
+
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "wb") as file:
+        np.savez_compressed(file, **state)
+    os.replace(partial, path)
+
+
+# Restores a checkpoint written by save_checkpoint into a system with the same neurons.
+# The engine is dropped and rebuilt from the restored state on the next tick. Returns the
+# tick the checkpoint was taken at.
+def load_checkpoint(system, path):
+    with np.load(path, allow_pickle=False) as data:
+        state = dict(data)
+    if int(state["version"]) != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {int(state['version'])}")
+    ids = state["ids"].tolist()
+    if ids != [str(n_id) for n_id in system.neuron_ids]:
+        raise ValueError("Checkpoint was taken from a system with different neurons")
+
+    history = {key[len(HISTORY_PREFIX):]: value for key, value in state.items()
+               if key.startswith(HISTORY_PREFIX)}
+    tick = int(state["tick"])
+    restore_state(system, state["counts"], state["pending"], tick, bool(state["halted"]), history or None)
+    return tick
+
+
+# Puts a system in the given state: spike counts in position order, in-flight spikes laid
+# out as DelayQueue.pending() returns them, the clock, the halted flag and the history (as
+# SpikeHistory.state() returns it, or None). The engine is rebuilt on the next tick.
+def restore_state(system, counts, pending, tick, halted, history):
+    system.release_engine()
+    if system.model is not None:
+        system.model = copy.copy(system.model)
+        system.model.spikes = np.asarray(counts, dtype=np.int64)
+    else:
+        for n_id, count in zip(system.neuron_ids, counts.tolist()):
+            system.neurons[n_id].spike_count = count
+
+    system.reserve_delay_queue().load(pending, tick)
+    system.halted = halted
+    system.cycle = None
+    if history is not None:
+        from src.history import SpikeHistory
+        system.history = SpikeHistory.from_state(history)
+    else:
+        system.history = None
@@ -0,0 +1,315 @@
+import json
+import os
+from collections.abc import Mapping, Sequence
+import numpy as np
+
+# Rule condition kinds understood by the array engines
+THRESHOLD = 0   # spike_count >= threshold
+CALLABLE = 1    # opaque Python predicate, evaluated per neuron
+NEVER = 2       # rule without a condition, never applicable
+REGEX = 3       # regular expression over "a", checked through arithmetic predicates (src/regex.py)
+
+# Binary container written by save_compiled: a directory of .npy arrays plus a JSON header
+FORMAT_NAME = "snpsim-compiled"
+FORMAT_VERSION = 3
+HEADER_FILE = "header.json"
+ARRAY_FIELDS = ("spikes", "verbose", "rule_ptr", "rule_owner", "consumes", "produces", "delays",
+                "thresholds", "kinds", "indptr", "indices")
+PREDICATE_FIELDS = ("pred_ptr", "pred_bases", "pred_moduli", "pred_exact")   # Added in version 2
+WEIGHT_FIELDS = ("weights",)                                                  # Added in version 3
+
+
+# Ids prefix + position of `count` neurons, generated when read instead of stored, so large
+# generated models do not build millions of strings up front
+class NumberedIds(Sequence):
+    __slots__ = ("prefix", "count")
+
+    def __init__(self, prefix, count):
+        self.prefix = prefix
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [f"{self.prefix}{j}" for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return f"{self.prefix}{i}"
+
+    def __iter__(self):
+        return map(f"{self.prefix}{{}}".format, range(self.count))
+
+    # Position of an id, None if it is not one of these
+    def position(self, neuron_id):
+        if not isinstance(neuron_id, str) or not neuron_id.startswith(self.prefix):
+            return None
+        digits = neuron_id[len(self.prefix):]
+        if not digits.isdecimal() or not digits.isascii() or digits != str(int(digits)):
+            return None
+        i = int(digits)
+        return i if i < self.count else None
+
+    def __contains__(self, neuron_id):
+        return self.position(neuron_id) is not None
+
+    def __eq__(self, other):
+        if isinstance(other, NumberedIds):
+            return (self.prefix, self.count) == (other.prefix, other.count)
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return len(other) == self.count and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"NumberedIds({self.prefix!r}, {self.count})"
+
+
+# Id -> position mapping of NumberedIds, computed from the id
+class NumberedIndex(Mapping):
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __getitem__(self, neuron_id):
+        i = self.ids.position(neuron_id)
+        if i is None:
+            raise KeyError(neuron_id)
+        return i
+
+    def __contains__(self, neuron_id):
+        return self.ids.position(neuron_id) is not None
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Flat, index-based representation of an SN P system (structure of arrays)
+class CompiledModel:
+    def __init__(self, ids, spikes, rule_ptr, consumes, produces, delays, thresholds, kinds,
+                 callables, indptr, indices, verbose=None, rule_owner=None, predicates=None,
+                 weights=None):
+        self.ids = ids if isinstance(ids, NumberedIds) else list(ids)
+        self._index = None
+        self.spikes = np.asarray(spikes, dtype=np.int64)
+        if verbose is None:
+            verbose = np.zeros(len(self.ids), dtype=np.bool_)
+        self.verbose = np.asarray(verbose, dtype=np.bool_)
+
+        # Rules of neuron i live in [rule_ptr[i], rule_ptr[i + 1]), in priority order:
+        # a neuron uses the first applicable rule of its segment
+        self.rule_ptr = np.asarray(rule_ptr, dtype=np.int64)
+        if rule_owner is None:
+            rule_owner = np.repeat(np.arange(len(self.ids), dtype=np.int64), np.diff(self.rule_ptr))
+        self.rule_owner = np.asarray(rule_owner, dtype=np.int64)
+        self.consumes = np.asarray(consumes, dtype=np.int64)
+        self.produces = np.asarray(produces, dtype=np.int64)
+        self.delays = np.asarray(delays, dtype=np.int64)
+        self.thresholds = np.asarray(thresholds, dtype=np.int64)
+        self.kinds = np.asarray(kinds, dtype=np.int8)
+        self.callables = callables      # rule index -> callable condition
+
+        # Predicates of REGEX rule r are rows [pred_ptr[r], pred_ptr[r + 1]) of
+        # (pred_bases, pred_moduli, pred_exact), see src/regex.py
+        if predicates is None:
+            predicates = (np.zeros(len(self.consumes) + 1), (), (), ())
+        ptr, bases, moduli, exact = predicates
+        self.pred_ptr = np.asarray(ptr, dtype=np.int64)
+        self.pred_bases = np.asarray(bases, dtype=np.int64)
+        self.pred_moduli = np.asarray(moduli, dtype=np.int64)
+        self.pred_exact = np.asarray(exact, dtype=np.bool_)
+
+        # Targets of neuron i are indices[indptr[i]:indptr[i + 1]] (CSR adjacency); edge e
+        # delivers weights[e] spikes for every spike its source produces
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        if weights is None:
+            weights = np.ones(len(self.indices), dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.int64)
+
+    # Neuron id -> position, built on first use
+    @property
+    def index(self):
+        if self._index is None:
+            if isinstance(self.ids, NumberedIds):
+                self._index = NumberedIndex(self.ids)
+            else:
+                self._index = {nid: i for i, nid in enumerate(self.ids)}
+        return self._index
+
+    @property
+    def num_neurons(self):
+        return len(self.ids)
+
+    @property
+    def num_rules(self):
+        return len(self.consumes)
+
+    @property
+    def rule_counts(self):
+        return np.diff(self.rule_ptr)
+
+    @property
+    def num_synapses(self):
+        return len(self.indices)
+
+    # Whether some edge has a weight other than 1
+    @property
+    def weighted(self):
+        return bool((self.weights != 1).any())
+
+    @property
+    def predicates(self):
+        return self.pred_ptr, self.pred_bases, self.pred_moduli, self.pred_exact
+
+    # Predicates of a REGEX rule as (base, modulus, exact) tuples
+    def predicates_of(self, r):
+        start, end = int(self.pred_ptr[r]), int(self.pred_ptr[r + 1])
+        return tuple(zip(self.pred_bases[start:end].tolist(), self.pred_moduli[start:end].tolist(),
+                         self.pred_exact[start:end].tolist()))
+
+    @property
+    def max_delay(self):
+        return int(self.delays.max()) if len(self.delays) else 0
+
+    # Rule objects of the neuron at a position
+    def rules_of(self, pos):
+        from src.rule import Rule
+
+        from src.regex import RegexCondition
+
+        start, end = int(self.rule_ptr[pos]), int(self.rule_ptr[pos + 1])
+        return [Rule(consume, produce, delay, kind, threshold,
+                     RegexCondition(predicates=self.predicates_of(r)) if kind == REGEX
+                     else self.callables.get(r))
+                for r, consume, produce, delay, kind, threshold in zip(
+                    range(start, end), self.consumes[start:end].tolist(),
+                    self.produces[start:end].tolist(), self.delays[start:end].tolist(),
+                    self.kinds[start:end].tolist(), self.thresholds[start:end].tolist())]
+
+    # Builds a Neuron object for the neuron at a position
+    def neuron(self, pos, spike_count=None):
+        from src.neuron import Neuron
+
+        if spike_count is None:
+            spike_count = int(self.spikes[pos])
+        return Neuron(self.ids[pos], spike_count=spike_count, verbose=bool(self.verbose[pos]),
+                      rules=self.rules_of(pos))
+
+
+# Model with its neurons reordered: position i of the result is position order[i] of the
+# input. Rule priorities and the targets of every neuron keep their order.
+def permute_model(model, order):
+    order = np.asarray(order, dtype=np.int64)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    def gather(ptr, order):
+        counts = np.diff(ptr)[order]
+        new_ptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(counts, out=new_ptr[1:])
+        return new_ptr, np.repeat(ptr[order] - new_ptr[:-1], counts) + np.arange(new_ptr[-1])
+
+    rule_ptr, rules = gather(model.rule_ptr, order)
+    indptr, edges = gather(model.indptr, order)
+    pred_ptr, preds = gather(model.pred_ptr, rules)
+    callables = {int(r): model.callables[int(old)]
+                 for r, old in enumerate(rules.tolist()) if old in model.callables}
+    return CompiledModel([model.ids[i] for i in order.tolist()], model.spikes[order], rule_ptr,
+                         model.consumes[rules], model.produces[rules], model.delays[rules],
+                         model.thresholds[rules], model.kinds[rules], callables,
+                         indptr, rank[model.indices[edges]], verbose=model.verbose[order],
+                         predicates=(pred_ptr, model.pred_bases[preds], model.pred_moduli[preds],
+                                     model.pred_exact[preds]), weights=model.weights[edges])
+
+
+# Compiles the neurons and synapses of an SNSystem into a CompiledModel
+def compile_system(system):
+    if system.model is not None:
+        return system.model
+
+    ids = list(system.neuron_ids)
+    for nid in ids:
+        if nid not in system.neurons:
+            raise KeyError(f"Synapse references unknown neuron {nid}")
+
+    spikes = []
+    verbose = []
+    rule_ptr = [0]
+    consumes, produces, delays, thresholds, kinds = [], [], [], [], []
+    callables = {}
+    conditions = {}
+
+    for nid in ids:
+        neuron = system.neurons[nid]
+        spikes.append(neuron.spike_count)
+        verbose.append(neuron.verbose)
+        for rule in neuron.rules:
+            if rule.kind == CALLABLE:
+                callables[len(kinds)] = rule.condition
+            elif rule.kind == REGEX:
+                conditions[len(kinds)] = rule.condition
+            kinds.append(rule.kind)
+            thresholds.append(rule.threshold)
+            consumes.append(rule.consume)
+            produces.append(rule.produce)
+            delays.append(rule.delay)
+        rule_ptr.append(len(kinds))
+
+    indptr, indices, weights = system.adjacency.merged(len(ids))
+
+    from src.regex import predicate_arrays
+    return CompiledModel(ids, spikes, rule_ptr, consumes, produces, delays, thresholds, kinds,
+                         callables, indptr, indices, verbose=verbose,
+                         predicates=predicate_arrays(len(kinds), conditions), weights=weights)
+
+
+# Writes a model as a versioned directory of raw .npy arrays that load_compiled can memory-map
+def save_compiled(model, path):
+    if model.callables:
+        raise ValueError("Rules with Python callable conditions cannot be saved")
+    os.makedirs(path, exist_ok=True)
+    for field in ARRAY_FIELDS + PREDICATE_FIELDS + WEIGHT_FIELDS:
+        np.save(os.path.join(path, field + ".npy"), getattr(model, field))
+    np.save(os.path.join(path, "ids.npy"), np.array([str(nid) for nid in model.ids], dtype=np.str_))
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "num_neurons": model.num_neurons,
+        "num_rules": model.num_rules,
+        "num_synapses": model.num_synapses,
+        "arrays": list(ARRAY_FIELDS + PREDICATE_FIELDS + WEIGHT_FIELDS),
+    }
+    with open(os.path.join(path, HEADER_FILE), "w") as file:
+        json.dump(header, file, indent=2)
+
+
+# Loads a model written by save_compiled. With mmap=True the arrays are read-only memory
+# maps, so workers loading the same model share its pages.
+def load_compiled(path, mmap=True):
+    with open(os.path.join(path, HEADER_FILE)) as file:
+        header = json.load(file)
+    if header.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a compiled SN P model")
+    if header.get("version") not in (1, 2, FORMAT_VERSION):
+        raise ValueError(f"Unsupported compiled model version {header.get('version')}")
+
+    mode = "r" if mmap else None
+    fields = (ARRAY_FIELDS + (PREDICATE_FIELDS if header["version"] >= 2 else ())
+              + (WEIGHT_FIELDS if header["version"] >= 3 else ()))
+    arrays = {field: np.load(os.path.join(path, field + ".npy"), mmap_mode=mode)
+              for field in fields}
+    ids = np.load(os.path.join(path, "ids.npy")).tolist()
+    predicates = None
+    if header["version"] >= 2:
+        predicates = tuple(arrays[field] for field in PREDICATE_FIELDS)
+
+    return CompiledModel(ids, arrays["spikes"], arrays["rule_ptr"], arrays["consumes"],
+                         arrays["produces"], arrays["delays"], arrays["thresholds"], arrays["kinds"],
+                         {}, arrays["indptr"], arrays["indices"], verbose=arrays["verbose"],
+                         rule_owner=arrays["rule_owner"], predicates=predicates,
+                         weights=arrays.get("weights"))
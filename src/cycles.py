@@ -0,0 +1,56 @@
+from collections import namedtuple
+import numpy as np
+from src.delay_queue import HASH_MOD
+
+# A configuration first seen after `transient` ticks repeats every `period` ticks
+Cycle = namedtuple("Cycle", "transient period")
+
+
+# Fingerprints the full configuration (spike counts + in-flight spikes) after each observed
+# tick and reports the first repeated one. Counts are hashed with one weighted sum per tick,
+# the delay queue keeps its part up to date incrementally (DelayQueue.track_hash). Hashes are
+# 64-bit, and a detected cycle is confirmed over one more period before being relied on.
+class CycleDetector:
+    def __init__(self, engine, queue, seed=0):
+        self.engine = engine
+        self.queue = queue
+        rng = np.random.default_rng(seed)
+        weights = rng.integers(0, HASH_MOD, size=(2, queue.num_neurons), dtype=np.uint64)
+        self.weights = queue.xp.asarray(weights[0])
+        queue.track_hash(weights[1])
+
+        self.first_seen = {}           # Fingerprint -> first tick it was seen at
+        self.seen_at = {}              # Tick -> fingerprint
+        self.cycle = None
+
+    def fingerprint(self):
+        xp = self.queue.xp
+        if getattr(self.engine, "remote_queue", False):
+            self.queue.rehash()
+        # Engines that keep the counts as an array (possibly on the device) are hashed in place
+        counts = getattr(self.engine, "spike_counts", None)
+        if counts is None:
+            counts = self.engine.counts_array()
+        weighed = counts.astype(xp.uint64) * self.weights
+        return (int(weighed.sum(dtype=xp.uint64)) + self.queue.hash) % HASH_MOD
+
+    # Records the configuration after `tick` ticks; True once it repeats an earlier one
+    def observe(self, tick):
+        h = self.fingerprint()
+        self.seen_at[tick] = h
+        start = self.first_seen.setdefault(h, tick)
+        if start == tick:
+            return False
+        self.cycle = Cycle(start, tick - start)
+        return True
+
+    # Checks the configuration after `tick` ticks against the one a period earlier
+    def confirm(self, tick):
+        return self.seen_at.get(tick - self.cycle.period) == self.fingerprint()
+
+    # Forgets a cycle that failed confirmation (a fingerprint collision)
+    def reject(self):
+        self.cycle = None
+
+    def close(self):
+        self.queue.track_hash(None)
@@ -0,0 +1,184 @@
+import numpy as np
+
+HASH_MOD = 1 << 64
+HASH_BASE = 0x9E3779B97F4A7C15   # Odd, so it is invertible mod 2 ** 64
+HASH_BASE_INV = pow(HASH_BASE, -1, HASH_MOD)
+
+
+def scatter_add(xp):
+    if xp is np:
+        return np.add.at
+    import cupyx
+    return cupyx.scatter_add
+
+
+# Circular buffer of in-flight spikes: row (tick + delay) % capacity holds the
+# amounts each target neuron receives at the end of that tick
+class DelayQueue:
+    def __init__(self, num_neurons, max_delay=0, xp=np):
+        self.xp = xp
+        self.buffer = xp.zeros((max_delay + 1, num_neurons), dtype=xp.int64)
+        self.tick = 0
+        self._add_at = scatter_add(xp)
+        self.hash_weights = None       # Per-neuron fingerprint weights while tracking, see track_hash()
+        self.hash = 0
+
+    # Queue over an existing (capacity x neurons) buffer, e.g. a view of shared memory
+    @classmethod
+    def over(cls, buffer, tick=0, xp=np):
+        queue = cls(0, 0, xp)
+        queue.buffer = buffer
+        queue.tick = tick
+        return queue
+
+    @property
+    def capacity(self):
+        return self.buffer.shape[0]
+
+    @property
+    def num_neurons(self):
+        return self.buffer.shape[1]
+
+    # Makes room for spikes scheduled up to max_delay ticks ahead (capacity at least doubles)
+    def reserve(self, max_delay):
+        if max_delay < self.capacity:
+            return
+        self._relayout(max(max_delay + 1, 2 * self.capacity), self.num_neurons)
+
+    # Adds columns for neurons registered after the queue was created
+    def resize(self, num_neurons):
+        if num_neurons > self.num_neurons:
+            self._relayout(self.capacity, num_neurons)
+
+    # Keeps only the given neuron columns, in that order
+    def take(self, columns):
+        columns = self.xp.asarray(columns, dtype=self.xp.int64)
+        self.buffer = self.buffer[:, columns]
+        if self.hash_weights is not None:
+            self.hash_weights = self.hash_weights[columns]
+
+    def _relayout(self, capacity, num_neurons):
+        buffer = self.xp.zeros((capacity, num_neurons), dtype=self.xp.int64)
+        for d in range(self.capacity):
+            buffer[(self.tick + d) % capacity, :self.num_neurons] = self.buffer[(self.tick + d) % self.capacity]
+        self.buffer = buffer
+        if self.hash_weights is not None:
+            self._hash_powers()
+
+    # Moves the buffer to another array module (numpy or cupy)
+    def to(self, xp):
+        if xp is not self.xp:
+            self.buffer = xp.asarray(self.buffer.get() if hasattr(self.buffer, "get") else self.buffer)
+            self.xp = xp
+            self._add_at = scatter_add(xp)
+            if self.hash_weights is not None:
+                self.track_hash(self.hash_weights.get() if hasattr(self.hash_weights, "get") else self.hash_weights)
+
+    # Schedules amounts[i] for targets[i], arriving delays[i] ticks from now (delays < capacity)
+    def schedule(self, delays, targets, amounts):
+        self._add_at(self.buffer, ((self.tick + delays) % self.capacity, targets), amounts)
+        if self.hash_weights is not None:
+            weighed = amounts.astype(self.xp.uint64) * self.hash_weights[targets] * self.hash_pows[delays]
+            self.hash = (self.hash + int(weighed.sum(dtype=self.xp.uint64))) % HASH_MOD
+
+    # Adds this tick's arrivals to counts and advances the clock; True if anything arrived
+    def deliver(self, counts):
+        slot = self.tick % self.capacity
+        row = self.buffer[slot]
+        arrived = bool(row.any())
+        if arrived:
+            counts += row
+            self._unhash(row)
+            row[:] = 0
+        self._advance_hash(1)
+        self.tick += 1
+        return arrived
+
+    # Amounts arriving at the end of this tick (a view of the buffer row)
+    def due(self):
+        return self.buffer[self.tick % self.capacity]
+
+    # Removes this tick's arrivals as (targets, amounts) and advances the clock
+    def pop(self):
+        row = self.buffer[self.tick % self.capacity]
+        targets = self.xp.flatnonzero(row)
+        amounts = row[targets]
+        self._unhash(row)
+        row[targets] = 0
+        self._advance_hash(1)
+        self.tick += 1
+        return targets, amounts
+
+    def is_empty(self):
+        return not self.buffer.any()
+
+    # Ticks until the next tick with arrivals (0 = this tick), None if nothing is in flight
+    def next_arrival(self):
+        xp = self.xp
+        busy = self.buffer.any(axis=1)[(self.tick + xp.arange(self.capacity)) % self.capacity]
+        ahead = xp.flatnonzero(busy)
+        return int(ahead[0]) if len(ahead) else None
+
+    # Moves the clock over ticks that have no arrivals
+    def advance(self, ticks):
+        self._advance_hash(ticks)
+        self.tick += ticks
+
+    # Moves the clock while keeping every in-flight spike the same number of ticks ahead
+    def jump(self, ticks):
+        self.buffer[...] = self.xp.roll(self.buffer, ticks % self.capacity, axis=0)
+        self.tick += ticks
+
+    # In-flight spikes as a numpy array, row d arriving d ticks from now, without the empty
+    # rows at the end
+    def pending(self):
+        xp = self.xp
+        ahead = self.buffer[(self.tick + xp.arange(self.capacity)) % self.capacity]
+        if hasattr(ahead, "get"):
+            ahead = ahead.get()
+        busy = np.flatnonzero(ahead.any(axis=1))
+        return ahead[:busy[-1] + 1 if len(busy) else 0]
+
+    # Replaces the in-flight spikes by rows laid out as pending() returns them and sets the clock
+    def load(self, rows, tick):
+        self.tick = tick
+        self.reserve(len(rows) - 1)
+        self.buffer[...] = 0
+        if len(rows):
+            self.buffer[(tick + self.xp.arange(len(rows))) % self.capacity] = self.xp.asarray(rows)
+        if self.hash_weights is not None:
+            self.rehash()
+
+    # Keeps an incremental 64-bit fingerprint of the in-flight spikes, relative to the clock:
+    # the sum of amount * weights[target] * HASH_BASE ** (ticks until arrival), mod 2 ** 64.
+    # Scheduling adds terms, arrivals remove theirs and each tick divides by HASH_BASE.
+    # weights=None stops tracking.
+    def track_hash(self, weights):
+        if weights is None:
+            self.hash_weights = None
+            return
+        xp = self.xp
+        self.hash_weights = xp.asarray(weights, dtype=xp.uint64)
+        self._hash_powers()
+        self.rehash()
+
+    # Recomputes the fingerprint from the buffer, for spikes scheduled through another queue
+    # object sharing it
+    def rehash(self):
+        xp = self.xp
+        ahead = self.buffer[(self.tick + xp.arange(self.capacity)) % self.capacity].astype(xp.uint64)
+        weighed = ahead * self.hash_pows[:, None] * self.hash_weights[None, :]
+        self.hash = int(weighed.sum(dtype=xp.uint64))
+
+    def _hash_powers(self):
+        powers = [pow(HASH_BASE, d, HASH_MOD) for d in range(self.capacity)]
+        self.hash_pows = self.xp.asarray(np.array(powers, dtype=np.uint64))
+
+    def _unhash(self, row):
+        if self.hash_weights is not None:
+            weighed = row.astype(self.xp.uint64) * self.hash_weights
+            self.hash = (self.hash - int(weighed.sum(dtype=self.xp.uint64))) % HASH_MOD
+
+    def _advance_hash(self, ticks):
+        if self.hash_weights is not None:
+            self.hash = self.hash * pow(HASH_BASE_INV, ticks, HASH_MOD) % HASH_MOD
@@ -0,0 +1,31 @@
+import importlib
+
+# Engine name -> engine class, or "module:Class" until the engine is first selected
+_ENGINES = {}
+
+
+def register_engine(name, engine):
+    _ENGINES[name] = engine
+
+
+def available_engines():
+    return list(_ENGINES)
+
+
+# Resolves an engine name to its class, importing the backend on first use
+def get_engine(name):
+    if name not in _ENGINES:
+        raise ValueError(f"Unknown engine {name!r}, expected one of {available_engines()}")
+    engine = _ENGINES[name]
+    if isinstance(engine, str):
+        module_name, class_name = engine.split(":")
+        engine = getattr(importlib.import_module(module_name), class_name)
+        _ENGINES[name] = engine
+    return engine
+
+
+register_engine("python", "src.engines.reference:ReferenceEngine")
+register_engine("numpy", "src.engines.numpy_engine:NumpyEngine")
+register_engine("cuda", "src.engines.cuda_engine:CudaEngine")
+register_engine("partitioned", "src.engines.partitioned:PartitionedEngine")
+register_engine("jit", "src.engines.jit_engine:JitEngine")
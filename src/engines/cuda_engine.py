@@ -0,0 +1,120 @@
+import cupy as cp
+from cuda.apply_rules_kernel import apply_rule_table_kernel
+from src.adjacency import fan_out_edges
+from src.compiled import CALLABLE, compile_system
+
+
+# Number of CUDA devices; CuPy imports without a driver or a device, so 0 when there is none
+# or the CUDA runtime cannot start
+def device_count():
+    try:
+        return cp.cuda.runtime.getDeviceCount()
+    except (cp.cuda.runtime.CUDARuntimeError, cp.cuda.driver.CUDADriverError):
+        return 0
+
+
+# CUDA engine: applies the rules of all neurons in one kernel launch per tick
+class CudaEngine:
+    profiler = None     # Profiler set by SNSystem.profile()
+    available = device_count() > 0
+
+    def __init__(self, model, queue=None, verbose=False):
+        if (model.kinds == CALLABLE).any():
+            raise ValueError("The CUDA engine supports threshold and regular-expression conditions only")
+        self.model = model
+        self.verbose = verbose
+        self.neuron_order = model.ids
+
+        self.spike_counts = cp.asarray(model.spikes)
+        self.rule_ptr = cp.asarray(model.rule_ptr)
+        self.kinds = cp.asarray(model.kinds)
+        self.thresholds = cp.asarray(model.thresholds)
+        self.consumes = cp.asarray(model.consumes)
+        self.produces = cp.asarray(model.produces)
+        self.delays = cp.asarray(model.delays)
+        self.pred_ptr = cp.asarray(model.pred_ptr)
+        self.pred_bases = cp.asarray(model.pred_bases)
+        self.pred_moduli = cp.asarray(model.pred_moduli)
+        self.pred_exact = cp.asarray(model.pred_exact)
+        self.selected = cp.zeros_like(self.spike_counts)
+        self.fire_counts = cp.zeros_like(self.spike_counts)
+
+        self.indptr = cp.asarray(model.indptr)
+        self.indices = cp.asarray(model.indices)
+        self.weights = cp.asarray(model.weights)
+
+        if queue is None:
+            from src.delay_queue import DelayQueue
+            queue = DelayQueue(model.num_neurons, xp=cp)
+        self.queue = queue
+        self.queue.reserve(model.max_delay)
+
+    @classmethod
+    def from_system(cls, system):
+        model = compile_system(system)
+        return cls(model, system.reserve_delay_queue(model.max_delay, xp=cp), system.verbose)
+
+    # Advances one tick; returns False if nothing fired or arrived (the state did not change)
+    def tick(self):
+        N = len(self.spike_counts)
+        threads = 32
+        blocks = (N + threads - 1) // threads
+
+        apply_rule_table_kernel((blocks,), (threads,),
+            (self.spike_counts, self.rule_ptr, self.kinds, self.thresholds, self.consumes,
+             self.pred_ptr, self.pred_bases, self.pred_moduli, self.pred_exact,
+             self.selected, self.fire_counts, N))
+
+        # Kernels run asynchronously, so each phase is timed up to a device synchronization
+        prof = self.profiler
+        if prof is not None:
+            cp.cuda.Device().synchronize()
+            prof.lap("rules")
+            prof.count("firings", int(self.fire_counts.sum()))
+            prof.count("active_neurons", int(cp.count_nonzero(self.fire_counts)))
+
+        if self.verbose:
+            print("fire_counts_host:", self.fire_counts.get())
+            print("spike_counts:", self.spike_counts.get())
+            if prof is not None:
+                prof.lap("transfer")
+
+        # Fan out on the device and schedule the spikes into the delay queue
+        firing = cp.flatnonzero(self.fire_counts)
+        if prof is not None:
+            prof.touch(firing.get())
+        rules = self.selected[firing]
+        amounts = self.produces[rules]
+        owner, edges = fan_out_edges(self.indptr, firing, xp=cp)
+        sent = amounts[owner] * self.weights[edges]
+        self.queue.schedule(self.delays[rules][owner], self.indices[edges], sent)
+        if prof is not None:
+            cp.cuda.Device().synchronize()
+            prof.lap("fan_out")
+            prof.count("spikes_emitted", int(sent.sum()))
+            due = self.queue.due()
+            prof.count("spikes_delivered", int(due.sum()))
+            prof.touch(cp.flatnonzero(due).get())
+
+        arrived = self.queue.deliver(self.spike_counts)
+        if prof is not None:
+            cp.cuda.Device().synchronize()
+            prof.lap("delivery")
+        return arrived or len(firing) > 0
+
+    # Spike counts at the given neuron positions (all neurons if None), copied to the host
+    def counts_array(self, positions=None):
+        prof = self.profiler
+        start = prof.clock() if prof is not None else 0
+        if positions is None:
+            counts = self.spike_counts.get()
+        else:
+            counts = self.spike_counts[cp.asarray(positions)].get()
+        if prof is not None:
+            prof.add("transfer", prof.clock() - start)
+        return counts
+
+    # Copies the device spike counts back to the Neuron objects
+    def sync(self, neurons):
+        for n_id, count in zip(self.neuron_order, self.spike_counts.get().tolist()):
+            neurons[n_id].spike_count = count
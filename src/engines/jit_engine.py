@@ -0,0 +1,193 @@
+import warnings
+import numpy as np
+from src.compiled import THRESHOLD, CALLABLE, REGEX, compile_system
+from src.engines.numpy_engine import NumpyEngine, evaluate_condition
+
+TABLE_VALUES = 1 << 24      # Bound on the tabulated values of the Python callable conditions
+
+# The kernels below are plain Python over numpy arrays, compiled to native code by Numba
+# when it is installed
+try:
+    from numba import njit
+    JIT_AVAILABLE = True
+    jit = njit(cache=True, nogil=True)
+except ImportError:
+    JIT_AVAILABLE = False
+
+    def jit(function):
+        return function
+
+
+# Whether a spike count satisfies one of the predicates [start, end) (see src/regex.py)
+@jit
+def matches(count, start, end, bases, moduli, exact):
+    for p in range(start, end):
+        base = bases[p]
+        if exact[p]:
+            if count == base:
+                return True
+        elif count >= base and (count - base) % moduli[p] == 0:
+            return True
+    return False
+
+
+# Ticks until the next tick with arrivals in a delay queue buffer, -1 if nothing is in flight
+@jit
+def next_arrival(buffer, tick):
+    capacity, n = buffer.shape
+    for d in range(capacity):
+        slot = (tick + d) % capacity
+        for j in range(n):
+            if buffer[slot, j] != 0:
+                return d
+    return -1
+
+
+# Runs up to `ticks` ticks of a compiled model: every neuron applies its first applicable
+# rule, the produced spikes (times the edge weight) go into the delay queue buffer (row
+# (tick + delay) % capacity) on every out-edge, and the row due at the end of the tick is
+# delivered. After every tick the counts at `positions` are written to the next row of
+# `rows`. With fast_forward, idle ticks before the next arrival are skipped (their rows
+# repeat the last one) and the run stops after a tick in which nothing fired or arrived and
+# nothing is in flight.
+# Callable rule r is looked up in table[callable_row[r], count]; a tick where a neuron of
+# callable_owners has a count past the table is not started.
+# Returns (ticks advanced, new tick, halted, count missing from the table or -1).
+@jit
+def run_kernel(ticks, counts, buffer, tick, rule_ptr, consumes, produces, delays, thresholds,
+               kinds, pred_ptr, pred_bases, pred_moduli, pred_exact, callable_row, table,
+               callable_owners, indptr, indices, weights, positions, rows, fast_forward):
+    capacity, n = buffer.shape
+    done = 0
+    while done < ticks:
+        for i in callable_owners:
+            if counts[i] >= table.shape[1]:
+                return done, tick, False, counts[i]
+
+        fired = False
+        for i in range(n):
+            count = counts[i]
+            for r in range(rule_ptr[i], rule_ptr[i + 1]):
+                if count < consumes[r]:
+                    continue
+                kind = kinds[r]
+                if kind == THRESHOLD:
+                    met = count >= thresholds[r]
+                elif kind == REGEX:
+                    met = matches(count, pred_ptr[r], pred_ptr[r + 1], pred_bases, pred_moduli, pred_exact)
+                elif kind == CALLABLE:
+                    met = table[callable_row[r], count]
+                else:
+                    met = False
+                if not met:
+                    continue
+                counts[i] = count - consumes[r]
+                fired = True
+                amount = produces[r]
+                if amount > 0:
+                    slot = (tick + delays[r]) % capacity
+                    for e in range(indptr[i], indptr[i + 1]):
+                        buffer[slot, indices[e]] += amount * weights[e]
+                break
+
+        slot = tick % capacity
+        arrived = False
+        for j in range(n):
+            amount = buffer[slot, j]
+            if amount != 0:
+                counts[j] += amount
+                buffer[slot, j] = 0
+                arrived = True
+        tick += 1
+        for c in range(len(positions)):
+            rows[done, c] = counts[positions[c]]
+        done += 1
+
+        if fired or arrived or not fast_forward:
+            continue
+        idle = next_arrival(buffer, tick)
+        if idle < 0:
+            return done, tick, True, -1
+        skip = min(idle, ticks - done)
+        for k in range(skip):
+            for c in range(len(positions)):
+                rows[done + k, c] = rows[done - 1, c]
+        done += skip
+        tick += skip
+    return done, tick, False, -1
+
+
+# CPU engine that runs many ticks per call in one compiled loop (run_ticks), for models with
+# too little work per tick for array operations to pay off. Python callable conditions are
+# tabulated over the spike counts reached so far (they are assumed to depend on the count
+# only). Single ticks (profiling, cycle detection, verbose runs) go through the numpy engine
+# it extends.
+class JitEngine(NumpyEngine):
+    available = JIT_AVAILABLE
+
+    def __init__(self, model, queue=None):
+        super().__init__(model, queue)
+        self.callable_row = np.full(model.num_rules, -1, dtype=np.int64)
+        self.callable_row[self.callable_rules] = np.arange(len(self.callable_rules))
+        self.callable_owners = np.unique(model.rule_owner[self.callable_rules])
+        self.table = np.zeros((len(self.callable_rules), 0), dtype=np.bool_)
+
+    # Without Numba this is the numpy engine; interpret=True runs the kernel as plain Python
+    # instead (slow, for testing)
+    @classmethod
+    def from_system(cls, system, interpret=False):
+        model = compile_system(system)
+        queue = system.reserve_delay_queue(model.max_delay)
+        if not (JIT_AVAILABLE or interpret):
+            warnings.warn("Numba is not installed; the jit engine runs as the numpy engine", RuntimeWarning)
+            return NumpyEngine(model, queue)
+        return cls(model, queue)
+
+    # Extends the table of the callable conditions to counts up to `count`; False if it would
+    # grow past TABLE_VALUES
+    def tabulate(self, count):
+        known = self.table.shape[1]
+        width = max(count + 1, 2 * known)
+        if width * len(self.callable_rules) > TABLE_VALUES:
+            width = count + 1
+            if width * len(self.callable_rules) > TABLE_VALUES:
+                return False
+        table = np.zeros((len(self.callable_rules), width), dtype=np.bool_)
+        table[:, :known] = self.table
+        counts = np.arange(known, width, dtype=np.int64)
+        for row, r in enumerate(self.callable_rules.tolist()):
+            table[row, known:] = evaluate_condition(self.model.callables[r], counts)
+        self.table = table
+        return True
+
+    # Advances up to `ticks` ticks in kernel calls (see run_kernel), with a numpy engine tick
+    # whenever a callable condition meets a count too large to tabulate. Returns the ticks
+    # advanced, the counts at `positions` after each of them and whether the system halted.
+    def run_ticks(self, ticks, positions, fast_forward=True):
+        m = self.model
+        queue = self.queue
+        rows = np.empty((ticks, len(positions)), dtype=np.int64)
+        done = 0
+        halted = False
+        while done < ticks and not halted:
+            advanced, queue.tick, halted, missing = run_kernel(
+                ticks - done, self.spike_counts, queue.buffer, queue.tick, m.rule_ptr, m.consumes,
+                m.produces, m.delays, m.thresholds, m.kinds, m.pred_ptr, m.pred_bases,
+                m.pred_moduli, m.pred_exact, self.callable_row, self.table, self.callable_owners,
+                m.indptr, m.indices, m.weights, positions, rows[done:], fast_forward)
+            done += advanced
+            if missing < 0 or self.tabulate(missing):
+                continue
+            active = NumpyEngine.tick(self)
+            rows[done] = self.spike_counts[positions]
+            done += 1
+            if not active and fast_forward:
+                idle = queue.next_arrival()
+                halted = idle is None
+                skip = 0 if halted else min(idle, ticks - done)
+                rows[done:done + skip] = rows[done - 1]
+                queue.advance(skip)
+                done += skip
+        if queue.hash_weights is not None:
+            queue.rehash()
+        return done, rows[:done], halted
@@ -0,0 +1,134 @@
+import numpy as np
+from src.adjacency import fan_out_edges
+from src.compiled import THRESHOLD, CALLABLE, REGEX, compile_system
+from src.delay_queue import DelayQueue
+from src.regex import evaluate_predicates
+
+
+# Evaluates a Python rule condition over spike counts. For an array of counts the condition
+# is first called once on the whole array (conditions such as lambda x: x >= 1 vectorize);
+# if that does not give one boolean per count it is called once per element.
+def evaluate_condition(condition, counts):
+    if np.ndim(counts) == 0:
+        return bool(condition(int(counts)))
+    try:
+        met = np.asarray(condition(counts))
+        if met.dtype == np.bool_ and met.shape == counts.shape:
+            return met
+    except (TypeError, ValueError):
+        pass
+    return np.fromiter((bool(condition(c)) for c in counts.tolist()), dtype=np.bool_, count=len(counts))
+
+
+# Advances a CompiledModel one whole tick at a time with array operations
+class NumpyEngine:
+    profiler = None     # Profiler set by SNSystem.profile()
+
+    def __init__(self, model, queue=None):
+        self.model = model
+        self.spike_counts = model.spikes.copy()
+        self.queue = queue if queue is not None else DelayQueue(model.num_neurons)
+        self.queue.reserve(model.max_delay)
+        self.weights = model.weights if model.weighted else None
+
+        self.callable_rules = np.flatnonzero(model.kinds == CALLABLE)
+        self.regex_rules = np.flatnonzero(model.kinds == REGEX)
+        if len(self.regex_rules):
+            # Predicates of the regex rules in rule order, with the neuron each one checks
+            # and where each rule's predicates start
+            counts = np.diff(model.pred_ptr)[self.regex_rules]
+            self.pred_starts = np.cumsum(counts) - counts
+            rows = np.repeat(model.pred_ptr[self.regex_rules] - self.pred_starts, counts) + np.arange(counts.sum())
+            self.pred_owner = np.repeat(model.rule_owner[self.regex_rules], counts)
+            self.predicates = model.pred_bases[rows], model.pred_moduli[rows], model.pred_exact[rows]
+        self.segment_starts = model.rule_ptr[:-1][model.rule_counts > 0]
+        self.has_rules = model.rule_counts > 0
+
+    @classmethod
+    def from_system(cls, system):
+        model = compile_system(system)
+        return cls(model, system.reserve_delay_queue(model.max_delay))
+
+    # Applicability of every rule against its owner's spike count. spikes may carry leading
+    # batch axes (see src/batch.py); the rules are always the last axis.
+    def rules_applicable(self, spikes):
+        m = self.model
+        owner_spikes = spikes[..., m.rule_owner]
+        met = (m.kinds == THRESHOLD) & (owner_spikes >= m.thresholds)
+        for r in self.callable_rules.tolist():
+            met[..., r] = evaluate_condition(m.callables[r], owner_spikes[..., r])
+        if len(self.regex_rules):
+            matched = evaluate_predicates(spikes[..., self.pred_owner], *self.predicates)
+            met[..., self.regex_rules] = np.logical_or.reduceat(matched, self.pred_starts, axis=-1)
+        return met & (owner_spikes >= m.consumes)
+
+    # Index of the first applicable rule of every neuron, -1 if none applies,
+    # computed for the whole population in one segmented reduction
+    def select_rules(self, spikes=None):
+        m = self.model
+        if spikes is None:
+            spikes = self.spike_counts
+        candidates = np.where(self.rules_applicable(spikes), np.arange(m.num_rules), m.num_rules)
+        selected = np.full(spikes.shape, -1, dtype=np.int64)
+        if len(self.segment_starts):
+            first = np.minimum.reduceat(candidates, self.segment_starts, axis=-1)
+            selected[..., self.has_rules] = np.where(first < m.num_rules, first, -1)
+        return selected
+
+    # Applies the selected rules and schedules their spikes on every out-edge. Returns whether
+    # any rule fired, with the neurons that sent spikes and the rules they used.
+    def fire(self):
+        m = self.model
+        prof = self.profiler
+        selected = self.select_rules()
+        firing = np.flatnonzero(selected >= 0)
+        rules = selected[firing]
+
+        self.spike_counts[firing] -= m.consumes[rules]
+
+        fired = len(firing) > 0
+        if prof is not None:
+            prof.lap("rules")
+            prof.count("firings", len(firing))
+            prof.count("active_neurons", len(firing))
+            prof.touch(firing)
+
+        # Schedule the produced spikes on every out-edge of the firing neurons
+        sending = m.produces[rules] > 0
+        firing, rules = firing[sending], rules[sending]
+        owner, edges = fan_out_edges(m.indptr, firing)
+        targets = m.indices[edges]
+        amounts = m.produces[rules][owner]
+        if self.weights is not None:
+            amounts = amounts * self.weights[edges]
+        self.queue.schedule(m.delays[rules][owner], targets, amounts)
+        if prof is not None:
+            prof.lap("fan_out")
+            prof.count("spikes_emitted", int(amounts.sum()))
+        return fired, firing, rules
+
+    # Advances one tick; returns False if nothing fired or arrived (the state did not change)
+    def tick(self):
+        fired, _, _ = self.fire()
+
+        # Deliver everything due at the end of this tick
+        prof = self.profiler
+        if prof is not None:
+            due = self.queue.due()
+            prof.count("spikes_delivered", int(due.sum()))
+            prof.touch(np.flatnonzero(due))
+        arrived = self.queue.deliver(self.spike_counts)
+        if prof is not None:
+            prof.lap("delivery")
+        return arrived or fired
+
+    # Spike counts at the given neuron positions (all neurons if None)
+    def counts_array(self, positions=None):
+        if positions is None:
+            return self.spike_counts.copy()
+        return self.spike_counts[positions]
+
+    # Writes the current spike counts back to the Neuron objects
+    def sync(self, neurons):
+        for nid, count in zip(self.model.ids, self.spike_counts.tolist()):
+            neurons[nid].spike_count = count
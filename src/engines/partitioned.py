@@ -0,0 +1,360 @@
+import os
+import threading
+import weakref
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from src.adjacency import fan_out_edges
+from src.compiled import CompiledModel, compile_system, permute_model
+from src.delay_queue import DelayQueue
+from src.engines.numpy_engine import NumpyEngine
+from src.partition import partition_graph
+from src.profiler import COUNTERS
+
+STOP = -1
+BLOCK_TICKS = 1024      # Ticks the workers run per command in run_ticks
+ROW_VALUES = 1 << 20    # Counts they can record per command (at least one row of every neuron)
+NO_POSITIONS = np.empty(0, dtype=np.int64)
+
+
+# numpy array backed by a new shared memory block
+def shared_array(shape, dtype=np.int64):
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def attach_array(name, shape, dtype=np.int64):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+# Rows [start, end) of a model as a model of their own, keeping only the synapses that stay
+# inside the block. Synapses leaving it are returned separately as a CSR over global targets,
+# with their weights.
+def split_block(model, start, end):
+    rule_start, rule_end = int(model.rule_ptr[start]), int(model.rule_ptr[end])
+    edge_start, edge_end = int(model.indptr[start]), int(model.indptr[end])
+    sources = np.repeat(np.arange(end - start, dtype=np.int64), np.diff(model.indptr[start:end + 1]))
+    targets = model.indices[edge_start:edge_end]
+    weights = model.weights[edge_start:edge_end]
+    inside = (targets >= start) & (targets < end)
+
+    def csr(keep):
+        indptr = np.zeros(end - start + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources[keep], minlength=end - start), out=indptr[1:])
+        return indptr
+
+    pred_start, pred_end = int(model.pred_ptr[rule_start]), int(model.pred_ptr[rule_end])
+    callables = {r - rule_start: c for r, c in model.callables.items() if rule_start <= r < rule_end}
+    block = CompiledModel(model.ids[start:end], model.spikes[start:end],
+                          model.rule_ptr[start:end + 1] - rule_start,
+                          model.consumes[rule_start:rule_end], model.produces[rule_start:rule_end],
+                          model.delays[rule_start:rule_end], model.thresholds[rule_start:rule_end],
+                          model.kinds[rule_start:rule_end], callables,
+                          csr(inside), targets[inside] - start, verbose=model.verbose[start:end],
+                          predicates=(model.pred_ptr[rule_start:rule_end + 1] - pred_start,
+                                      model.pred_bases[pred_start:pred_end],
+                                      model.pred_moduli[pred_start:pred_end],
+                                      model.pred_exact[pred_start:pred_end]),
+                          weights=weights[inside])
+    return block, csr(~inside), targets[~inside], weights[~inside]
+
+
+# Profiler stand-in of a worker: counts into the worker's row of a shared array, which the
+# main process adds to its profiler; the workers' time is not measured
+class WorkerCounters:
+    def __init__(self, row):
+        self.row = row
+
+    def lap(self, phase):
+        pass
+
+    def count(self, counter, amount):
+        self.row[COUNTERS.index(counter)] += amount
+
+    def touch(self, positions):
+        pass
+
+
+# One block of the partitioned system, ticked in its own process. Its spike counts and its
+# columns of the delay queue are views of the shared arrays. Spikes for other blocks are
+# written to its outbox as (delay, target, amount) rows grouped by destination block; the
+# outboxes are double-buffered by tick parity, so one barrier per tick separates writing
+# them from reading them.
+class PartitionWorker(NumpyEngine):
+    def __init__(self, part, block, remote_indptr, remote_indices, remote_weights, bounds, arrays):
+        start, end = int(bounds[part]), int(bounds[part + 1])
+        super().__init__(block, DelayQueue.over(arrays["queue"][:, start:end]))
+        self.spike_counts = arrays["spikes"][start:end]
+        self.part = part
+        self.start = start
+        self.bounds = bounds
+        self.remote_indptr = remote_indptr
+        self.remote_indices = remote_indices
+        self.remote_weights = remote_weights
+        self.outboxes = arrays["outbox"]   # parity x rows x (delay, target, amount)
+        self.outbox_ptr = arrays["outbox_ptr"]
+        self.sent = arrays["sent"]          # parity x sender x receiver -> rows
+        self.profiler = WorkerCounters(arrays["counters"][part])
+
+    def tick(self, barrier):
+        m = self.model
+        fired, firing, rules = self.fire()
+        parity = self.queue.tick % 2
+
+        owner, edges = fan_out_edges(self.remote_indptr, firing)
+        targets = self.remote_indices[edges]
+        dest = np.searchsorted(self.bounds, targets, side="right") - 1
+        order = np.argsort(dest, kind="stable")
+        offset = self.outbox_ptr[self.part]
+        rows = self.outboxes[parity, offset:offset + len(order)]
+        rows[:, 0] = m.delays[rules][owner][order]
+        rows[:, 1] = targets[order]
+        rows[:, 2] = (m.produces[rules][owner] * self.remote_weights[edges])[order]
+        self.sent[parity, self.part] = np.bincount(dest, minlength=len(self.bounds) - 1)
+        self.profiler.count("spikes_emitted", int(rows[:, 2].sum()))
+
+        barrier.wait()
+
+        inbox = []
+        for sender in range(len(self.bounds) - 1):
+            count = self.sent[parity, sender, self.part]
+            if sender != self.part and count:
+                offset = self.outbox_ptr[sender] + self.sent[parity, sender, :self.part].sum()
+                inbox.append(self.outboxes[parity, offset:offset + count])
+        if inbox:
+            inbox = np.concatenate(inbox)
+            self.queue.schedule(inbox[:, 0], inbox[:, 1] - self.start, inbox[:, 2])
+
+        self.profiler.count("spikes_delivered", int(self.queue.due().sum()))
+        arrived = self.queue.deliver(self.spike_counts)
+        return arrived or fired
+
+
+# Process entry point: attaches the shared arrays and runs commands from the main process.
+# control holds (ticks to run or STOP, current tick, number of recorded positions); every
+# command starts and ends at control_barrier. After each tick a worker marks whether its
+# block changed in active[part, tick] and writes the counts of its recorded neurons to that
+# tick's row of rows.
+def run_worker(part, model, bounds, names, shapes, control_barrier, tick_barrier):
+    handles = []
+    arrays = {}
+    for key, name in names.items():
+        shm, arrays[key] = attach_array(name, shapes[key])
+        handles.append(shm)
+    arrays["outbox_ptr"] = shapes["outbox_ptr"]
+    start, end = int(bounds[part]), int(bounds[part + 1])
+    block, remote_indptr, remote_indices, remote_weights = split_block(model, start, end)
+    worker = PartitionWorker(part, block, remote_indptr, remote_indices, remote_weights, bounds, arrays)
+    control = arrays["control"]
+    active = arrays["active"][part]
+    try:
+        while True:
+            control_barrier.wait()
+            if control[0] == STOP:
+                break
+            ticks, worker.queue.tick, width = (int(value) for value in control)
+            positions = arrays["positions"][:width]
+            columns = np.flatnonzero((positions >= start) & (positions < end))
+            local = positions[columns] - start
+            rows = arrays["rows"][:ticks * width].reshape(ticks, width)
+            for t in range(ticks):
+                active[t] = worker.tick(tick_barrier)
+                rows[t, columns] = worker.spike_counts[local]
+            control_barrier.wait()
+    except BaseException:
+        control_barrier.abort()
+        tick_barrier.abort()
+        raise
+
+
+# Stops the workers and removes the shared memory blocks. Only the process that started the
+# workers does this: forked workers inherit the finalizers of engines that are not theirs.
+def shutdown(owner, processes, control, control_barrier, handles):
+    if os.getpid() != owner:
+        return
+    try:
+        control[0] = STOP
+        control_barrier.wait(timeout=10)
+    except threading.BrokenBarrierError:
+        pass
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+    for shm in handles:
+        shm.unlink()
+
+
+# Splits the neuron graph into balanced blocks with few synapses between them (see
+# src/partition.py) and ticks every block in its own process. The spike counts and the delay
+# queue live in shared memory, in block order; each tick ends with the blocks exchanging
+# the spikes that cross between them, so the result is tick-for-tick the NumPy engine's.
+# Runs without a profiler or cycle detection go through run_ticks, which hands the workers
+# up to BLOCK_TICKS ticks per command instead of one.
+class PartitionedEngine:
+    profiler = None     # Profiler set by SNSystem.profile(); the workers' time shows as "other"
+                        # and their counters are summed
+
+    def __init__(self, model, queue=None, parts=None):
+        parts = max(1, min(parts or os.cpu_count() or 1, model.num_neurons))
+        weights = 1 + model.rule_counts + np.diff(model.indptr)
+        labels = partition_graph(model.indptr, model.indices, model.num_neurons, parts, weights)
+        self.order = np.argsort(labels, kind="stable")
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(self.order))
+        self.bounds = np.zeros(parts + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=parts), out=self.bounds[1:])
+        self.model = model
+        self.parts = parts
+        permuted = permute_model(model, self.order)
+
+        if queue is None:
+            queue = DelayQueue(model.num_neurons, model.max_delay)
+        queue.reserve(model.max_delay)
+
+        # Synapses leaving each block bound the rows its outbox can need in one tick
+        sources = np.repeat(np.arange(model.num_neurons), np.diff(permuted.indptr))
+        source_part = np.searchsorted(self.bounds, sources, side="right") - 1
+        target_part = np.searchsorted(self.bounds, permuted.indices, side="right") - 1
+        crossing = np.bincount(source_part[source_part != target_part], minlength=parts)
+        outbox_ptr = np.zeros(parts + 1, dtype=np.int64)
+        np.cumsum(crossing, out=outbox_ptr[1:])
+
+        shapes = {
+            "spikes": (model.num_neurons,),
+            "queue": (queue.capacity, model.num_neurons),
+            "outbox": (2, int(outbox_ptr[-1]), 3),
+            "sent": (2, parts, parts),
+            "active": (parts, BLOCK_TICKS),
+            "counters": (parts, len(COUNTERS)),
+            "control": (3,),
+            "positions": (model.num_neurons,),
+            "rows": (max(min(ROW_VALUES, BLOCK_TICKS * model.num_neurons), model.num_neurons),),
+        }
+        self.handles = []
+        names = {}
+        arrays = {}
+        for key, shape in shapes.items():
+            shm, arrays[key] = shared_array(shape)
+            self.handles.append(shm)
+            names[key] = shm.name
+        shapes["outbox_ptr"] = outbox_ptr
+        arrays["spikes"][:] = permuted.spikes
+        arrays["queue"][:] = queue.buffer[:, self.order]
+        self.spike_counts = arrays["spikes"]
+        self.active = arrays["active"]
+        self.counters = arrays["counters"]
+        self.control = arrays["control"]
+        self.positions = arrays["positions"]
+        self.rows = arrays["rows"]
+        self.queue = queue
+        queue.buffer = arrays["queue"]
+        queue.hash_weights = None
+
+        # Both barriers stay referenced here: Process.start() drops its arguments, and a
+        # collected barrier's shared memory would be reused while the workers still wait on it
+        context = mp.get_context()
+        self.control_barrier = context.Barrier(parts + 1)
+        self.tick_barrier = context.Barrier(parts)
+        self.processes = [context.Process(target=run_worker, daemon=True,
+                                          args=(part, permuted, self.bounds, names, shapes,
+                                                self.control_barrier, self.tick_barrier))
+                          for part in range(parts)]
+        for process in self.processes:
+            process.start()
+        self._finalizer = weakref.finalize(self, shutdown, os.getpid(), self.processes, self.control,
+                                           self.control_barrier, self.handles)
+
+    @classmethod
+    def from_system(cls, system, parts=None):
+        model = compile_system(system)
+        return cls(model, system.reserve_delay_queue(model.max_delay), parts)
+
+    # The queue is filled by the workers, so fingerprints must be recomputed from its buffer
+    remote_queue = True
+    # The workers do not report which neurons fired or received spikes, so a TickWatch
+    # compares whole configurations (see src/stream.py)
+    untracked_changes = True
+
+    # Has every block run `ticks` ticks (up to BLOCK_TICKS) in one command, recording the
+    # counts at `positions` (model order) after each of them. Returns whether anything fired
+    # or arrived in each tick, and the recorded rows.
+    def command(self, ticks, positions=NO_POSITIONS):
+        width = len(positions)
+        self.positions[:width] = self.rank[positions]
+        self.control[:] = ticks, self.queue.tick, width
+        self.counters[:] = 0
+        try:
+            self.control_barrier.wait()
+            self.control_barrier.wait()
+        except threading.BrokenBarrierError:
+            self.close()
+            raise RuntimeError("A partition worker failed")
+        self.queue.tick += ticks
+        return self.active[:, :ticks].any(axis=0), self.rows[:ticks * width].reshape(ticks, width)
+
+    # Advances every block one tick; returns False if nothing fired or arrived anywhere
+    def tick(self):
+        active, _ = self.command(1)
+        prof = self.profiler
+        if prof is not None:
+            for counter, total in zip(COUNTERS, self.counters.sum(axis=0).tolist()):
+                prof.count(counter, total)
+        return bool(active[0])
+
+    # Advances up to `ticks` ticks, BLOCK_TICKS per command so the main process meets the
+    # workers once per block rather than once per tick (see SNSystem._run_block). Returns the
+    # ticks advanced, the counts at `positions` after each of them and whether the system
+    # halted. With fast_forward, the idle ticks before the next arrival are skipped between
+    # blocks, and the run stops after the first tick of a block's idle tail if nothing is left
+    # in flight at its end (no spike can arrive before then without ending the tail).
+    def run_ticks(self, ticks, positions, fast_forward=True):
+        queue = self.queue
+        rows = np.empty((ticks, len(positions)), dtype=np.int64)
+        block = max(1, min(BLOCK_TICKS, len(self.rows) // max(1, len(positions))))
+        done = 0
+        while done < ticks:
+            count = min(block, ticks - done)
+            active, recorded = self.command(count, positions)
+            rows[done:done + count] = recorded
+            done += count
+            if active[-1] or not fast_forward:
+                continue
+            idle = queue.next_arrival()
+            if idle is None:
+                tail = count - int(np.flatnonzero(active)[-1]) - 1 if active.any() else count
+                done -= tail - 1
+                queue.tick -= tail - 1
+                return done, rows[:done], True
+            skip = min(idle, ticks - done)
+            rows[done:done + skip] = rows[done - 1]
+            queue.advance(skip)
+            done += skip
+        return done, rows[:done], False
+
+    # Spike counts at the given neuron positions (all neurons if None), in model order
+    def counts_array(self, positions=None):
+        if positions is None:
+            return self.spike_counts[self.rank]
+        return self.spike_counts[self.rank[positions]]
+
+    # In-flight spikes in model order, see DelayQueue.pending()
+    def pending_array(self):
+        return self.queue.pending()[:, self.rank]
+
+    def sync(self, neurons):
+        for nid, count in zip(self.model.ids, self.counts_array().tolist()):
+            neurons[nid].spike_count = count
+
+    # Stops the workers and hands the delay queue back in model order, in private memory
+    def close(self):
+        if not self._finalizer.alive:
+            return
+        self.spike_counts = self.spike_counts.copy()
+        self.queue.take(self.rank)
+        self.active = self.active.copy()
+        self.counters = self.counters.copy()
+        self.control = self.control.copy()
+        self._finalizer()
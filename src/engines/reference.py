@@ -0,0 +1,71 @@
+import numpy as np
+from src.adjacency import fan_out_edges
+
+
+# Pure-Python reference engine working directly on the Neuron objects
+class ReferenceEngine:
+    profiler = None     # Profiler set by SNSystem.profile()
+
+    def __init__(self, system):
+        self.system = system
+
+    @classmethod
+    def from_system(cls, system):
+        system.materialize()
+        return cls(system)
+
+    # Advances one tick; returns False if nothing fired or arrived (the state did not change)
+    def tick(self):
+        system = self.system
+        neurons = system.neurons
+        queue = system.reserve_delay_queue()
+        prof = self.profiler
+
+        firing = []
+        sources, delays, amounts = [], [], []
+        for n_id, neuron in neurons.items():
+            emitted = neuron.fire()
+            if emitted is not None:
+                firing.append(system.neuron_index[n_id])
+                if emitted[1] > 0:
+                    sources.append(firing[-1])
+                    delays.append(emitted[0])
+                    amounts.append(emitted[1])
+        firings = len(firing)
+        if prof is not None:
+            prof.lap("rules")
+            prof.count("firings", firings)
+            prof.count("active_neurons", firings)
+            prof.touch(np.array(firing, dtype=np.int64))
+
+        if sources:
+            queue.reserve(max(delays))
+            indptr, indices, weights = system.adjacency.merged(len(system.neuron_ids))
+            owner, edges = fan_out_edges(indptr, np.array(sources, dtype=np.int64))
+            sent = np.array(amounts, dtype=np.int64)[owner] * weights[edges]
+            queue.schedule(np.array(delays, dtype=np.int64)[owner], indices[edges], sent)
+            if prof is not None:
+                prof.count("spikes_emitted", int(sent.sum()))
+        if prof is not None:
+            prof.lap("fan_out")
+
+        targets, amounts = queue.pop()
+        for target, amount in zip(targets.tolist(), amounts.tolist()):
+            neurons[system.neuron_ids[target]].receive_spike(amount)
+        if prof is not None:
+            prof.lap("delivery")
+            prof.count("spikes_delivered", int(amounts.sum()))
+            prof.touch(targets)
+        return firings > 0 or len(targets) > 0
+
+    # Spike counts at the given neuron positions (all neurons if None)
+    def counts_array(self, positions=None):
+        ids = self.system.neuron_ids
+        neurons = self.system.neurons
+        if positions is None:
+            return np.array([neurons[n_id].spike_count for n_id in ids], dtype=np.int64)
+        return np.array([neurons[ids[p]].spike_count for p in positions.tolist()], dtype=np.int64)
+
+    # The Neuron objects already hold the state
+    def sync(self, neurons):
+        pass
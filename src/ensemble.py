@@ -0,0 +1,166 @@
+import argparse
+import csv
+import hashlib
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SUMMARY_FIELDS = ("name", "status", "ticks", "seconds", "neurons", "synapses", "total_spikes", "error")
+
+TIMEOUT_CHECK_SECONDS = 0.1    # Target time between two timeout checks inside a job
+
+
+# One simulation of the ensemble. source is a .snps file, a directory written by
+# save_compiled, or a CompiledModel (sent to the worker as arrays, without re-parsing).
+class Job:
+    def __init__(self, source, ticks, timeout=None, engine="numpy", name=None):
+        self.source = source
+        self.ticks = ticks
+        self.timeout = timeout          # Seconds, checked between chunks of ticks
+        self.engine = engine
+        self.name = name or (source if isinstance(source, str) else "model")
+
+
+# Outcome of a job. status is "ok" (ran all ticks), "halted", "timeout" or "error"
+class JobResult:
+    def __init__(self, name, status, ticks=0, seconds=0.0, neurons=0, synapses=0,
+                 counts=None, error=""):
+        self.name = name
+        self.status = status
+        self.ticks = ticks
+        self.seconds = seconds
+        self.neurons = neurons
+        self.synapses = synapses
+        self.counts = counts            # Final spike counts in model order
+        self.error = error
+
+    @property
+    def total_spikes(self):
+        return 0 if self.counts is None else int(self.counts.sum())
+
+    def row(self):
+        row = {field: getattr(self, field) for field in SUMMARY_FIELDS}
+        row["seconds"] = round(self.seconds, 6)
+        return row
+
+    def __repr__(self):
+        return f"JobResult({self.name!r}, {self.status}, ticks={self.ticks}, seconds={self.seconds:.3f})"
+
+
+# Path of the compiled copy of a .snps file, keyed by its path, size and modification time
+def cache_path(path, cache_dir):
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{hashlib.sha1(key.encode()).hexdigest()[:16]}")
+
+
+# Resolves a job source to a CompiledModel. With a cache_dir, .snps files are parsed once
+# and later runs memory-map the compiled copy instead.
+def load_source(source, cache_dir=None):
+    from src.compiled import CompiledModel, HEADER_FILE, load_compiled, save_compiled
+    from src.parser import parse_snps
+
+    if isinstance(source, CompiledModel):
+        return source
+    if os.path.isdir(source):
+        return load_compiled(source)
+    if cache_dir is None:
+        return parse_snps(source)
+
+    compiled = cache_path(source, cache_dir)
+    if os.path.exists(os.path.join(compiled, HEADER_FILE)):
+        return load_compiled(compiled)
+    model = parse_snps(source)
+    partial = f"{compiled}.{os.getpid()}.tmp"
+    save_compiled(model, partial)
+    try:
+        os.replace(partial, compiled)
+    except OSError:
+        shutil.rmtree(partial, ignore_errors=True)    # Another worker saved it first
+    return model
+
+
+# Runs one job in a worker process. Ticks are run in chunks sized to take about
+# TIMEOUT_CHECK_SECONDS, so a timeout is noticed without checking the clock every tick.
+def run_job(job, cache_dir=None):
+    from src.system import SNSystem
+
+    start = time.perf_counter()
+    result = JobResult(job.name, "ok")
+    try:
+        model = load_source(job.source, cache_dir)
+        result.neurons, result.synapses = model.num_neurons, model.num_synapses
+        system = SNSystem(engine=job.engine)
+        system.load_model(model)
+        system.record(neurons=[])
+
+        chunk = 1
+        while result.ticks < job.ticks:
+            chunk_start = time.perf_counter()
+            result.ticks += system.run(min(chunk, job.ticks - result.ticks), stop_on_halt=True)
+            if system.halted:
+                result.status = "halted"
+                break
+            now = time.perf_counter()
+            if job.timeout is not None and now - start > job.timeout:
+                result.status = "timeout"
+                break
+            per_tick = (now - chunk_start) / chunk
+            chunk = max(1, min(2 * chunk, int(TIMEOUT_CHECK_SECONDS / max(per_tick, 1e-9))))
+
+        result.counts = system.backend.counts_array()
+    except Exception as e:
+        result.status = "error"
+        result.error = f"{type(e).__name__}: {e}"
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+# Runs the jobs on a process pool (one worker per core by default) and yields each
+# JobResult as soon as its job finishes
+def run_ensemble(jobs, workers=None, cache_dir=None):
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(run_job, job, cache_dir) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def write_summary(results, path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result.row())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.ensemble",
+                                     description="Simulate many SN P models on a process pool.")
+    parser.add_argument("models", nargs="+", help=".snps files or compiled model directories")
+    parser.add_argument("--ticks", type=int, required=True, help="tick budget of every job")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per job")
+    parser.add_argument("--engine", default="numpy")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--cache-dir", default=None, help="keep compiled copies of the .snps files here")
+    parser.add_argument("--summary", default=None, help="write the summary table to this CSV file")
+    args = parser.parse_args(argv)
+
+    jobs = [Job(path, args.ticks, args.timeout, args.engine) for path in args.models]
+    results = []
+    for result in run_ensemble(jobs, args.workers, args.cache_dir):
+        results.append(result)
+        print(f"{result.status:8} {result.ticks:>10} ticks {result.seconds:9.3f}s  {result.name}"
+              + (f"  ({result.error})" if result.error else ""), flush=True)
+
+    if args.summary:
+        write_summary(sorted(results, key=lambda r: r.name), args.summary)
+    return 0 if all(r.status != "error" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+from collections import Counter
+import numpy as np
+from src.adjacency import fan_out_edges
+from src.engines.numpy_engine import NumpyEngine
+
+CHUNK_ROWS = 1 << 15    # Child configurations built at a time
+
+
+# Visited configurations as a sorted array of 64-bit fingerprints
+class FingerprintSet:
+    def __init__(self):
+        self.hashes = np.zeros(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    # Adds hashes (unique among themselves); returns the mask of those not seen before
+    def add(self, hashes):
+        fresh = ~np.isin(hashes, self.hashes, assume_unique=True)
+        self.hashes = np.union1d(self.hashes, hashes[fresh])
+        return fresh
+
+
+# Halting configurations reached by an exploration
+class ExplorationResult:
+    def __init__(self, ids, halting, depths, outputs, visited, depth, truncated):
+        self.ids = ids
+        self.halting = halting          # halting configurations x neurons (spike counts)
+        self.depths = depths            # Tick at which each halting configuration was reached
+        self.outputs = outputs          # Counter: output spike counts -> halting configurations
+        self.visited = visited          # Distinct configurations seen
+        self.depth = depth              # Ticks explored
+        self.truncated = truncated      # True if a depth or frontier limit cut the search short
+
+
+# Breadth-first exploration of every computation of a nondeterministic SN P system: at each
+# tick, every neuron with applicable rules uses one of them, in all combinations. A
+# configuration is the spike counts plus the spikes still in flight, stored as one row of
+# (1 + max delay) x neurons: block 0 holds the counts and block k the spikes arriving at the
+# end of the k-th next tick. A rule is then one row of effects (its consumption and its spikes at
+# block delay, target), so the children of a configuration are its shifted row plus the
+# effects of each combination of rules.
+class Explorer:
+    def __init__(self, model, outputs=None, max_depth=1000, max_frontier=1 << 20, workers=1, seed=0):
+        self.model = model
+        self.outputs = outputs
+        self.max_depth = max_depth
+        self.max_frontier = max_frontier
+        self.workers = workers
+
+        n = model.num_neurons
+        self.blocks = 1 + model.max_delay
+        self.width = n * self.blocks
+        self.rules = NumpyEngine(model)
+        has_rules = model.rule_counts > 0
+        self.neuron_slot = np.cumsum(has_rules) - 1         # Neuron -> column among neurons with rules
+        self.rule_slot = self.neuron_slot[model.rule_owner]
+
+        self.effects = np.zeros((model.num_rules, self.width), dtype=np.int64)
+        self.effects[np.arange(model.num_rules), model.rule_owner] -= model.consumes
+        owner, edges = fan_out_edges(model.indptr, model.rule_owner)
+        np.add.at(self.effects, (owner, model.delays[owner] * n + model.indices[edges]),
+                  model.produces[owner] * model.weights[edges])
+
+        rng = np.random.default_rng(seed)
+        self.weights = rng.integers(0, 1 << 64, size=self.width, dtype=np.uint64)
+
+    # Configuration row of the given spike counts, with pending[k - 1] arriving at the end of
+    # the k-th next tick (nothing in flight by default)
+    def configuration(self, spikes=None, pending=None):
+        row = np.zeros(self.width, dtype=np.int64)
+        row[:self.model.num_neurons] = self.model.spikes if spikes is None else spikes
+        if pending is not None:
+            pending = np.asarray(pending, dtype=np.int64).reshape(-1)
+            row[self.model.num_neurons:self.model.num_neurons + len(pending)] = pending
+        return row
+
+    def fingerprints(self, rows):
+        return rows.astype(np.uint64) @ self.weights
+
+    # Children of a block of configurations: every combination is a mixed-radix number whose
+    # digit for a neuron picks among its applicable rules, so all combinations are built with
+    # array operations, CHUNK_ROWS children at a time. Returns the children and their
+    # fingerprints (duplicates removed), and the mask of halting parents.
+    def expand(self, rows):
+        n = self.model.num_neurons
+        applicable = self.rules.rules_applicable(rows[:, :n])
+        starts = self.rules.segment_starts
+        if len(starts):
+            choices = np.add.reduceat(applicable.astype(np.int64), starts, axis=1)
+        else:
+            choices = np.zeros((len(rows), 0), dtype=np.int64)
+        halting = (choices.sum(axis=1) == 0) & ~rows[:, n:].any(axis=1)
+
+        radix = np.maximum(choices, 1)
+        if np.log2(radix).sum(axis=1).max(initial=0) > 62:
+            raise ValueError("Too many rule combinations from one configuration")
+        strides = np.cumprod(radix, axis=1) // radix
+        combos = np.where(halting, 0, np.prod(radix, axis=1))
+
+        # Rank of every applicable rule among the applicable rules of its neuron
+        ranks = np.cumsum(applicable, axis=1) - 1
+        if len(starts):
+            ranks -= (ranks[:, starts] + 1 - applicable[:, starts])[:, self.rule_slot]
+
+        shifted = np.zeros_like(rows)
+        shifted[:, :self.width - n] = rows[:, n:]
+        shifted[:, :n] += rows[:, :n]
+
+        children, hashes = [], []
+        ends = np.cumsum(combos)
+        group_ends = np.searchsorted(ends, np.arange(CHUNK_ROWS, ends[-1] + CHUNK_ROWS, CHUNK_ROWS),
+                                     side="right") if len(ends) and ends[-1] else []
+        low = 0
+        for high in np.unique(np.maximum(group_ends, 1)).tolist():
+            counts = combos[low:high]
+            parent = np.repeat(np.arange(low, high), counts)
+            local = np.arange(len(parent)) - np.repeat(np.cumsum(counts) - counts, counts)
+            digits = (local[:, None] // strides[parent]) % radix[parent]
+            chosen = applicable[parent] & (ranks[parent] == digits[:, self.rule_slot])
+            group = shifted[parent] + chosen.astype(np.int64) @ self.effects
+            group_hashes, first = np.unique(self.fingerprints(group), return_index=True)
+            children.append(group[first])
+            hashes.append(group_hashes)
+            low = high
+
+        if not children:
+            return np.zeros((0, self.width), dtype=np.int64), np.zeros(0, dtype=np.uint64), halting
+        hashes, first = np.unique(np.concatenate(hashes), return_index=True)
+        return np.concatenate(children)[first], hashes, halting
+
+    def run(self, initial=None):
+        from concurrent.futures import ProcessPoolExecutor
+
+        n = self.model.num_neurons
+        frontier = self.configuration() if initial is None else np.asarray(initial, dtype=np.int64)
+        frontier = frontier[None, :]
+        visited = FingerprintSet()
+        visited.add(self.fingerprints(frontier))
+        halting, depths = [], []
+        truncated = False
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self,))
+
+        depth = 0
+        try:
+            while len(frontier):
+                if depth == self.max_depth:
+                    truncated = True
+                    break
+                size = max(1, min(CHUNK_ROWS, -(-len(frontier) // (4 * self.workers))))
+                chunks = [frontier[i:i + size] for i in range(0, len(frontier), size)]
+                results = pool.map(expand_chunk, chunks) if pool else map(self.expand, chunks)
+
+                children, hashes = [], []
+                for chunk, (chunk_children, chunk_hashes, chunk_halting) in zip(chunks, results):
+                    halting.append(chunk[chunk_halting, :n])
+                    depths.append(np.full(int(chunk_halting.sum()), depth, dtype=np.int64))
+                    children.append(chunk_children)
+                    hashes.append(chunk_hashes)
+                hashes, first = np.unique(np.concatenate(hashes), return_index=True)
+                fresh = visited.add(hashes)
+                frontier = np.concatenate(children)[first[fresh]]
+                if len(frontier) > self.max_frontier:
+                    frontier = frontier[:self.max_frontier]
+                    truncated = True
+                depth += 1
+        finally:
+            if pool:
+                pool.shutdown()
+
+        halting = np.concatenate(halting) if halting else np.zeros((0, n), dtype=np.int64)
+        depths = np.concatenate(depths) if depths else np.zeros(0, dtype=np.int64)
+        return ExplorationResult(self.model.ids, halting, depths, self.count_outputs(halting),
+                                 len(visited), depth, truncated)
+
+    # Counter of the output neurons' spike counts over the halting configurations: keys are
+    # counts for a single output neuron id, tuples for a list of ids
+    def count_outputs(self, halting):
+        if self.outputs is None:
+            return Counter()
+        single = isinstance(self.outputs, str)
+        ids = [self.outputs] if single else list(self.outputs)
+        columns = halting[:, [self.model.index[n_id] for n_id in ids]]
+        if single:
+            return Counter(columns[:, 0].tolist())
+        return Counter(map(tuple, columns.tolist()))
+
+
+_worker_explorer = None
+
+
+def init_worker(explorer):
+    global _worker_explorer
+    _worker_explorer = explorer
+
+
+def expand_chunk(rows):
+    return _worker_explorer.expand(rows)
+
+
+# Explores a CompiledModel; see Explorer for the options
+def explore(model, outputs=None, **options):
+    return Explorer(model, outputs, **options).run()
@@ -0,0 +1,221 @@
+from collections.abc import Mapping
+import numpy as np
+
+AGGREGATES = ("last", "min", "max")
+CHUNK_VALUES = 1 << 20     # Counts held by one chunk of rows
+
+
+# Columnar store of recorded spike counts: one row per window of `every` ticks, one column
+# per recorded neuron. Rows are kept in chunks of at most chunk_size rows and CHUNK_VALUES
+# counts; the current chunk grows as rows arrive, so wide histories of few ticks stay small
+# and recording never copies full chunks. Reads as a mapping neuron id -> 1-D array of
+# recorded counts.
+class SpikeHistory(Mapping):
+    def __init__(self, neurons=None, every=1, aggregate="last", chunk_size=4096):
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {aggregate!r}, expected one of {AGGREGATES}")
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.neurons = None if neurons is None else list(neurons)   # None records every neuron
+        self.every = every
+        self.aggregate = aggregate
+        self.chunk_size = chunk_size
+
+        self.ids = []                  # Column -> neuron id
+        self.columns = {}              # Neuron id -> column
+        self.first_row = []            # Row at which each column started recording
+        self.positions = np.zeros(0, dtype=np.int64)   # Column -> neuron position in the system
+        self.bound = None              # Columns of self.positions when some neurons are not in the system
+
+        self.chunks = []               # Full chunks of rows
+        self.stored = 0                # Rows in self.chunks
+        self.current = np.zeros((0, 0), dtype=np.int64)
+        self.filled = 0                # Rows used in the current chunk
+        self.ticks_seen = 0
+        self.window = None             # Running min/max of the current window
+        self._array = None
+
+    # Resolves the recorded neurons against the system, adding columns for new neurons.
+    # Neurons not in the system (e.g. removed ones) keep their column and record 0.
+    def bind(self, system):
+        if self.neurons is None:
+            ids = [n_id for n_id in system.neuron_ids if n_id in system.neurons]
+        else:
+            ids = self.neurons
+        new_ids = [n_id for n_id in ids if n_id not in self.columns]
+        if new_ids:
+            rows = self.num_rows
+            for n_id in new_ids:
+                self.columns[n_id] = len(self.ids)
+                self.ids.append(n_id)
+                self.first_row.append(rows)
+            self._close_chunk()
+            pad = ((0, 0), (0, len(new_ids)))
+            self.chunks = [np.pad(chunk, pad) for chunk in self.chunks]
+            self.current = np.zeros((0, len(self.ids)), dtype=np.int64)
+            if self.window is not None:
+                self.window = np.pad(self.window, (0, len(new_ids)))
+            self._array = None
+        index = system.neuron_index
+        bound = [col for col, n_id in enumerate(self.ids) if n_id in index]
+        self.bound = None if len(bound) == len(self.ids) else np.array(bound, dtype=np.int64)
+        self.positions = np.array([index[self.ids[col]] for col in bound], dtype=np.int64)
+
+    # Counts read at self.positions (last axis) spread over all columns
+    def widen(self, values):
+        if self.bound is None:
+            return values
+        full = np.zeros(values.shape[:-1] + (len(self.ids),), dtype=np.int64)
+        full[..., self.bound] = values
+        return full
+
+    # Records the configuration after one tick; engine provides counts_array(positions)
+    def record(self, engine):
+        phase = self.ticks_seen % self.every
+        if self.aggregate == "last":
+            if phase == self.every - 1 and len(self.ids):
+                self._append(self.widen(engine.counts_array(self.positions)))
+        elif len(self.ids):
+            values = self.widen(engine.counts_array(self.positions))
+            if phase == 0:
+                self.window = values.copy()
+            elif self.aggregate == "min":
+                np.minimum(self.window, values, out=self.window)
+            else:
+                np.maximum(self.window, values, out=self.window)
+            if phase == self.every - 1:
+                self._append(self.window)
+        self.ticks_seen += 1
+
+    # Records `count` ticks during which the configuration did not change
+    def record_repeat(self, engine, count):
+        if count <= 0:
+            return
+        if len(self.ids) == 0:
+            self.ticks_seen += count
+            return
+        values = self.widen(engine.counts_array(self.positions))
+        self.record_block(np.broadcast_to(values, (count, len(values))))
+
+    # Records consecutive ticks at once; block is a (ticks x recorded neurons) array
+    def record_block(self, block):
+        count = len(block)
+        if len(self.ids) == 0:
+            self.ticks_seen += count
+            return
+        phase = self.ticks_seen % self.every
+        if self.aggregate == "last":
+            first = self.every - 1 - phase
+            self._append_rows(block[first::self.every])
+        else:
+            reduce = np.minimum if self.aggregate == "min" else np.maximum
+            head = min(count, (self.every - phase) % self.every)
+            if phase and head:
+                reduce(self.window, reduce.reduce(block[:head]), out=self.window)
+                if phase + head == self.every:
+                    self._append_rows(self.window[None, :])
+            full = (count - head) // self.every * self.every
+            windows = block[head:head + full].reshape(-1, self.every, len(self.ids))
+            self._append_rows(reduce.reduce(windows, axis=1))
+            tail = block[head + full:]
+            if len(tail):
+                self.window = reduce.reduce(tail).copy()
+        self.ticks_seen += count
+
+    # Rows per chunk at the current number of columns
+    @property
+    def chunk_rows(self):
+        return max(1, min(self.chunk_size, CHUNK_VALUES // max(1, len(self.ids))))
+
+    # Moves the rows of the current chunk to self.chunks
+    def _close_chunk(self):
+        if self.filled:
+            chunk = self.current if self.filled == len(self.current) else self.current[:self.filled].copy()
+            self.chunks.append(chunk)
+            self.stored += self.filled
+        self.current = np.zeros((0, self.current.shape[1]), dtype=np.int64)
+        self.filled = 0
+
+    def _append_rows(self, rows):
+        done = 0
+        limit = self.chunk_rows
+        while done < len(rows):
+            if self.filled == limit:
+                self._close_chunk()
+            if self.filled == len(self.current):
+                size = min(limit, max(self.filled + len(rows) - done, 2 * self.filled, 16))
+                grown = np.zeros((size, len(self.ids)), dtype=np.int64)
+                grown[:self.filled] = self.current[:self.filled]
+                self.current = grown
+            take = min(len(rows) - done, len(self.current) - self.filled)
+            self.current[self.filled:self.filled + take] = rows[done:done + take]
+            self.filled += take
+            done += take
+        if done:
+            self._array = None
+
+    def _append(self, row):
+        self._append_rows(row[None, :])
+
+    # Settings and recorded rows as a dict of arrays, see from_state() and src/checkpoint.py
+    def state(self):
+        return {
+            "neurons": np.array([] if self.neurons is None else self.neurons, dtype=str),
+            "all_neurons": np.array(self.neurons is None),
+            "settings": np.array([self.every, self.chunk_size, self.ticks_seen], dtype=np.int64),
+            "aggregate": np.array(self.aggregate),
+            "ids": np.array(self.ids, dtype=str),
+            "first_row": np.array(self.first_row, dtype=np.int64),
+            "rows": self.as_array(),
+            "window": np.zeros(0, dtype=np.int64) if self.window is None else self.window,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        every, chunk_size, ticks_seen = state["settings"].tolist()
+        neurons = None if state["all_neurons"] else state["neurons"].tolist()
+        history = cls(neurons, every, str(state["aggregate"]), chunk_size)
+        history.ids = state["ids"].tolist()
+        history.columns = {n_id: col for col, n_id in enumerate(history.ids)}
+        history.first_row = state["first_row"].tolist()
+        history.current = np.zeros((0, len(history.ids)), dtype=np.int64)
+        history._append_rows(state["rows"])
+        history.ticks_seen = ticks_seen
+        if len(state["window"]):
+            history.window = state["window"].copy()
+        return history
+
+    @property
+    def num_rows(self):
+        return self.stored + self.filled
+
+    # Tick index (0-based) each row was recorded at: the last tick of its window
+    @property
+    def ticks(self):
+        return np.arange(self.num_rows, dtype=np.int64) * self.every + self.every - 1
+
+    # All recorded rows as one (rows x recorded neurons) array
+    def as_array(self):
+        if self._array is None:
+            self._array = np.concatenate(self.chunks + [self.current[:self.filled]])
+        return self._array
+
+    def to_dict(self):
+        return {n_id: self[n_id].tolist() for n_id in self.ids}
+
+    def __getitem__(self, neuron_id):
+        col = self.columns[neuron_id]
+        return self.as_array()[self.first_row[col]:, col]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __eq__(self, other):
+        if isinstance(other, SpikeHistory):
+            other = other.to_dict()
+        if isinstance(other, Mapping):
+            return self.to_dict() == {k: list(v) for k, v in other.items()}
+        return NotImplemented
@@ -0,0 +1,245 @@
+import numpy as np
+from src.adjacency import merge_edges
+from src.compiled import CALLABLE, REGEX, CompiledModel
+from src.rule import Rule
+
+INITIAL_CAPACITY = 16
+
+
+# 1-D array that doubles its capacity when full, so appending n values costs O(n) overall
+class GrowableArray:
+    def __init__(self, dtype, capacity=INITIAL_CAPACITY):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    # Appends values; returns the index of the first one
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        start, end = self.size, self.size + len(values)
+        if end > len(self.data):
+            data = np.zeros(max(end, 2 * len(self.data)), dtype=self.data.dtype)
+            data[:start] = self.data[:start]
+            self.data = data
+        self.data[start:end] = values
+        self.size = end
+        return start
+
+    def append(self, value):
+        return self.extend([value])
+
+    def view(self):
+        return self.data[:self.size]
+
+    def __len__(self):
+        return self.size
+
+
+# Segments [starts[i], ends[i]) of the given items laid out back to back, in that order:
+# (ptr of the new layout, index of every new entry in the old layout)
+def gather_segments(starts, ends, order):
+    counts = (ends - starts)[order]
+    ptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    return ptr, np.repeat(starts[order] - ptr[:-1], counts) + np.arange(ptr[-1])
+
+
+# Structural edits of a CompiledModel, applied in one vectorized pass by compile(). The model
+# is kept as the base and every edit goes to growable tail arrays or tombstones:
+# - added neurons take slots after the base positions, removed ones are tombstoned
+# - replaced rules are appended to the rule tail and the neuron points at the new segment
+# - added synapses are appended to the edge tail, removed ones are tombstoned
+# so an edit takes time proportional to its own size, not the model's. compile() drops the
+# tombstones and the unused rule segments, laying everything out compactly again.
+class ModelEditor:
+    def __init__(self, model, counts=None):
+        self.base = model
+        self.counts = model.spikes if counts is None else counts    # Spike counts of the base neurons
+        self.num_base = model.num_neurons
+
+        # Neurons: slot -> id of the added ones, id -> slot overriding the base index
+        self.tail_ids = []
+        self.tail_spikes = GrowableArray(np.int64)
+        self.tail_verbose = GrowableArray(np.bool_)
+        self.slots = {}
+        self.removed = set()            # Tombstoned slots
+        self.missing = set()            # Ids used by synapses but never added
+        self.base_spikes = {}           # Base slot -> spike count set by add_neuron
+        self.base_verbose = {}
+
+        # Rules: slot -> (start, end) in the rule pool (base rules, then the tail)
+        self.segments = {}
+        self.tail_rules = {field: GrowableArray(dtype) for field, dtype in (
+            ("consumes", np.int64), ("produces", np.int64), ("delays", np.int64),
+            ("thresholds", np.int64), ("kinds", np.int8), ("pred_start", np.int64),
+            ("pred_end", np.int64))}
+        self.tail_predicates = {field: GrowableArray(dtype) for field, dtype in (
+            ("pred_bases", np.int64), ("pred_moduli", np.int64), ("pred_exact", np.bool_))}
+        self.callables = {}             # Tail rule index -> callable condition
+
+        # Synapses: edge pool of the base CSR edges, then the tail
+        self.tail_sources = GrowableArray(np.int64)
+        self.tail_targets = GrowableArray(np.int64)
+        self.tail_weights = GrowableArray(np.int64)
+        self.tail_out = {}              # Source slot -> its tail edges
+        self.removed_edges = set()
+
+    @property
+    def num_slots(self):
+        return self.num_base + len(self.tail_ids)
+
+    # Slot of a neuron id, None if it is not in the model
+    def slot(self, neuron_id):
+        slot = self.slots.get(neuron_id)
+        if slot is None:
+            slot = self.base.index.get(neuron_id)
+        if slot is None or slot in self.removed:
+            return None
+        return slot
+
+    def _new_slot(self, neuron_id):
+        slot = self.num_slots
+        self.tail_ids.append(neuron_id)
+        self.tail_spikes.append(0)
+        self.tail_verbose.append(False)
+        self.slots[neuron_id] = slot
+        return slot
+
+    # Adds a neuron, or replaces the neuron with the same id (keeping its synapses)
+    def add_neuron(self, neuron):
+        slot = self.slot(neuron.id)
+        if slot is None:
+            slot = self._new_slot(neuron.id)
+        self.missing.discard(neuron.id)
+        if slot < self.num_base:
+            self.base_spikes[slot] = neuron.spike_count
+            self.base_verbose[slot] = neuron.verbose
+        else:
+            self.tail_spikes.data[slot - self.num_base] = neuron.spike_count
+            self.tail_verbose.data[slot - self.num_base] = neuron.verbose
+        self._set_rules(slot, neuron.rules)
+
+    # Removes a neuron with its incoming and outgoing synapses
+    def remove_neuron(self, neuron_id):
+        slot = self.slot(neuron_id)
+        if slot is None:
+            raise KeyError(f"Unknown neuron {neuron_id}")
+        self.removed.add(slot)
+        self.slots.pop(neuron_id, None)
+        self.missing.discard(neuron_id)
+
+    # Replaces the rules of a neuron
+    def set_rules(self, neuron_id, rules):
+        slot = self.slot(neuron_id)
+        if slot is None:
+            raise KeyError(f"Unknown neuron {neuron_id}")
+        self._set_rules(slot, [Rule.of(rule) for rule in rules])
+
+    def _set_rules(self, slot, rules):
+        columns = self.tail_rules
+        start = self.base.num_rules + len(columns["kinds"])
+        for rule in rules:
+            predicates = rule.condition.predicates if rule.kind == REGEX else ()
+            pred_start = int(self.base.pred_ptr[-1]) + len(self.tail_predicates["pred_bases"])
+            for field, values in zip(("pred_bases", "pred_moduli", "pred_exact"), zip(*predicates)):
+                self.tail_predicates[field].extend(values)
+            if rule.kind == CALLABLE:
+                self.callables[len(columns["kinds"])] = rule.condition
+            for field, value in (("consumes", rule.consume), ("produces", rule.produce),
+                                 ("delays", rule.delay), ("thresholds", rule.threshold),
+                                 ("kinds", rule.kind), ("pred_start", pred_start),
+                                 ("pred_end", pred_start + len(predicates))):
+                columns[field].append(value)
+        self.segments[slot] = (start, self.base.num_rules + len(columns["kinds"]))
+
+    # Slot of a synapse end, registering ids that have no neuron yet
+    def _endpoint(self, neuron_id):
+        slot = self.slot(neuron_id)
+        if slot is None:
+            slot = self._new_slot(neuron_id)
+            self.missing.add(neuron_id)
+        return slot
+
+    def add_synapse(self, source_id, target_id, weight=1):
+        source = self._endpoint(source_id)
+        target = self._endpoint(target_id)
+        edge = self.base.num_synapses + self.tail_sources.append(source)
+        self.tail_targets.append(target)
+        self.tail_weights.append(weight)
+        self.tail_out.setdefault(source, []).append(edge)
+
+    # Removes the synapses from source to target
+    def remove_synapse(self, source_id, target_id):
+        source, target = self.slot(source_id), self.slot(target_id)
+        edges = []
+        if source is not None and target is not None:
+            if source < self.num_base:
+                base = self.base
+                start, end = int(base.indptr[source]), int(base.indptr[source + 1])
+                edges.extend((start + np.flatnonzero(base.indices[start:end] == target)).tolist())
+            first_tail = self.base.num_synapses
+            edges.extend(edge for edge in self.tail_out.get(source, ())
+                         if self.tail_targets.data[edge - first_tail] == target)
+        edges = [edge for edge in edges if edge not in self.removed_edges]
+        if not edges:
+            raise KeyError(f"No synapse from {source_id} to {target_id}")
+        self.removed_edges.update(edges)
+
+    # The edited model, laid out compactly, and the slot each of its positions comes from
+    # (base slots are the positions of the base model)
+    def compile(self):
+        if self.missing:
+            raise KeyError(f"Synapse references unknown neuron {next(iter(self.missing))}")
+        base = self.base
+        n = self.num_slots
+        alive = np.ones(n, dtype=np.bool_)
+        alive[list(self.removed)] = False
+        kept = np.flatnonzero(alive)
+        rank = np.full(n, -1, dtype=np.int64)
+        rank[kept] = np.arange(len(kept))
+
+        all_ids = list(base.ids) + self.tail_ids
+        ids = all_ids if len(kept) == n else [all_ids[slot] for slot in kept.tolist()]
+        spikes = np.concatenate([np.asarray(self.counts, dtype=np.int64), self.tail_spikes.view()])
+        verbose = np.concatenate([np.asarray(base.verbose, dtype=np.bool_), self.tail_verbose.view()])
+        for slot, count in self.base_spikes.items():
+            spikes[slot] = count
+        for slot, flag in self.base_verbose.items():
+            verbose[slot] = flag
+
+        # Rule segments of the kept neurons from the pool
+        tail = len(self.tail_ids)
+        starts = np.concatenate([base.rule_ptr[:-1], np.zeros(tail, dtype=np.int64)])
+        ends = np.concatenate([base.rule_ptr[1:], np.zeros(tail, dtype=np.int64)])
+        for slot, (start, end) in self.segments.items():
+            starts[slot], ends[slot] = start, end
+        rule_ptr, rules = gather_segments(starts, ends, kept)
+        pool = {field: np.concatenate([getattr(base, field), self.tail_rules[field].view()])
+                for field in ("consumes", "produces", "delays", "thresholds", "kinds")}
+        pred_ptr, preds = gather_segments(
+            np.concatenate([base.pred_ptr[:-1], self.tail_rules["pred_start"].view()]),
+            np.concatenate([base.pred_ptr[1:], self.tail_rules["pred_end"].view()]), rules)
+        pred_pool = {field: np.concatenate([getattr(base, field), self.tail_predicates[field].view()])
+                     for field in ("pred_bases", "pred_moduli", "pred_exact")}
+        kinds = pool["kinds"][rules]
+        callables = {}
+        for r in np.flatnonzero(kinds == CALLABLE).tolist():
+            old = int(rules[r])
+            callables[r] = base.callables[old] if old < base.num_rules else self.callables[old - base.num_rules]
+
+        # Synapses between kept neurons that were not removed, parallel ones merged
+        sources = np.concatenate([np.repeat(np.arange(self.num_base, dtype=np.int64), np.diff(base.indptr)),
+                                  self.tail_sources.view()])
+        targets = np.concatenate([base.indices, self.tail_targets.view()])
+        weights = np.concatenate([base.weights, self.tail_weights.view()])
+        live = alive[sources] & alive[targets]
+        live[list(self.removed_edges)] = False
+        indptr, indices, weights = merge_edges(rank[sources[live]], rank[targets[live]], weights[live], len(kept))
+
+        model = CompiledModel(ids, spikes[kept], rule_ptr, pool["consumes"][rules],
+                              pool["produces"][rules], pool["delays"][rules],
+                              pool["thresholds"][rules], kinds, callables, indptr, indices,
+                              verbose=verbose[kept],
+                              predicates=(pred_ptr, pred_pool["pred_bases"][preds],
+                                          pred_pool["pred_moduli"][preds], pred_pool["pred_exact"][preds]),
+                              weights=weights)
+        return model, kept
@@ -1,45 +1,68 @@
+from src.compiled import THRESHOLD, NEVER
+from src.rule import Rule
+
+
 # Represents a single neuron in the SN P system
 class Neuron:
+    __slots__ = ("id", "spike_count", "verbose", "_rules", "pending_spikes")
+
     def __init__(self, neuron_id, spike_count=0, rules=None, verbose=False):
         self.id = neuron_id
         self.spike_count = spike_count
         self.verbose = verbose
-        self.rules = rules or []           # List of firing rules
+        self.rules = rules or []           # List of firing rules (dicts are compiled to Rule)
         self.pending_spikes = []           # Scheduled incoming spikes (delay, amount)
 
-    # Executes one simulation tick for this neuron
+    @property
+    def rules(self):
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = [Rule.of(rule) for rule in rules]
+
+    # Executes one simulation tick for this neuron (standalone use; SNSystem keeps
+    # in-flight spikes in its DelayQueue instead)
     def tick(self):
-        new_pending = []
-        for delay, amount in self.pending_spikes:
+        pending = self.pending_spikes
+        kept = 0
+        for delay, amount in pending:
             if delay == 0:
                 self.spike_count += amount  # Deliver spike
             else:
-                new_pending.append((delay - 1, amount))
-        self.pending_spikes = new_pending
+                pending[kept] = (delay - 1, amount)
+                kept += 1
+        del pending[kept:]
         self.apply_rules()
 
     # Applies the first matching rule
     def apply_rules(self):
-        for rule in self.rules:
-            threshold = rule.get('condition_threshold')
-            condition = rule.get('condition')
-
-            condition_met = False
-            if threshold is not None:
-                condition_met = self.spike_count >= threshold
-            elif callable(condition):
-                condition_met = condition(self.spike_count)
-
-            if condition_met and self.spike_count >= rule['consume']:
-                self.spike_count -= rule['consume']
-                self.pending_spikes.append((rule['delay'], rule['produce']))
+        emitted = self.fire()
+        if emitted is not None:
+            self.pending_spikes.append(emitted)
+
+    # Applies the first matching rule, returning the (delay, amount) it emits or None
+    def fire(self):
+        count = self.spike_count
+        for rule in self._rules:
+            kind = rule.kind
+            if kind == THRESHOLD:
+                condition_met = count >= rule.threshold
+            elif kind == NEVER:
+                continue
+            else:
+                condition_met = rule.condition(count)    # Callable or regular expression
+
+            if condition_met and count >= rule.consume:
+                self.spike_count = count - rule.consume
                 if self.verbose:
-                    print(f"[Neuron {self.id}] Rule applied: consume {rule['consume']}, produce {rule['produce']} after {rule['delay']}")
-                break  # Only one rule per tick
+                    print(f"[Neuron {self.id}] Rule applied: consume {rule.consume}, produce {rule.produce} after {rule.delay}")
+                return rule.delay, rule.produce  # Only one rule per tick
+        return None
 
     # Receives spike(s) from another neuron
     def receive_spike(self, amount=1):
         self.spike_count += amount
 
     def __repr__(self):
-        return f"Neuron {self.id} | Spikes: {self.spike_count} | Pending: {self.pending_spikes}"
\ No newline at end of file
+        return f"Neuron {self.id} | Spikes: {self.spike_count} | Pending: {self.pending_spikes}"
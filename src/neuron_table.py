@@ -0,0 +1,55 @@
+from collections.abc import Mapping
+from src.neuron import Neuron
+
+
+# Neuron built from a compiled model. Assigning to one of its attributes materializes the
+# system (see SNSystem.materialize()) and applies the assignment to the system's Neuron
+# object, so writes through system.neurons take effect as on a system built from objects.
+# Its rules are a tuple: changing them in place would have no effect.
+class NeuronSnapshot(Neuron):
+    __slots__ = ("_system",)
+
+    @property
+    def rules(self):
+        return tuple(self._rules)
+
+    @rules.setter
+    def rules(self, rules):
+        Neuron.rules.fset(self, rules)
+
+    def __setattr__(self, name, value):
+        Neuron.__setattr__(self, name, value)
+        system = getattr(self, "_system", None)
+        if system is not None and not name.startswith("_"):
+            system.materialize()
+            setattr(system.neurons[self.id], name, value)
+
+
+# View of a compiled system's neurons: neuron id -> NeuronSnapshot built on access from the
+# compiled arrays and the engine's current spike counts
+class NeuronTable(Mapping):
+    def __init__(self, system):
+        self.system = system
+
+    def __getitem__(self, neuron_id):
+        system = self.system
+        pos = system.model.index[neuron_id]
+        if system.backend is None:
+            count = int(system.model.spikes[pos])
+        else:
+            import numpy as np
+            count = int(system.backend.counts_array(np.array([pos], dtype=np.int64))[0])
+        model = system.model
+        neuron = NeuronSnapshot(model.ids[pos], spike_count=count, verbose=bool(model.verbose[pos]),
+                                rules=model.rules_of(pos))
+        neuron._system = system
+        return neuron
+
+    def __contains__(self, neuron_id):
+        return neuron_id in self.system.model.index
+
+    def __iter__(self):
+        return iter(self.system.model.ids)
+
+    def __len__(self):
+        return self.system.model.num_neurons
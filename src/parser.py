@@ -0,0 +1,175 @@
+import warnings
+import numpy as np
+from src.adjacency import merge_edges
+from src.compiled import CompiledModel, THRESHOLD, REGEX
+from src.regex import predicate_arrays, regex_condition
+
+# .snps layout:
+#   *N
+#   <id> <spikes> <verbose> <rule count> (<consume> <produce> <delay> <condition>)*
+#   *S
+#   <source id> <target id> [<weight>]
+# A condition is a threshold (spike count >= threshold) or a regular expression over "a"
+# without spaces, such as a(aa)* (see src/regex.py). A synapse's weight (1 by default) is the
+# number of spikes it delivers for every spike its source produces; parallel synapses are
+# merged into one edge of their total weight.
+# Blank lines and lines starting with "#" are ignored.
+
+NULL_MODE = 0
+NEURON_MODE = 1
+SYNAPSE_MODE = 2
+
+CHUNK_SIZE = 1 << 22    # Characters read and converted at a time
+
+
+class SNPSFormatError(ValueError):
+    pass
+
+
+# Parses whitespace-separated integers in C, requiring exactly `count` of them
+def parse_ints(tokens, count):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        values = np.fromstring(" ".join(tokens), dtype=np.int64, sep=" ")
+    if len(values) != count:
+        raise SNPSFormatError(f"expected {count} integers, found {len(values)}")
+    return values
+
+
+# Rule fields of a block where some conditions are regular expressions, converted one by one.
+# Returns the rules (regex conditions get threshold 0) and block rule index -> RegexCondition.
+def parse_rule_fields(rule_lists, count):
+    fields = " ".join(rule_lists).split()
+    if len(fields) != 4 * count:
+        raise SNPSFormatError(f"expected {4 * count} rule fields, found {len(fields)}")
+    rules = np.zeros((count, 4), dtype=np.int64)
+    conditions = {}
+    for r in range(count):
+        rules[r, :3] = [int(field) for field in fields[4 * r:4 * r + 3]]
+        condition = fields[4 * r + 3]
+        if condition.lstrip("-").isdigit():
+            rules[r, 3] = int(condition)
+        else:
+            conditions[r] = regex_condition(condition)
+    return rules, conditions
+
+
+# Converts a block of neuron lines into id, spike, verbose, rule-count and rule arrays, plus
+# the regular-expression conditions of its rules (block rule index -> RegexCondition)
+def parse_neuron_block(lines):
+    heads = [line.split(None, 4) for line in lines]
+    if any(len(head) < 4 for head in heads):
+        raise SNPSFormatError("neuron line with fewer than 4 fields")
+    rule_counts = parse_ints([head[3] for head in heads], len(heads))
+    rule_lists = [head[4] for head in heads if len(head) == 5]
+    count = int(rule_counts.sum())
+    conditions = {}
+    try:
+        rules = parse_ints(rule_lists, 4 * count).reshape(-1, 4)
+    except (ValueError, Warning):
+        rules, conditions = parse_rule_fields(rule_lists, count)
+    if len(rule_lists) != np.count_nonzero(rule_counts):
+        raise SNPSFormatError("rule list does not match its rule count")
+
+    return ([head[0] for head in heads], parse_ints([head[1] for head in heads], len(heads)),
+            np.array([head[2] == "1" for head in heads], dtype=np.bool_), rule_counts, rules,
+            conditions)
+
+
+# Converts a block of synapse lines into source and target id lists and an array of weights
+def parse_synapse_block(lines):
+    tokens = " ".join(lines).split()
+    if len(tokens) == 2 * len(lines):
+        return tokens[0::2], tokens[1::2], np.ones(len(lines), dtype=np.int64)
+    if len(tokens) == 3 * len(lines):
+        sources, targets, weights = tokens[0::3], tokens[1::3], parse_ints(tokens[2::3], len(lines))
+    else:
+        rows = [line.split() for line in lines]
+        if any(len(row) not in (2, 3) for row in rows):
+            raise SNPSFormatError("synapse lines hold a source, a target and an optional weight")
+        sources, targets = [row[0] for row in rows], [row[1] for row in rows]
+        weights = np.array([int(row[2]) if len(row) == 3 else 1 for row in rows], dtype=np.int64)
+    if len(weights) and weights.min() < 1:
+        raise SNPSFormatError("synapse weights must be positive")
+    return sources, targets, weights
+
+
+# Streams a .snps file straight into a CompiledModel, without Neuron/Synapse objects.
+# The file is read in chunks of CHUNK_SIZE characters and each chunk's lines are converted
+# with array operations.
+def parse_snps(path):
+    ids = []
+    index = {}
+    spikes, verbose, rule_counts, rules = [], [], [], []
+    conditions = {}
+    sources, targets, weights = [], [], []
+
+    def flush(mode, lines):
+        if not lines:
+            return
+        try:
+            if mode == NEURON_MODE:
+                block_ids, block_spikes, block_verbose, block_counts, block_rules, block_conditions = \
+                    parse_neuron_block(lines)
+                offset = sum(map(len, rules))
+                conditions.update((offset + r, c) for r, c in block_conditions.items())
+                start = len(ids)
+                ids.extend(block_ids)
+                index.update(zip(block_ids, range(start, len(ids))))
+                if len(index) != len(ids):
+                    raise SNPSFormatError("duplicate neuron id")
+                spikes.append(block_spikes)
+                verbose.append(block_verbose)
+                rule_counts.append(block_counts)
+                rules.append(block_rules)
+            else:
+                block_sources, block_targets, block_weights = parse_synapse_block(lines)
+                sources.append(np.fromiter(map(index.__getitem__, block_sources), dtype=np.int64))
+                targets.append(np.fromiter(map(index.__getitem__, block_targets), dtype=np.int64))
+                weights.append(block_weights)
+        except (IndexError, ValueError, KeyError) as e:
+            raise SNPSFormatError(f"{path}: {e!r}") from e
+
+    mode = NULL_MODE
+    rest = ""
+    with open(path, "r") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            lines = (rest + chunk).split("\n")
+            rest = lines.pop() if chunk else ""
+            lines = [line.rstrip("\r") for line in lines]
+            lines = [line for line in lines if line and line[0] != "#"]
+
+            while lines:
+                if mode == NULL_MODE:
+                    if lines[0] != "*N":
+                        raise SNPSFormatError(f"{path}: expected *N")
+                    mode = NEURON_MODE
+                    lines = lines[1:]
+                elif mode == NEURON_MODE and "*S" in lines:
+                    split = lines.index("*S")
+                    flush(mode, lines[:split])
+                    mode = SYNAPSE_MODE
+                    lines = lines[split + 1:]
+                else:
+                    flush(mode, lines)
+                    lines = []
+            if not chunk:
+                break
+
+    if mode != SYNAPSE_MODE or len(sources) == 0 or sum(map(len, sources)) == 0:
+        raise SNPSFormatError(f"{path}: missing *S section or synapses")
+
+    rules = np.concatenate(rules) if rules else np.zeros((0, 4), dtype=np.int64)
+    rule_ptr = np.zeros(len(ids) + 1, dtype=np.int64)
+    if rule_counts:
+        np.cumsum(np.concatenate(rule_counts), out=rule_ptr[1:])
+    indptr, indices, weights = merge_edges(np.concatenate(sources), np.concatenate(targets),
+                                           np.concatenate(weights), len(ids))
+
+    kinds = np.full(len(rules), THRESHOLD, dtype=np.int8)
+    kinds[list(conditions)] = REGEX
+    return CompiledModel(ids, np.concatenate(spikes), rule_ptr,
+                         rules[:, 0], rules[:, 1], rules[:, 2], rules[:, 3],
+                         kinds, {}, indptr, indices, verbose=np.concatenate(verbose),
+                         predicates=predicate_arrays(len(rules), conditions), weights=weights)
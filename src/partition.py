@@ -0,0 +1,132 @@
+import numpy as np
+from src.adjacency import build_csr, fan_out
+
+
+# Undirected CSR of a directed graph (both directions of every synapse, no self-loops)
+def undirected_csr(indptr, indices, num_nodes):
+    sources = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(indptr))
+    keep = sources != indices
+    sources, targets = sources[keep], indices[keep]
+    return build_csr(np.concatenate([sources, targets]), np.concatenate([targets, sources]), num_nodes)
+
+
+# Multi-source breadth-first search: grows one region around each of `seeds` evenly spread
+# nodes, level by level. When the reachable nodes are exhausted it restarts from the next
+# unvisited nodes, taking twice as many at every restart so that graphs made of many small
+# components do not cost one step per component. Returns the region and level of every node.
+def grow_regions(indptr, indices, num_nodes, seeds):
+    region = np.full(num_nodes, -1, dtype=np.int64)
+    level = np.zeros(num_nodes, dtype=np.int64)
+    frontier = np.unique(np.linspace(0, num_nodes - 1, min(seeds, num_nodes)).astype(np.int64))
+    num_regions = 0
+    next_seed = 0
+    depth = 0
+    while True:
+        if len(frontier) == 0:
+            unvisited = np.flatnonzero(region[next_seed:] < 0)
+            if len(unvisited) == 0:
+                break
+            frontier = unvisited[:seeds] + next_seed
+            next_seed = int(frontier[-1]) + 1
+            seeds *= 2
+        if num_regions == 0 or region[frontier[0]] < 0:
+            region[frontier] = np.arange(num_regions, num_regions + len(frontier))
+            num_regions += len(frontier)
+        level[frontier] = depth
+        depth += 1
+
+        owner, neighbors = fan_out(indptr, indices, frontier)
+        fresh = region[neighbors] < 0
+        neighbors, first = np.unique(neighbors[fresh], return_index=True)
+        region[neighbors] = region[frontier[owner[fresh][first]]]
+        frontier = neighbors
+    return region, level
+
+
+# Order of the nodes that keeps neighbors close: regions grown around `seeds` nodes (one per
+# 1024 nodes, at most 1024, by default), each in breadth-first order, with the regions
+# themselves in breadth-first order of the graph between them
+def locality_order(indptr, indices, num_nodes, seeds=None):
+    if seeds is None:
+        seeds = min(max(num_nodes // 1024, 1), 1024)
+    region, level = grow_regions(indptr, indices, num_nodes, seeds)
+    num_regions = int(region.max()) + 1 if num_nodes else 0
+    if num_regions > 1:
+        sources = np.repeat(region, np.diff(indptr))
+        targets = region[indices]
+        between = sources != targets
+        r_indptr, r_indices = build_csr(sources[between], targets[between], num_regions)
+        r_region, r_level = grow_regions(r_indptr, r_indices, num_regions, 1)
+        rank = np.empty(num_regions, dtype=np.int64)
+        rank[np.lexsort((r_level, r_region))] = np.arange(num_regions)
+        region = rank[region]
+    return np.lexsort((level, region))
+
+
+# Number of synapses whose ends lie in different parts
+def cut_size(indptr, indices, labels):
+    sources = np.repeat(np.arange(len(labels), dtype=np.int64), np.diff(indptr))
+    return int(np.count_nonzero(labels[sources] != labels[indices]))
+
+
+# Splits the nodes of a graph into `parts` blocks of roughly equal weight (at most `imbalance`
+# above or below the mean) with few synapses between blocks. The nodes are laid out in
+# locality_order and cut into contiguous runs, then refined by label propagation: nodes with
+# more neighbors in another block move there while the balance allows it. Passes alternate
+# between moves towards higher and lower block numbers so that neighbors do not swap back
+# and forth. Returns the block of every node.
+def partition_graph(indptr, indices, num_nodes, parts, weights=None, passes=8, imbalance=0.05):
+    parts = max(1, min(parts, num_nodes))
+    if weights is None:
+        weights = np.ones(num_nodes, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    und_indptr, und_indices = undirected_csr(indptr, indices, num_nodes)
+
+    order = locality_order(und_indptr, und_indices, num_nodes)
+    cumulative = np.cumsum(weights[order]) - weights[order]
+    labels = np.empty(num_nodes, dtype=np.int64)
+    labels[order] = np.minimum(cumulative * parts // max(int(weights.sum()), 1), parts - 1)
+    if parts == 1:
+        return labels
+
+    mean = weights.sum() / parts
+    max_load, min_load = (1 + imbalance) * mean, (1 - imbalance) * mean
+    sources = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(und_indptr))
+
+    for step in range(passes):
+        own_label = labels[sources]
+        other = labels[und_indices]
+        cut = own_label != other
+        if not cut.any():
+            break
+
+        # Neighbors of every node in its own block and in each block it has a cut synapse to
+        inside = np.bincount(sources[~cut], minlength=num_nodes)
+        keys, counts = np.unique(sources[cut] * parts + other[cut], return_counts=True)
+        nodes, targets = keys // parts, keys % parts
+        towards = targets > labels[nodes] if step % 2 == 0 else targets < labels[nodes]
+        gain = counts - inside[nodes]
+        move = towards & (gain > 0)
+        nodes, targets, gain = nodes[move], targets[move], gain[move]
+
+        # Best target per node, then the largest gains first into each block while it has room
+        best = np.lexsort((-gain, nodes))
+        first = np.ones(len(best), dtype=np.bool_)
+        first[1:] = nodes[best][1:] != nodes[best][:-1]
+        nodes, targets, gain = nodes[best][first], targets[best][first], gain[best][first]
+
+        load = np.bincount(labels, weights=weights, minlength=parts)
+        accepted = np.zeros(len(nodes), dtype=np.bool_)
+        for block, room in ((targets, max_load - load), (labels[nodes], load - min_load)):
+            ranked = np.lexsort((-gain, block))
+            taken = np.cumsum(weights[nodes][ranked])
+            starts = np.searchsorted(block[ranked], np.arange(parts))
+            taken -= np.concatenate([[0], taken])[starts][block[ranked]]
+            fits = np.zeros(len(nodes), dtype=np.bool_)
+            fits[ranked] = taken <= room[block[ranked]]
+            accepted = fits if block is targets else accepted & fits
+        if not accepted.any():
+            continue
+        labels[nodes[accepted]] = targets[accepted]
+
+    return labels
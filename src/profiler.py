@@ -0,0 +1,102 @@
+import json
+import time
+
+# Phases a tick's time is split into. Engines attribute their own work to the first four;
+# time an engine does not attribute (e.g. in the workers of the partitioned engine) is "other".
+PHASES = ("rules", "fan_out", "delivery", "transfer", "recording", "other")
+
+# firings: rule applications; active_neurons: neurons that applied a rule (a neuron applies at
+# most one rule a tick, so on every engine the two are equal); spikes_emitted: spikes put on
+# synapses; spikes_delivered: spikes that reached their target
+COUNTERS = ("firings", "active_neurons", "spikes_emitted", "spikes_delivered")
+
+
+# Per-tick phase timers and counters, enabled with SNSystem.profile(). Engines hold a
+# `profiler` attribute (None when profiling is off) and call lap(phase) at the end of each
+# phase, so a phase's time is the time since the previous lap. Sections timed on their own
+# inside a phase (add) are not counted twice. With a stream (any object with write()), every
+# tick is also written as one JSON line.
+class Profiler:
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.clock = time.perf_counter
+        self.ticks = 0                  # Ticks simulated one by one
+        self.skipped = 0                # Idle ticks fast-forwarded over
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.last = None                # Record of the last tick
+        self.tick_seconds = dict.fromkeys(PHASES, 0.0)
+        self.tick_counters = dict.fromkeys(COUNTERS, 0)
+        self.touched = None             # Positions that fired or received spikes this tick, when tracked
+        self._mark = 0.0
+        self._nested = 0.0
+        self._open = False
+
+    def start_tick(self):
+        if self._open:
+            self.end_tick()
+        for phase in PHASES:
+            self.tick_seconds[phase] = 0.0
+        for counter in COUNTERS:
+            self.tick_counters[counter] = 0
+        if self.touched is not None:
+            self.touched = []
+        self._open = True
+        self._nested = 0.0
+        self._mark = self.clock()
+
+    # Ends the current phase
+    def lap(self, phase):
+        now = self.clock()
+        self.tick_seconds[phase] += now - self._mark - self._nested
+        self._mark = now
+        self._nested = 0.0
+
+    # Adds a separately timed section to a phase
+    def add(self, phase, seconds):
+        self.tick_seconds[phase] += seconds
+        self._nested += seconds
+
+    def count(self, counter, amount):
+        self.tick_counters[counter] += amount
+
+    # Engines report the positions that fired and those that received spikes (see src/stream.py)
+    def touch(self, positions):
+        if self.touched is not None:
+            self.touched.append(positions)
+
+    # Closes the tick, followed by `skipped` idle ticks
+    def end_tick(self, skipped=0):
+        for phase in PHASES:
+            self.seconds[phase] += self.tick_seconds[phase]
+        for counter in COUNTERS:
+            self.counters[counter] += self.tick_counters[counter]
+        self.last = {"tick": self.ticks + self.skipped, "skipped": skipped,
+                     "seconds": dict(self.tick_seconds), **self.tick_counters}
+        self.ticks += 1
+        self.skipped += skipped
+        self._open = False
+        if self.stream is not None:
+            self.stream.write(json.dumps(self.last) + "\n")
+
+    # Totals since profiling started, as a dict
+    def summary(self):
+        if self._open:
+            self.end_tick()
+        return {"ticks": self.ticks, "skipped": self.skipped,
+                "seconds": dict(self.seconds), "counters": dict(self.counters)}
+
+
+# Profiler that keeps only the counters and the touched positions: its phase timers do
+# nothing, so engines read no clock. Used by src/stream.py when no Profiler is running.
+class TickCounter(Profiler):
+    def __init__(self):
+        super().__init__()
+        self.clock = float             # float() == 0.0
+        self.touched = []
+
+    def lap(self, phase):
+        pass
+
+    def add(self, phase, seconds):
+        pass
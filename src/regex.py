@@ -0,0 +1,284 @@
+import numpy as np
+
+MAX_STATES = 1 << 16    # Bound on the automaton built for one expression
+
+# Rule conditions written as regular expressions over the single letter "a", as in the SN P
+# rule form E/a^c -> a^p;d: the rule applies when a^n (n = spike count) matches E as a whole.
+# Supported syntax: a, a^k, (...), |, *, +, ?, {m}, {m,}, {m,n} and () for the empty word.
+#
+# A regular language over one letter is ultimately periodic, so every expression compiles
+# to a few arithmetic predicates (base, modulus, exact):
+#   exact:     n == base
+#   at-least:  n >= base and (n - base) % modulus == 0
+# which array engines check for all neurons at once.
+
+
+class RegexError(ValueError):
+    pass
+
+
+# Recursive-descent parser producing a small AST of tuples:
+# ("a",), ("empty",), ("cat", nodes), ("alt", nodes), ("repeat", node, min, max or None)
+class _Parser:
+    def __init__(self, pattern):
+        self.text = pattern.replace(" ", "")
+        self.pos = 0
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def take(self, char):
+        if self.peek() != char:
+            raise RegexError(f"expected {char!r} at {self.pos} in {self.text!r}")
+        self.pos += 1
+
+    def number(self):
+        start = self.pos
+        while self.peek().isdigit():
+            self.pos += 1
+        if start == self.pos:
+            raise RegexError(f"expected a number at {start} in {self.text!r}")
+        return int(self.text[start:self.pos])
+
+    def parse(self):
+        node = self.alternation()
+        if self.pos != len(self.text):
+            raise RegexError(f"unexpected {self.peek()!r} at {self.pos} in {self.text!r}")
+        return node
+
+    def alternation(self):
+        nodes = [self.concatenation()]
+        while self.peek() == "|":
+            self.pos += 1
+            nodes.append(self.concatenation())
+        return nodes[0] if len(nodes) == 1 else ("alt", nodes)
+
+    def concatenation(self):
+        nodes = []
+        while self.peek() not in ("", "|", ")"):
+            nodes.append(self.repetition())
+        if not nodes:
+            return ("empty",)
+        return nodes[0] if len(nodes) == 1 else ("cat", nodes)
+
+    def repetition(self):
+        node = self.atom()
+        while True:
+            char = self.peek()
+            if char == "*":
+                self.pos += 1
+                node = ("repeat", node, 0, None)
+            elif char == "+":
+                self.pos += 1
+                node = ("repeat", node, 1, None)
+            elif char == "?":
+                self.pos += 1
+                node = ("repeat", node, 0, 1)
+            elif char == "^":
+                self.pos += 1
+                count = self.number()
+                node = ("repeat", node, count, count)
+            elif char == "{":
+                self.pos += 1
+                low = self.number()
+                high = low
+                if self.peek() == ",":
+                    self.pos += 1
+                    high = self.number() if self.peek().isdigit() else None
+                self.take("}")
+                if high is not None and high < low:
+                    raise RegexError(f"bad repetition {{{low},{high}}} in {self.text!r}")
+                node = ("repeat", node, low, high)
+            else:
+                return node
+
+    def atom(self):
+        char = self.peek()
+        if char == "a":
+            self.pos += 1
+            return ("a",)
+        if char == "(":
+            self.pos += 1
+            node = self.alternation()
+            self.take(")")
+            return node
+        raise RegexError(f"unexpected {char or 'end'!r} at {self.pos} in {self.text!r}")
+
+
+# Thompson automaton: epsilon edges and edges reading one "a"
+class _Automaton:
+    def __init__(self):
+        self.epsilon = []
+        self.letter = []
+
+    def state(self):
+        if len(self.epsilon) >= MAX_STATES:
+            raise RegexError("expression too large")
+        self.epsilon.append([])
+        self.letter.append([])
+        return len(self.epsilon) - 1
+
+    # Adds the automaton of a node; returns its (start, end) states
+    def build(self, node):
+        start, end = self.state(), self.state()
+        kind = node[0]
+        if kind == "a":
+            self.letter[start].append(end)
+        elif kind == "empty":
+            self.epsilon[start].append(end)
+        elif kind == "cat":
+            current = start
+            for child in node[1]:
+                child_start, child_end = self.build(child)
+                self.epsilon[current].append(child_start)
+                current = child_end
+            self.epsilon[current].append(end)
+        elif kind == "alt":
+            for child in node[1]:
+                child_start, child_end = self.build(child)
+                self.epsilon[start].append(child_start)
+                self.epsilon[child_end].append(end)
+        else:
+            _, child, low, high = node
+            current = start
+            for _ in range(low):
+                child_start, child_end = self.build(child)
+                self.epsilon[current].append(child_start)
+                current = child_end
+            if high is None:
+                child_start, child_end = self.build(child)
+                self.epsilon[current].append(child_start)
+                self.epsilon[child_end].append(child_start)
+                self.epsilon[child_end].append(end)
+            else:
+                for _ in range(high - low):
+                    child_start, child_end = self.build(child)
+                    self.epsilon[current].append(child_start)
+                    self.epsilon[current].append(end)
+                    current = child_end
+            self.epsilon[current].append(end)
+        return start, end
+
+    def closure(self, states):
+        stack = list(states)
+        seen = set(states)
+        while stack:
+            for nxt in self.epsilon[stack.pop()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return frozenset(seen)
+
+    def step(self, states):
+        return self.closure({nxt for state in states for nxt in self.letter[state]})
+
+
+# Predicates (base, modulus, exact) of an expression. Over one letter the subset automaton is
+# a lasso: a transient path of T state sets followed by a cycle of p, so lengths n < T match
+# exactly and lengths n >= T match with period p.
+def compile_regex(pattern):
+    automaton = _Automaton()
+    start, end = automaton.build(_Parser(pattern).parse())
+    sets = []
+    index = {}
+    current = automaton.closure({start})
+    while current not in index:
+        if len(sets) >= MAX_STATES:
+            raise RegexError("expression too large")
+        index[current] = len(sets)
+        sets.append(current)
+        current = automaton.step(current)
+    accepts = [end in states for states in sets]
+    transient = index[current]
+    period = len(sets) - transient
+
+    # Shortest period and transient of the accepted lengths themselves
+    for divisor in range(1, period + 1):
+        if period % divisor == 0 and all(accepts[n] == accepts[n + divisor]
+                                         for n in range(transient, len(accepts) - divisor)):
+            period = divisor
+            break
+    while transient > 0 and accepts[transient - 1] == accepts[transient - 1 + period]:
+        transient -= 1
+
+    # Exact lengths one period below a periodic predicate's base extend it downwards
+    exact = {n for n in range(transient) if accepts[n]}
+    predicates = []
+    for n in range(transient, transient + period):
+        if accepts[n]:
+            while n - period in exact:
+                exact.discard(n - period)
+                n -= period
+            predicates.append((n, period, False))
+    return tuple(sorted(predicates + [(n, 0, True) for n in exact]))
+
+
+# Canonical expression of a predicate list, e.g. a{1}(a{2})*|a{0}
+def predicates_pattern(predicates):
+    parts = []
+    for base, modulus, exact in predicates:
+        parts.append(f"a{{{base}}}" if exact else f"a{{{base}}}(a{{{modulus}}})*")
+    return "|".join(parts)
+
+
+# Elementwise check of predicates against spike counts
+def evaluate_predicates(counts, bases, moduli, exact):
+    periodic = (counts >= bases) & ((counts - bases) % np.maximum(moduli, 1) == 0)
+    return np.where(exact, counts == bases, periodic)
+
+
+# Compiled regular-expression condition of a rule; calling it on a spike count tells whether
+# a^count matches. Equal to another condition (or pattern) accepting the same counts.
+class RegexCondition:
+    __slots__ = ("pattern", "predicates")
+
+    def __init__(self, pattern=None, predicates=None):
+        if predicates is None:
+            predicates = compile_regex(pattern)
+        self.predicates = tuple(predicates)
+        self.pattern = pattern if pattern is not None else predicates_pattern(self.predicates)
+
+    def __call__(self, count):
+        for base, modulus, exact in self.predicates:
+            if count == base if exact else count >= base and (count - base) % modulus == 0:
+                return True
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            other = regex_condition(other)
+        if isinstance(other, RegexCondition):
+            return self.predicates == other.predicates
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.predicates)
+
+    def __repr__(self):
+        return f"RegexCondition({self.pattern!r})"
+
+
+_conditions = {}
+
+
+# RegexCondition of a pattern, compiled once per distinct pattern
+def regex_condition(pattern):
+    condition = _conditions.get(pattern)
+    if condition is None:
+        condition = _conditions[pattern] = RegexCondition(pattern)
+    return condition
+
+
+# Predicate arrays (ptr, bases, moduli, exact) of num_rules rules, the conditions of rule r
+# being predicates[ptr[r]:ptr[r + 1]]; conditions maps rule index -> RegexCondition
+def predicate_arrays(num_rules, conditions):
+    counts = np.zeros(num_rules, dtype=np.int64)
+    rows = []
+    for r in sorted(conditions):
+        predicates = conditions[r].predicates
+        counts[r] = len(predicates)
+        rows.extend(predicates)
+    ptr = np.zeros(num_rules + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    table = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return ptr, table[:, 0].copy(), table[:, 1].copy(), table[:, 2].astype(np.bool_)
@@ -0,0 +1,238 @@
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+from src.checkpoint import current_counts, current_pending, restore_state
+from src.compiled import PREDICATE_FIELDS, compile_system
+
+FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 1 << 30
+SNAPSHOTS = 16          # States saved along a cached run, to answer shorter tick budgets
+STRUCTURE_FIELDS = ("rule_ptr", "consumes", "produces", "delays", "thresholds", "kinds",
+                    "indptr", "indices", "weights") + PREDICATE_FIELDS
+HISTORY_PREFIX = "history_"
+SNAPSHOT_FIELDS = ("tick", "halted", "rows", "seen")
+
+
+def update_digest(digest, name, array):
+    array = np.ascontiguousarray(array)
+    digest.update(f"{name}:{array.dtype.str}:{array.shape};".encode())
+    digest.update(array.tobytes())
+
+
+# Digest of a compiled model's structure: ids, rules and synapses, not the spike counts.
+# None for models with Python callable conditions, which have no canonical content.
+def structure_digest(model):
+    if model.callables:
+        return None
+    digest = hashlib.sha256(json.dumps([str(n_id) for n_id in model.ids]).encode())
+    for field in STRUCTURE_FIELDS:
+        update_digest(digest, field, getattr(model, field))
+    return digest.hexdigest()
+
+
+# On-disk cache of run results keyed by a hash of the model, its current state (spike counts
+# and in-flight spikes), the engine and the run settings; the tick budget is not part of the
+# key. An entry holds the recorded history and the state at up to SNAPSHOTS + 1 points of
+# the run, the last one being its end, so a run with:
+# - the same budget is answered from the entry
+# - a shorter budget resumes from the latest saved state before it and runs the rest
+# - a longer budget resumes from the latest saved state and extends the entry
+# Runs are cached only when they start a new history (see SNSystem.record()) and do not
+# detect cycles, whose report (and stop) is not part of an entry. Entries are
+# .npz files evicted least recently used first once the directory exceeds max_bytes.
+class ResultCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0           # Answered from an entry without simulating
+        self.resumed = 0        # Continued from a saved state of an entry
+        self.misses = 0
+
+    # Key of a run from the system's current state, None if it cannot be cached
+    def key(self, system, fast_forward, stop_on_halt):
+        history = system.spike_history
+        if history.num_rows or history.ticks_seen:
+            return None
+        model = getattr(system.backend, "model", None) or compile_system(system)
+        structure = structure_digest(model)
+        if structure is None:
+            return None
+        digest = hashlib.sha256(json.dumps({
+            "version": FORMAT_VERSION,
+            "structure": structure,
+            "engine": system.engine,
+            "history": [history.neurons, history.every, history.aggregate],
+            "fast_forward": bool(fast_forward),
+            "stop_on_halt": bool(stop_on_halt),
+        }, sort_keys=True).encode())
+        update_digest(digest, "counts", current_counts(system))
+        update_digest(digest, "pending", current_pending(system))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    # Runs `ticks` ticks of the system through the cache, as SNSystem.run would; returns the
+    # number of ticks run, or None if the run cannot be cached
+    def run(self, system, ticks, fast_forward=True, stop_on_halt=False, **options):
+        if ticks <= 0 or options.get("detect_cycles"):
+            return None
+        key = self.key(system, fast_forward, stop_on_halt)
+        if key is None:
+            return None
+        start = 0 if system.delay_queue is None else system.delay_queue.tick
+        entry = self.load(key)
+        if entry is None:
+            self.misses += 1
+            return self.record(system, key, ticks, start, [], fast_forward, stop_on_halt, options)
+
+        budget, returned, halted = entry["budget"], entry["returned"], entry["halted"]
+        snapshots = entry["snapshots"]
+        end = snapshots[-1]
+        if ticks == budget or (halted and stop_on_halt and returned < ticks):
+            self.hits += 1
+            self.restore(system, entry, end, start)
+            return returned
+        if halted and ticks > budget:
+            # Nothing changes any more: only the history grows
+            self.resumed += 1
+            self.restore(system, entry, end, start)
+            ran = self.live(system, ticks - budget, fast_forward, stop_on_halt, options)
+            system.halted = True
+            return budget + ran
+
+        # Saved states before the end are never halted ones, so resuming from them is exact
+        base = None
+        for snapshot in snapshots[:-1]:
+            if snapshot["tick"] <= ticks:
+                base = snapshot
+        offset = 0 if base is None else base["tick"]
+        if base is not None:
+            self.restore(system, entry, base, start)
+        if ticks < budget:
+            if offset == ticks:
+                self.hits += 1
+                return ticks
+            self.resumed += 1 if base is not None else 0
+            self.misses += 1 if base is None else 0
+            return offset + self.live(system, ticks - offset, fast_forward, stop_on_halt, options)
+        self.resumed += 1
+        kept = [s for s in snapshots if s["tick"] <= offset] if base is not None else []
+        return self.record(system, key, ticks, start, kept, fast_forward, stop_on_halt, options, offset)
+
+    # Runs the system with the cache out of the way
+    def live(self, system, ticks, fast_forward, stop_on_halt, options, **extra):
+        cache = system.result_cache
+        system.result_cache = None
+        try:
+            return system.run(ticks, fast_forward=fast_forward, stop_on_halt=stop_on_halt, **options, **extra)
+        finally:
+            system.result_cache = cache
+
+    # Runs from `offset` ticks into the cached run up to `ticks`, saving states along the way,
+    # and stores the result under key
+    def record(self, system, key, ticks, start, snapshots, fast_forward, stop_on_halt, options, offset=0):
+        def save(system, t):
+            snapshots.append(self.snapshot(system, offset + t))
+
+        every = max(1, (ticks - offset) // SNAPSHOTS)
+        ran = self.live(system, ticks - offset, fast_forward, stop_on_halt, options,
+                        checkpoint=save, checkpoint_every=every)
+        self.store(key, ticks, offset + ran, system, snapshots)
+        return offset + ran
+
+    @staticmethod
+    def snapshot(system, tick):
+        history = system.history
+        return {
+            "tick": tick,
+            "halted": bool(system.halted),
+            "rows": history.num_rows,
+            "seen": history.ticks_seen,
+            "counts": current_counts(system),
+            "pending": current_pending(system),
+            "window": np.zeros(0, dtype=np.int64) if history.window is None else history.window.copy(),
+        }
+
+    # Puts the system in the state of a snapshot, with the history recorded up to it
+    @staticmethod
+    def restore(system, entry, snapshot, start):
+        history = dict(entry["history"])
+        history["rows"] = history["rows"][:snapshot["rows"]]
+        settings = history["settings"].copy()
+        settings[2] = snapshot["seen"]
+        history["settings"] = settings
+        history["window"] = snapshot["window"]
+        restore_state(system, snapshot["counts"], snapshot["pending"], start + snapshot["tick"],
+                      snapshot["halted"], history)
+
+    def store(self, key, budget, returned, system, snapshots):
+        arrays = {
+            "version": np.array(FORMAT_VERSION),
+            "run": np.array([budget, returned, bool(system.halted)], dtype=np.int64),
+            "snapshot_counts": np.array([s["counts"] for s in snapshots], dtype=np.int64),
+        }
+        for field in SNAPSHOT_FIELDS:
+            arrays[f"snapshot_{field}"] = np.array([s[field] for s in snapshots], dtype=np.int64)
+        for i, snapshot in enumerate(snapshots):
+            arrays[f"pending_{i}"] = snapshot["pending"]
+            arrays[f"window_{i}"] = snapshot["window"]
+        for name, value in system.history.state().items():
+            arrays[HISTORY_PREFIX + name] = value
+
+        path = self.path(key)
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "wb") as file:
+            np.savez_compressed(file, **arrays)
+        os.replace(partial, path)
+        self.evict()
+
+    # The entry stored under key as a dict, None if there is none (or it is unreadable)
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = dict(data)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if int(arrays["version"]) != FORMAT_VERSION:
+            return None
+        budget, returned, halted = arrays["run"].tolist()
+        snapshots = []
+        for i in range(len(arrays["snapshot_tick"])):
+            snapshot = {field: int(arrays[f"snapshot_{field}"][i]) for field in SNAPSHOT_FIELDS}
+            snapshot["halted"] = bool(snapshot["halted"])
+            snapshot["counts"] = arrays["snapshot_counts"][i]
+            snapshot["pending"] = arrays[f"pending_{i}"]
+            snapshot["window"] = arrays[f"window_{i}"]
+            snapshots.append(snapshot)
+        history = {name[len(HISTORY_PREFIX):]: value for name, value in arrays.items()
+                   if name.startswith(HISTORY_PREFIX)}
+        return {"budget": budget, "returned": returned, "halted": bool(halted),
+                "snapshots": snapshots, "history": history}
+
+    # Deletes the least recently used entries until the directory fits in max_bytes
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "resumed": self.resumed, "misses": self.misses}
@@ -0,0 +1,65 @@
+from collections import namedtuple
+from src.compiled import THRESHOLD, CALLABLE, NEVER, REGEX
+from src.regex import RegexCondition, regex_condition
+
+# Keys of the rule dicts accepted by Neuron
+RULE_KEYS = ("consume", "produce", "delay", "condition_threshold", "condition")
+
+
+# Immutable firing rule with its condition kind resolved once (THRESHOLD, CALLABLE, REGEX or
+# NEVER, as in the compiled arrays). A condition given as a string is a regular expression
+# over "a" (see src/regex.py). Also reads like the rule dict it was built from:
+# rule["consume"], rule.get("condition_threshold").
+class Rule(namedtuple("Rule", "consume produce delay kind threshold condition")):
+    __slots__ = ()
+
+    @classmethod
+    def make(cls, consume, produce, delay, condition_threshold=None, condition=None):
+        if condition_threshold is not None:
+            return cls(consume, produce, delay, THRESHOLD, condition_threshold, None)
+        if isinstance(condition, str):
+            condition = regex_condition(condition)
+        if isinstance(condition, RegexCondition):
+            return cls(consume, produce, delay, REGEX, 0, condition)
+        if callable(condition):
+            return cls(consume, produce, delay, CALLABLE, 0, condition)
+        return cls(consume, produce, delay, NEVER, 0, None)
+
+    # Rule from a rule dict (or a Rule, returned as is)
+    @classmethod
+    def of(cls, rule):
+        if isinstance(rule, cls):
+            return rule
+        return cls.make(rule["consume"], rule["produce"], rule["delay"],
+                        rule.get("condition_threshold"), rule.get("condition"))
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            return tuple.__getitem__(self, key)
+        if key == "condition_threshold":
+            return self.threshold if self.kind == THRESHOLD else None
+        if key in RULE_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        value = self[key] if key in RULE_KEYS else None
+        return default if value is None else value
+
+    def to_dict(self):
+        rule = {"consume": self.consume, "produce": self.produce, "delay": self.delay}
+        if self.kind == THRESHOLD:
+            rule["condition_threshold"] = self.threshold
+        elif self.kind in (CALLABLE, REGEX):
+            rule["condition"] = self.condition
+        return rule
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return self.to_dict() == {k: v for k, v in other.items() if v is not None}
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
@@ -0,0 +1,431 @@
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+STREAM_SECONDS = 0.1       # Target time between two progress messages of a job
+MAX_MODELS = 16            # Compiled models kept warm in each worker
+MAX_QUEUED = 64            # Jobs waiting for a worker before new ones are rejected
+MAX_PROGRESS = 256         # Progress events waiting for a slow client before the oldest are dropped
+
+# Local simulation job server. Clients connect over a Unix socket or localhost TCP and
+# exchange JSON objects, one per line:
+#   {"op": "run", "id": "j1", "model": "path.snps", "ticks": 1000, "engine": "numpy",
+#    "neurons": ["Output"], "every": 1, "timeout": null}
+#   {"op": "cancel", "id": "j1"}
+#   {"op": "stats"}
+# A run is answered with "queued", "started", any number of "progress" events carrying the
+# spike history of the selected neurons since the previous one, and a final "result" with the
+# status ("ok", "halted", "timeout", "cancelled" or "error"), the ticks run and the final
+# counts. When MAX_QUEUED jobs are waiting, a run is answered with "rejected" instead. A client
+# that reads more slowly than its jobs progress loses the oldest progress events (their "tick"
+# fields show the gap); every other message is delivered.
+# Job ids are chosen by the client and scoped to its connection.
+
+
+# Compiled models of one worker, least recently used dropped first. A model is keyed by its
+# path, size and modification time, so an edited file is loaded again.
+class ModelCache:
+    def __init__(self, max_models=MAX_MODELS, cache_dir=None):
+        self.max_models = max_models
+        self.cache_dir = cache_dir
+        self.models = OrderedDict()
+
+    # The model at path and whether it was already loaded
+    def get(self, path):
+        from src.ensemble import load_source
+
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        model = self.models.get(key)
+        if model is not None:
+            self.models.move_to_end(key)
+            return model, True
+        model = load_source(path, self.cache_dir)
+        self.models[key] = model
+        while len(self.models) > self.max_models:
+            self.models.popitem(last=False)
+        return model, False
+
+
+# Runs one job, calling emit(event, fields) for its progress messages. Ticks are run in chunks
+# sized to take about STREAM_SECONDS (a multiple of the recording window `every`); each chunk
+# is recorded into a fresh history that is sent and dropped, and cancelled() is checked in
+# between. Returns the fields of the result message.
+def run_stream_job(job, cache, emit, cancelled):
+    from src.system import SNSystem
+
+    start = time.perf_counter()
+    result = {"status": "ok", "ticks": 0, "cached": False, "counts": {}, "error": ""}
+    try:
+        model, result["cached"] = cache.get(job["model"])
+        system = SNSystem(engine=job.get("engine") or "numpy")
+        system.load_model(model)
+        neurons = job.get("neurons")
+        ids = list(model.ids) if neurons is None else list(neurons)
+        positions = [model.index[n_id] for n_id in ids]
+        every = int(job.get("every", 1))
+        ticks = int(job["ticks"])
+        timeout = job.get("timeout")
+
+        chunk = every
+        while result["ticks"] < ticks:
+            if cancelled():
+                result["status"] = "cancelled"
+                break
+            history = system.record(neurons=ids, every=every)
+            chunk_start = time.perf_counter()
+            done = system.run(min(chunk, ticks - result["ticks"]), stop_on_halt=True)
+            emit("progress", {"tick": result["ticks"], "ticks": done, "history": history.to_dict()})
+            result["ticks"] += done
+            if system.halted:
+                result["status"] = "halted"
+                break
+            now = time.perf_counter()
+            if timeout is not None and now - start > timeout:
+                result["status"] = "timeout"
+                break
+            per_tick = (now - chunk_start) / done
+            chunk = max(1, min(2 * chunk, int(STREAM_SECONDS / max(per_tick, 1e-9)) // every)) * every
+
+        counts = system.backend.counts_array() if system.backend is not None else model.spikes
+        result["counts"] = dict(zip(ids, counts[positions].tolist()))
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# Worker process: runs the jobs sent to its inbox until it receives None. Events go to the
+# shared queue as (event, job number, fields); cancel[index] holds the number of a job to stop.
+def run_worker(index, inbox, events, cancel, max_models, cache_dir):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import src.system    # noqa: F401  (imported once per worker, not per job)
+
+    cache = ModelCache(max_models, cache_dir)
+    while True:
+        job = inbox.get()
+        if job is None:
+            break
+        seq = job["seq"]
+        result = run_stream_job(job, cache,
+                                lambda event, fields: events.put((event, seq, fields)),
+                                lambda: cancel[index] == seq)
+        events.put(("result", seq, result))
+
+
+def is_progress(message):
+    return message is not None and message.get("event") == "progress"
+
+
+# A job as the server tracks it
+class ServerJob:
+    def __init__(self, seq, job_id, request, connection):
+        self.seq = seq
+        self.id = job_id
+        self.request = request
+        self.connection = connection
+        self.worker = None              # Index of the worker running it
+
+
+# One client connection; messages are written in order by a sender task that waits for the
+# client to read them (asyncio drain). At most max_progress progress events wait in the outbox:
+# past that the oldest one is dropped, so a slow client does not make them pile up in memory.
+class Connection:
+    def __init__(self, writer, max_progress=MAX_PROGRESS):
+        self.writer = writer
+        self.jobs = {}                  # Client job id -> ServerJob
+        self.max_progress = max_progress
+        self.outbox = deque()
+        self.progress = 0               # Progress events in the outbox
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        self.sender = asyncio.ensure_future(self.send_all())
+
+    def send(self, message):
+        if is_progress(message):
+            if self.progress >= self.max_progress:
+                oldest = next(i for i, queued in enumerate(self.outbox) if is_progress(queued))
+                del self.outbox[oldest]
+                self.progress -= 1
+                self.dropped += 1
+            self.progress += 1
+        self.outbox.append(message)
+        self.ready.set()
+
+    async def send_all(self):
+        while True:
+            if not self.outbox:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            message = self.outbox.popleft()
+            if message is None:
+                break
+            if is_progress(message):
+                self.progress -= 1
+            try:
+                self.writer.write(json.dumps(message).encode() + b"\n")
+                await self.writer.drain()
+            except ConnectionError:
+                break
+
+
+# Accepts jobs from any number of connections and runs them on a pool of worker processes,
+# started once with the simulator imported. Each worker keeps its own LRU of compiled models
+# and the dispatcher prefers an idle worker that ran the same model recently.
+class JobServer:
+    def __init__(self, workers=None, max_models=MAX_MODELS, max_queued=MAX_QUEUED, cache_dir=None):
+        self.num_workers = workers or os.cpu_count() or 1
+        self.max_models = max_models
+        self.max_queued = max_queued
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.queued = deque()
+        self.running = {}               # Job number -> ServerJob
+        self.idle = []
+        self.recent = []                # Per worker: model paths it ran last, most recent last
+        self.next_seq = 1
+        self.completed = 0
+        self.server = None
+        self.loop = None
+
+    async def start(self, path=None, host="127.0.0.1", port=0):
+        self.loop = asyncio.get_running_loop()
+        context = mp.get_context()
+        self.events = context.Queue()
+        self.cancel = context.Array("q", self.num_workers, lock=False)
+        self.inboxes = [context.SimpleQueue() for _ in range(self.num_workers)]
+        self.processes = [context.Process(target=run_worker, daemon=True,
+                                          args=(index, self.inboxes[index], self.events, self.cancel,
+                                                self.max_models, self.cache_dir))
+                          for index in range(self.num_workers)]
+        for process in self.processes:
+            process.start()
+        self.idle = list(range(self.num_workers))
+        self.recent = [deque(maxlen=self.max_models) for _ in range(self.num_workers)]
+        self.listener = threading.Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        self.events.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    # Thread moving worker events onto the event loop
+    def listen(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            self.loop.call_soon_threadsafe(self.on_event, *event)
+
+    def on_event(self, event, seq, fields):
+        job = self.running.get(seq)
+        if job is None:
+            return
+        if event == "result":
+            del self.running[seq]
+            self.idle.append(job.worker)
+            self.completed += 1
+            self.finish(job, fields)
+            self.dispatch()
+        elif job.connection is not None:
+            job.connection.send({"id": job.id, "event": event, **fields})
+
+    def finish(self, job, fields):
+        if job.connection is not None:
+            job.connection.jobs.pop(job.id, None)
+            job.connection.send({"id": job.id, "event": "result", **fields})
+
+    # Hands queued jobs to idle workers
+    def dispatch(self):
+        while self.queued and self.idle:
+            job = self.queued.popleft()
+            model = job.request["model"]
+            worker = next((w for w in self.idle if model in self.recent[w]), self.idle[0])
+            self.idle.remove(worker)
+            if model in self.recent[worker]:
+                self.recent[worker].remove(model)
+            self.recent[worker].append(model)
+            job.worker = worker
+            self.running[job.seq] = job
+            self.inboxes[worker].put({**job.request, "seq": job.seq})
+            job.connection.send({"id": job.id, "event": "started", "worker": worker})
+
+    def submit(self, connection, request):
+        job_id = request.get("id")
+        if job_id is None or job_id in connection.jobs:
+            connection.send({"id": job_id, "event": "error", "error": "missing or duplicate job id"})
+            return
+        if "model" not in request or "ticks" not in request:
+            connection.send({"id": job_id, "event": "error", "error": "a run needs a model and ticks"})
+            return
+        if len(self.queued) >= self.max_queued:
+            connection.send({"id": job_id, "event": "rejected", "queued": len(self.queued)})
+            return
+        job = ServerJob(self.next_seq, job_id, request, connection)
+        self.next_seq += 1
+        connection.jobs[job_id] = job
+        self.queued.append(job)
+        connection.send({"id": job_id, "event": "queued", "position": len(self.queued)})
+        self.dispatch()
+
+    # Drops a queued job or asks its worker to stop it after the current chunk
+    def cancel_job(self, job):
+        if job.worker is None:
+            self.queued.remove(job)
+            self.finish(job, {"status": "cancelled", "ticks": 0, "cached": False, "counts": {},
+                             "error": "", "seconds": 0.0})
+        else:
+            self.cancel[job.worker] = job.seq
+
+    def stats(self):
+        return {"event": "stats", "workers": self.num_workers, "idle": len(self.idle),
+                "queued": len(self.queued), "running": len(self.running), "completed": self.completed}
+
+    async def handle(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                except (ValueError, AttributeError):
+                    connection.send({"event": "error", "error": "expected one JSON object per line"})
+                    continue
+                if op == "run":
+                    self.submit(connection, request)
+                elif op == "cancel":
+                    job = connection.jobs.get(request.get("id"))
+                    if job is None:
+                        connection.send({"id": request.get("id"), "event": "error", "error": "unknown job"})
+                    else:
+                        self.cancel_job(job)
+                elif op == "stats":
+                    connection.send(self.stats())
+                else:
+                    connection.send({"event": "error", "error": f"unknown op {op!r}"})
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            # Jobs of a closed connection are cancelled and their messages dropped
+            for job in list(connection.jobs.values()):
+                job.connection = None
+                self.cancel_job(job)
+            connection.send(None)
+            try:
+                await connection.sender
+            except asyncio.CancelledError:
+                pass
+            writer.close()
+
+
+# Blocking client for scripts: one connection, requests and events as dicts
+class Client:
+    def __init__(self, path=None, host="127.0.0.1", port=None, timeout=None):
+        if path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(path)
+        else:
+            sock = socket.create_connection((host, port), timeout)
+        self.sock = sock
+        self.file = sock.makefile("rwb")
+        self.unread = deque()          # Events received while waiting for another job's
+
+    def send(self, **request):
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+
+    def receive(self):
+        if self.unread:
+            return self.unread.popleft()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    # Submits a run and yields its events up to and including the final one
+    def run(self, job_id, model, ticks, **options):
+        self.send(op="run", id=job_id, model=model, ticks=ticks, **options)
+        held = []
+        while True:
+            event = self.receive()
+            if event.get("id") != job_id:
+                held.append(event)
+                continue
+            yield event
+            if event["event"] in ("result", "rejected", "error"):
+                self.unread.extend(held)
+                return
+
+    def cancel(self, job_id):
+        self.send(op="cancel", id=job_id)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+async def serve(path=None, host="127.0.0.1", port=0, **options):
+    server = JobServer(**options)
+    address = await server.start(path, host, port)
+    print(f"Serving on {address}", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.server",
+                                     description="Serve SN P simulation jobs to local clients.")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", default=None, help="Unix socket path to listen on")
+    where.add_argument("--port", type=int, default=None, help="localhost TCP port to listen on")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-models", type=int, default=MAX_MODELS, help="compiled models kept per worker")
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED, help="waiting jobs before rejecting")
+    parser.add_argument("--cache-dir", default=None, help="keep compiled copies of the .snps files here")
+    args = parser.parse_args(argv)
+
+    asyncio.run(serve(args.socket, args.host, args.port or 0, workers=args.workers,
+                      max_models=args.max_models, max_queued=args.max_queued, cache_dir=args.cache_dir))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
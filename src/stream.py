@@ -0,0 +1,91 @@
+import numpy as np
+
+
+# What happened in one step of a run: tick `tick` (0-based, counted from the start of the
+# run) plus the `skipped` idle ticks fast-forwarded after it. Holds the counts of the selected
+# neurons after the step and the positions whose count changed; neuron ids are resolved only
+# when read.
+class TickView:
+    __slots__ = ("tick", "skipped", "firings", "emitted", "values", "changed_positions",
+                 "_columns", "_latest", "_ids", "_index")
+
+    def __init__(self, tick, skipped, firings, emitted, values, changed_positions, columns, latest, ids, index):
+        self.tick = tick
+        self.skipped = skipped
+        self.firings = firings                      # Rules applied
+        self.emitted = emitted                      # Spikes put on synapses
+        self.values = values                        # Spike counts of the selected neurons, in selection order
+        self.changed_positions = changed_positions
+        self._columns = columns                     # Position -> index in values (None: every neuron, in order)
+        self._latest = latest                       # The watch's counts of every neuron, kept up to date
+        self._ids = ids
+        self._index = index
+
+    # Ids of the neurons whose spike count changed
+    @property
+    def changed(self):
+        return [self._ids[p] for p in self.changed_positions.tolist()]
+
+    # Spike count of one neuron. A neuron outside the selection is read from the run's latest
+    # counts, so it holds this step's count only until the run moves on.
+    def __getitem__(self, neuron_id):
+        pos = self._index[neuron_id]
+        col = pos if self._columns is None else self._columns.get(pos)
+        if col is None:
+            return int(self._latest[pos])
+        return int(self.values[col])
+
+    def __repr__(self):
+        return (f"TickView(tick={self.tick}, skipped={self.skipped}, firings={self.firings}, "
+                f"emitted={self.emitted}, changed={self.changed})")
+
+
+# Builds a TickView after every step of a run. Firings and emitted spikes are the profiler
+# counters of the tick; the engines also report the positions that fired or received spikes,
+# and only those are read back and compared with the watch's copy of the counts. With no
+# Profiler running the watch installs a TickCounter, which keeps the counters without timing.
+class TickWatch:
+    def __init__(self, system, neurons=None):
+        from src.profiler import TickCounter
+
+        self.system = system
+        ids = system.neuron_ids
+        index = system.neuron_index
+        if neurons is None:
+            self.positions = np.arange(len(ids), dtype=np.int64)
+            self.columns = None
+        else:
+            self.positions = np.array([index[n_id] for n_id in neurons], dtype=np.int64)
+            self.columns = {pos: col for col, pos in enumerate(self.positions.tolist())}
+        self.owns_profiler = system.profiler is None
+        if self.owns_profiler:
+            system.profiler = system.backend.profiler = TickCounter()
+        self.profiler = system.profiler
+        self.owns_touched = self.profiler.touched is None
+        if self.owns_touched:
+            self.profiler.touched = []
+        self.compare = getattr(system.backend, "untracked_changes", False)
+        self.counts = system.backend.counts_array()
+
+    def view(self, tick, skipped):
+        system = self.system
+        if self.compare:
+            counts = system.backend.counts_array()
+            changed = np.flatnonzero(counts != self.counts)
+            self.counts = counts
+        else:
+            touched = self.profiler.touched
+            touched = np.unique(np.concatenate(touched)) if touched else np.zeros(0, dtype=np.int64)
+            counts = system.backend.counts_array(touched)
+            differs = counts != self.counts[touched]
+            changed = touched[differs]
+            self.counts[changed] = counts[differs]
+        last = self.profiler.last
+        return TickView(tick, skipped, last["firings"], last["spikes_emitted"], self.counts[self.positions],
+                        changed, self.columns, self.counts, system.neuron_ids, system.neuron_index)
+
+    def close(self):
+        if self.owns_profiler:
+            self.system.profile(enabled=False)
+        elif self.owns_touched:
+            self.profiler.touched = None
@@ -1,5 +1,9 @@
-# Represents a connection from one neuron to another
+# Represents a connection from one neuron to another, carrying `weight` spikes for every spike
+# its source produces (parallel synapses add up)
 class Synapse:
-    def __init__(self, source_id, target_id):
+    __slots__ = ("source_id", "target_id", "weight")
+
+    def __init__(self, source_id, target_id, weight=1):
         self.source_id = source_id
-        self.target_id = target_id
\ No newline at end of file
+        self.target_id = target_id
+        self.weight = weight
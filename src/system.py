@@ -1,184 +1,562 @@
-import cupy as cp
-from cuda.apply_rules_kernel import apply_rules_multi_kernel
-import matplotlib.pyplot as plt
-from src.neuron import Neuron
 from src.synapse import Synapse
+from src.adjacency import Adjacency
+from src.engines import get_engine
+
+RUN_BLOCK_VALUES = 1 << 22     # Recorded counts per block of ticks run in one engine call
 
 # Manages the full SN P system: neurons and their communication
 class SNSystem:
-    def __init__(self, use_gpu=False, verbose=False):
+    def __init__(self, use_gpu=False, verbose=False, engine=None, engine_options=None):
         self.use_gpu = use_gpu
         self.verbose = verbose
+        self.engine = engine or ("cuda" if use_gpu else "python")   # See src.engines
+        self.engine_options = engine_options or {}                  # Passed to the engine's from_system
         self.neurons = {}
         self.synapses = []
-        self.gpu_initialized = False
-        self.delay_buffer = [[] for _ in range(10)]
-        self.spike_history = {}
-
-    def init_gpu(self):
-        neurons = list(self.neurons.values())
-        self.neuron_order = [n.id for n in neurons]
-
-        self.spike_counts = cp.array([n.spike_count for n in neurons], dtype=cp.int64)
-        self.thresholds = cp.array([n.rules[0]['condition_threshold'] for n in neurons], dtype=cp.int64)
-        self.consumes = cp.array([n.rules[0]['consume'] for n in neurons], dtype=cp.int64)
-        self.produces = cp.array([n.rules[0]['produce'] for n in neurons], dtype=cp.int64)
-        self.delays = cp.array([n.rules[0]['delay'] for n in neurons], dtype=cp.int64)
-        self.fire_counts = cp.zeros_like(self.spike_counts)
-
-        self.gpu_initialized = True
-
+        self.model = None                  # CompiledModel when built from compiled arrays
+        self.editor = None                 # ModelEditor holding edits of the model, see edit_model()
+        self._neuron_ids = []
+        self._neuron_index = {}
+        self.adjacency = Adjacency()       # Source -> targets index over positions
+        self.backend = None                # Engine instance, created on the first tick
+        self.delay_queue = None            # In-flight spikes (DelayQueue), shared by the engines
+        self.history = None                # SpikeHistory, see record()
+        self.halted = False                # Set by run() once no rule can fire and nothing is in flight
+        self.cycle = None                  # Cycle(transient, period) found by run(detect_cycles=True)
+        self.profiler = None               # Profiler, see profile()
+        self.result_cache = None           # ResultCache, see cache_results()
+
+    # The compiled model, with the pending structural edits applied
+    @property
+    def model(self):
+        if self.editor is not None:
+            self.apply_edits()
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self.editor = None
+        self._model = model
+
+    # Editor of the compiled model (see src/incremental.py). The engine's spike counts become
+    # the editor's, so the state carries over to the engine rebuilt after the edits.
+    def edit_model(self):
+        from src.incremental import ModelEditor
+
+        if self.editor is None:
+            counts = None if self.backend is None else self.backend.counts_array()
+            self.release_engine()
+            self.editor = ModelEditor(self._model, counts)
+        return self.editor
+
+    # Lays out the edited model compactly; the in-flight spikes follow their neurons
+    def apply_edits(self):
+        editor = self.editor
+        self.editor = None
+        model, kept = editor.compile()
+        if self.delay_queue is not None:
+            self.delay_queue.take(kept[kept < editor.num_base])
+            self.delay_queue.resize(model.num_neurons)
+        self._model = model
+
+    # Neuron position -> id
+    @property
+    def neuron_ids(self):
+        return self._neuron_ids if self.model is None else self.model.ids
+
+    # Neuron id -> position
+    @property
+    def neuron_index(self):
+        return self._neuron_index if self.model is None else self.model.index
+
+    # Makes a compiled model the system's structure. Neurons are then read through a
+    # NeuronTable and Neuron/Synapse objects are only built if the object API needs them
+    # (including assignments to a neuron read from the table).
+    def load_model(self, model):
+        from src.neuron_table import NeuronTable
+
+        self.release_engine()
+        cache = self.result_cache
+        self.__init__(self.use_gpu, self.verbose, self.engine, self.engine_options)
+        self.result_cache = cache
+        self.model = model
+        self.neurons = NeuronTable(self)
+
+    # Replaces the compiled model by Neuron/Synapse objects carrying the current spike counts
+    def materialize(self):
+        model = self.model
+        if model is None:
+            return
+        counts = model.spikes if self.backend is None else self.backend.counts_array()
+        self.release_engine()
+        self.model = None
+        self.neurons = {}
+        for pos in range(model.num_neurons):
+            neuron = model.neuron(pos, int(counts[pos]))
+            self.neurons[neuron.id] = neuron
+        self._neuron_ids = list(model.ids)
+        self._neuron_index = dict(model.index)
+        for source in range(model.num_neurons):
+            start, end = model.indptr[source], model.indptr[source + 1]
+            for target, weight in zip(model.indices[start:end].tolist(), model.weights[start:end].tolist()):
+                self.synapses.append(Synapse(model.ids[source], model.ids[target], weight))
+                self.adjacency.add(source, target, weight)
+
+    # Copies the engine's spike counts back to the Neuron objects
+    def sync_neurons(self):
+        if self.backend is not None and self.model is None:
+            self.backend.sync(self.neurons)
+
+    # Recorded spike counts (a SpikeHistory: neuron id -> array of counts)
+    @property
+    def spike_history(self):
+        if self.history is None:
+            self.record()
+        return self.history
+
+    # Chooses what run() records: a subset of neurons (None = all), one row per window of
+    # `every` ticks holding the window's "last", "min" or "max" counts. Starts a new history.
+    def record(self, neurons=None, every=1, aggregate="last", chunk_size=4096):
+        from src.history import SpikeHistory
+
+        self.history = SpikeHistory(neurons, every, aggregate, chunk_size)
+        return self.history
+
+    # Starts timing the phases of every tick and counting firings and spikes (see
+    # src/profiler.py); returns the Profiler. enabled=False stops profiling.
+    def profile(self, enabled=True, stream=None):
+        from src.profiler import Profiler
+
+        self.profiler = Profiler(stream) if enabled else None
+        if self.backend is not None:
+            self.backend.profiler = self.profiler
+        return self.profiler
+
+    # Answers runs from an on-disk cache of earlier results in `directory` (see
+    # src/result_cache.py), keeping it under max_bytes by evicting the least recently used
+    # entries; returns the ResultCache. directory=None turns caching off.
+    def cache_results(self, directory=None, max_bytes=None):
+        from src.result_cache import ResultCache, DEFAULT_MAX_BYTES
+
+        self.result_cache = None if directory is None else ResultCache(directory, max_bytes or DEFAULT_MAX_BYTES)
+        return self.result_cache
+
+    @property
+    def gpu_initialized(self):
+        return self.backend is not None and self.engine == "cuda"
+
+    def init_engine(self):
+        self.release_engine()
+        self.backend = get_engine(self.engine).from_system(self, **self.engine_options)
+        self.backend.profiler = self.profiler
+
+    # Drops the engine, letting engines that hold processes or shared memory release them
+    def release_engine(self):
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+        self.backend = None
+
+    # Drops the engine state after a structural change (recompiled on the next tick)
+    def invalidate_engine(self):
+        self.materialize()
+        self.sync_neurons()
+        self.release_engine()
+
+    # The system's delay queue, sized for the registered neurons and delays up to max_delay.
+    # xp is the array module the engine works in (numpy by default, or cupy)
+    def reserve_delay_queue(self, max_delay=0, xp=None):
+        from src.delay_queue import DelayQueue
+
+        if xp is None:
+            import numpy as xp
+        if self.delay_queue is None:
+            self.delay_queue = DelayQueue(len(self.neuron_ids), max_delay, xp)
+        else:
+            self.delay_queue.to(xp)
+            self.delay_queue.resize(len(self.neuron_ids))
+            self.delay_queue.reserve(max_delay)
+        return self.delay_queue
+
+    # Position of a neuron id in the index, registering it on first use
+    def position(self, neuron_id):
+        pos = self.neuron_index.get(neuron_id)
+        if pos is None:
+            pos = len(self._neuron_ids)
+            self._neuron_index[neuron_id] = pos
+            self._neuron_ids.append(neuron_id)
+        return pos
+
+    # Ids of the neurons a source sends its spikes to
+    def targets_of(self, source_id):
+        pos = self.neuron_index.get(source_id)
+        if pos is None:
+            return []
+        targets = self.adjacency.targets_of(pos, len(self.neuron_ids))
+        return [self.neuron_ids[t] for t in targets.tolist()]
+
+    # Structural edits. A compiled system stays compiled: edits go to its ModelEditor in time
+    # proportional to the edit and are applied together when the structure is next read.
     def add_neuron(self, neuron):
+        if self._model is not None:
+            self.edit_model().add_neuron(neuron)
+            return
+        self.invalidate_engine()
+        self.position(neuron.id)
         self.neurons[neuron.id] = neuron
 
     def add_synapse(self, synapse):
+        if self._model is not None:
+            self.edit_model().add_synapse(synapse.source_id, synapse.target_id, synapse.weight)
+            return
+        self.invalidate_engine()
         self.synapses.append(synapse)
-
+        self.adjacency.add(self.position(synapse.source_id), self.position(synapse.target_id), synapse.weight)
+
+    # Removes a neuron with its synapses; its in-flight spikes are dropped
+    def remove_neuron(self, neuron_id):
+        if self._model is not None:
+            self.edit_model().remove_neuron(neuron_id)
+            return
+        if neuron_id not in self._neuron_index:
+            raise KeyError(f"Unknown neuron {neuron_id}")
+        self.invalidate_engine()
+        self.neurons.pop(neuron_id, None)
+        self.synapses = [synapse for synapse in self.synapses
+                         if neuron_id not in (synapse.source_id, synapse.target_id)]
+        kept = [p for p, n_id in enumerate(self._neuron_ids) if n_id != neuron_id]
+        self._neuron_ids = [self._neuron_ids[p] for p in kept]
+        self._neuron_index = {n_id: p for p, n_id in enumerate(self._neuron_ids)}
+        self.adjacency = Adjacency()
+        for synapse in self.synapses:
+            self.adjacency.add(self._neuron_index[synapse.source_id], self._neuron_index[synapse.target_id],
+                               synapse.weight)
+        if self.delay_queue is not None:
+            self.delay_queue.take([p for p in kept if p < self.delay_queue.num_neurons])
+
+    # Removes the synapses from source to target, whatever their weight
+    def remove_synapse(self, source_id, target_id):
+        if self._model is not None:
+            self.edit_model().remove_synapse(source_id, target_id)
+            return
+        kept = [synapse for synapse in self.synapses
+                if synapse.source_id != source_id or synapse.target_id != target_id]
+        if len(kept) == len(self.synapses):
+            raise KeyError(f"No synapse from {source_id} to {target_id}")
+        self.invalidate_engine()
+        self.synapses = kept
+        self.adjacency.remove(self._neuron_index[source_id], self._neuron_index[target_id])
+
+    # Replaces the rules of a neuron
+    def set_rules(self, neuron_id, rules):
+        if self._model is not None:
+            self.edit_model().set_rules(neuron_id, rules)
+            return
+        self.invalidate_engine()
+        self.neurons[neuron_id].rules = rules
+
+    # Loads a .snps model through the streaming parser (see src/parser.py)
     def load_from_file(self, path):
-        file = None
+        from src.parser import parse_snps, SNPSFormatError
+
         try:
-            file = open(path, "r")
-        except:
-            return False
-        lines = file.readlines()
-        file.close()
-
-        null_mode = 0
-        neuron_mode = 1
-        synapse_mode = 2
-
-        mode = null_mode
-
-        for line in lines:
-            line = line[0 : len(line) - 1]
-            if len(line) == 0 or line[0] == "#":
-                continue
-            if mode == null_mode:
-                if line != "*N":
-                    self.__init__()
-                    return False
-                mode = neuron_mode
-            elif mode == neuron_mode:
-                if line == "*S":
-                    mode = synapse_mode
-                else:
-                    tokens = line.split(" ")
-                    rules = []
-                    for rule_nr in range(0, int(tokens[3])):
-                        if self.use_gpu:
-                            rules.append({
-                                "consume": int(tokens[4 + rule_nr * 4]),
-                                "produce": int(tokens[5 + rule_nr * 4]),
-                                "delay": int(tokens[6 + rule_nr * 4]),
-                                "condition_threshold": int(tokens[7 + rule_nr * 4])
-                                })
-                        else:
-                            rules.append({
-                                "consume": int(tokens[4 + rule_nr * 4]),
-                                "produce": int(tokens[5 + rule_nr * 4]),
-                                "delay": int(tokens[6 + rule_nr * 4]),
-                                 "condition": lambda x, tr = int(tokens[7 + rule_nr * 4]): x >= tr
-                                 })
-                    self.add_neuron(Neuron(tokens[0], spike_count=int(tokens[1]), verbose=tokens[2] == "1", rules=rules))
-            elif mode == synapse_mode:
-                tokens = line.split(" ")
-                self.add_synapse(Synapse(tokens[0], tokens[1]))
-
-        if mode != synapse_mode or len(self.synapses) == 0:
-            self.__init__()
+            model = parse_snps(path)
+        except (OSError, SNPSFormatError):
+            self.release_engine()
+            self.__init__(self.use_gpu, self.verbose, self.engine, self.engine_options)
             return False
-
+        self.load_model(model)
         return True
 
-    def tick(self):
-        if self.use_gpu:
-            if not self.gpu_initialized:
-                self.init_gpu()
-            self.tick_gpu()
-        else:
-            self.tick_cpu()
+    # Writes the compiled model to a directory that load_compiled can memory-map
+    def save_compiled(self, path):
+        from src.compiled import compile_system, save_compiled
 
-    def tick_cpu(self):
-        for neuron in self.neurons.values():
-            neuron.tick()
+        save_compiled(compile_system(self), path)
 
-        transmissions = []
+    def load_compiled(self, path, mmap=True):
+        from src.compiled import load_compiled
 
-        for neuron in self.neurons.values():
-            to_send = [s for s in neuron.pending_spikes if s[0] == 0]
-            neuron.pending_spikes = [s for s in neuron.pending_spikes if s[0] > 0]
+        self.load_model(load_compiled(path, mmap))
 
-            for delay, amount in to_send:
-                for syn in self.synapses:
-                    if syn.source_id == neuron.id:
-                        transmissions.append((syn.target_id, amount))
+    # Builds the system straight from arrays: neuron count or ids, spikes, rule columns and
+    # synapse position arrays (see src/builders.py build_model for the arguments)
+    def build(self, neurons, **columns):
+        from src.builders import build_model
 
-        for target_id, amount in transmissions:
-            self.neurons[target_id].receive_spike(amount)
+        self.load_model(build_model(neurons, **columns))
 
-    def tick_gpu(self):
-        N = len(self.spike_counts)
-        threads = 32
-        blocks = (N + threads - 1) // threads
+    # Builds a model of a common family: "chain", "ring", "random_sparse", "layered",
+    # "multiply" or "polynomial" (see src/builders.py), e.g. generate("ring", 1000000)
+    def generate(self, family, *args, **options):
+        from src.builders import FAMILIES
+
+        if family not in FAMILIES:
+            raise ValueError(f"Unknown family {family!r}, expected one of {list(FAMILIES)}")
+        self.load_model(FAMILIES[family](*args, **options))
 
-        apply_rules_multi_kernel((blocks,), (threads,),
-            (self.spike_counts, self.thresholds, self.consumes,
-             self.produces, self.delays, self.fire_counts, N))
+    # Writes the spike counts, in-flight spikes, tick and recorded history to a compressed
+    # checkpoint file (see src/checkpoint.py)
+    def save_checkpoint(self, path):
+        from src.checkpoint import save_checkpoint
 
-        fire_counts_host = self.fire_counts.get()
-        produces_host = self.produces.get()
-        delays_host = self.delays.get()
+        save_checkpoint(self, path)
 
-        transmissions = []
+    # Restores a checkpoint into this system, which must have the same neurons; the selected
+    # engine resumes from it on the next tick. Returns the tick the checkpoint was taken at.
+    def load_checkpoint(self, path):
+        from src.checkpoint import load_checkpoint
+
+        return load_checkpoint(self, path)
+
+    # Advances one tick; returns False if nothing fired or arrived
+    def tick(self):
+        if self.backend is None:
+            self.init_engine()
+        if self.profiler is None:
+            return self.backend.tick()
+        self.profiler.start_tick()
+        active = self.backend.tick()
+        self.profiler.lap("other")
+        return active
+
+    # Reference path on the Neuron objects, independent of the selected engine
+    def tick_cpu(self):
+        get_engine("python").from_system(self).tick()
+
+    def init_gpu(self):
+        self.engine = "cuda"
+        self.init_engine()
+
+    def tick_gpu(self):
+        if not self.gpu_initialized:
+            self.init_gpu()
+        self.backend.tick()
+
+    # Runs copies of this system from many initial configurations at once (see src/batch.py);
+    # returns a BatchResult with the final spike counts of every instance
+    def run_batch(self, initial, ticks):
+        from src.batch import run_batch
+        from src.compiled import compile_system
+
+        self.sync_neurons()
+        return run_batch(compile_system(self), initial, ticks)
+
+    # Explores every computation of this system, letting each neuron use any of its applicable
+    # rules (see src/explorer.py); returns an ExplorationResult with the halting configurations
+    # and, if outputs are given, how often each output count is reached
+    def explore(self, outputs=None, **options):
+        from src.compiled import compile_system
+        from src.explorer import explore
+
+        self.sync_neurons()
+        return explore(compile_system(self), outputs, **options)
+
+    # Runs `ticks` ticks. With fast_forward, a tick in which nothing fired or arrived means no
+    # rule can fire until the next arrival, so the clock jumps straight to it (or to the end of
+    # the run once nothing is in flight) and the skipped ticks are recorded in one block.
+    # stop_on_halt ends the run instead once the system has halted.
+    # With detect_cycles, a repeated configuration is reported in self.cycle (transient length
+    # and period, counted from the start of this run); on_cycle="stop" ends the run there and
+    # "extrapolate" replays one period and repeats its spike history for the remaining ticks.
+    # With a checkpoint path, the state is saved there every checkpoint_every ticks and at the
+    # end of the run (a callable checkpoint is called as checkpoint(system, tick) instead).
+    # With cache_results() on, runs without checkpoint or on_tick go through the result cache.
+    # on_tick(view) is called after every step with a TickView (see src/stream.py) that selects
+    # no neurons: view[neuron_id] reads the counts during the call. Returning True ends the run
+    # there. Ticks replayed or jumped over by cycle extrapolation are not
+    # reported.
+    def run(self, ticks, fast_forward=True, stop_on_halt=False, detect_cycles=False,
+            on_cycle="extrapolate", checkpoint=None, checkpoint_every=100000, on_tick=None):
+        if on_cycle not in ("stop", "extrapolate"):
+            raise ValueError(f"Unknown on_cycle {on_cycle!r}, expected 'stop' or 'extrapolate'")
+        if self.result_cache is not None and checkpoint is None and on_tick is None and not self.verbose:
+            ran = self.result_cache.run(self, ticks, fast_forward, stop_on_halt,
+                                        detect_cycles=detect_cycles, on_cycle=on_cycle)
+            if ran is not None:
+                return ran
+        if self.backend is None:
+            self.init_engine()
+        history = self.spike_history
+        history.bind(self)
+        fast_forward = fast_forward and not self.verbose
+        self.halted = False
+        self.cycle = None
+
+        detector = None
+        if detect_cycles:
+            from src.cycles import CycleDetector
+            queue = self.delay_queue or self.reserve_delay_queue()
+            detector = CycleDetector(self.backend, queue)
+            detector.observe(0)
+
+        watch = None
+        if on_tick is not None:
+            from src.stream import TickWatch
+            watch = TickWatch(self, neurons=())
+
+        t = 0
+        saved = 0
+        try:
+            while t < ticks:
+                stop = False
+                if watch is None and self._runs_blocks(detector):
+                    limit = ticks if checkpoint is None else min(ticks, saved + checkpoint_every)
+                    t += self._run_block(t, limit, ticks, history, fast_forward, stop_on_halt)
+                else:
+                    step = self._step(t, ticks, [history], fast_forward, stop_on_halt)
+                    stop = watch is not None and bool(on_tick(watch.view(t, step - 1)))
+                    t += step
+                if checkpoint is not None and t - saved >= checkpoint_every:
+                    self._checkpoint(checkpoint, t)
+                    saved = t
+                if stop or self.halted and stop_on_halt:
+                    break
+                if detector is None or not detector.observe(t):
+                    continue
+                self.cycle = detector.cycle
+                if on_cycle == "stop":
+                    break
+                t = self._extrapolate(t, ticks, history, fast_forward, detector)
+                if detector.cycle is not None:
+                    detector.close()
+                    detector = None
+        finally:
+            if detector is not None:
+                detector.close()
+            if watch is not None:
+                watch.close()
+
+        if checkpoint is not None and t > saved:
+            self._checkpoint(checkpoint, t)
+        self.sync_neurons()
+        return t
+
+    def _checkpoint(self, checkpoint, t):
+        if callable(checkpoint):
+            checkpoint(self, t)
+        else:
+            self.save_checkpoint(checkpoint)
+
+    # Runs up to `ticks` ticks as a generator of TickView objects (see src/stream.py), one per
+    # step: the tick, the idle ticks fast-forwarded after it, firings, emitted spikes, the
+    # neurons whose count changed and the counts of `neurons` (all if None). No spike history
+    # is recorded, so memory stays constant however long the run; stop early by leaving the
+    # loop. The Neuron objects are synced when the generator finishes or is closed.
+    def iter_run(self, ticks, neurons=None, fast_forward=True, stop_on_halt=False):
+        from src.stream import TickWatch
+
+        if self.backend is None:
+            self.init_engine()
+        watch = TickWatch(self, neurons)
+        fast_forward = fast_forward and not self.verbose
+        self.halted = False
+        self.cycle = None
+        t = 0
+        try:
+            while t < ticks:
+                step = self._step(t, ticks, [], fast_forward, stop_on_halt)
+                yield watch.view(t, step - 1)
+                t += step
+                if self.halted and stop_on_halt:
+                    break
+        finally:
+            watch.close()
+            self.sync_neurons()
+
+    # Advances one tick, plus the idle ticks after it when fast-forwarding, without going past
+    # `end`; records into every history given and returns the number of ticks advanced
+    def _step(self, t, end, histories, fast_forward, stop_on_halt=False):
+        if self.verbose:
+            print(f"\nTick {t}")
+
+        active = self.tick()
+        for history in histories:
+            history.record(self.backend)
 
         if self.verbose:
-            print("fire_counts_host:", fire_counts_host)
-            print("spike_counts:", self.spike_counts.get())
-
-        for i, fire_times in enumerate(fire_counts_host):
-            if fire_times > 0:
-                amount = int(produces_host[i]) * fire_times
-                delay = int(delays_host[i])
-                source_id = self.neuron_order[i]
-                for syn in self.synapses:
-                    if syn.source_id == source_id:
-                        transmissions.append((delay, syn.target_id, amount))
-
-        id_to_index = {nid: i for i, nid in enumerate(self.neuron_order)}
-
-        for target_id, amount in self.delay_buffer[0]:
-            self.neurons[target_id].receive_spike(amount)
-            idx = id_to_index[target_id]
-            self.spike_counts[idx] += amount
-
-        self.delay_buffer = self.delay_buffer[1:] + [[]]
-
-        for delay, target_id, amount in transmissions:
-            if delay < len(self.delay_buffer):
-                self.delay_buffer[delay].append((target_id, amount))
-            else:
-                print(f"Delay {delay} too big, spike dropped!")
-
-    def run(self, ticks):
-        for t in range(ticks):
-            if self.verbose:
-                print(f"\nTick {t}")
-
-            self.tick()
-
-            for n_id, neuron in self.neurons.items():
-                if n_id not in self.spike_history:
-                    self.spike_history[n_id] = []
-                self.spike_history[n_id].append(neuron.spike_count)
-
-            if self.verbose:
-                for n in self.neurons.values():
-                    print(n)
-    
+            self.sync_neurons()
+            for n in self.neurons.values():
+                print(n)
+
+        skip = 0
+        if not active and fast_forward and t + 1 < end:
+            idle = self.delay_queue.next_arrival()
+            self.halted = idle is None
+            if not (self.halted and stop_on_halt):
+                skip = end - t - 1 if idle is None else min(idle, end - t - 1)
+                self.delay_queue.advance(skip)
+                for history in histories:
+                    history.record_repeat(self.backend, skip)
+        if self.profiler is not None:
+            self.profiler.lap("recording")
+            self.profiler.end_tick(skip)
+        return 1 + skip
+
+    # Whether run() can hand whole blocks of ticks to the engine (engines with run_ticks, see
+    # src/engines/jit_engine.py): not while profiling, printing or looking for cycles
+    def _runs_blocks(self, detector):
+        return (hasattr(self.backend, "run_ticks") and detector is None
+                and self.profiler is None and not self.verbose)
+
+    # Advances up to `limit` ticks in one engine call and records them as a block; returns the
+    # number of ticks advanced. As in _step, once the system has halted the clock moves on to
+    # `end` unless stop_on_halt.
+    def _run_block(self, t, limit, end, history, fast_forward, stop_on_halt):
+        count = min(limit - t, max(1, RUN_BLOCK_VALUES // max(1, len(history.ids))))
+        done, rows, halted = self.backend.run_ticks(count, history.positions, fast_forward)
+        history.record_block(history.widen(rows))
+        if not halted or t + done >= end:
+            return done
+        self.halted = True
+        if stop_on_halt:
+            return done
+        skip = end - t - done
+        self.delay_queue.advance(skip)
+        history.record_repeat(self.backend, skip)
+        return done + skip
+
+    # Replays one period of a detected cycle, checking every configuration against the one a
+    # period earlier, then repeats the replayed spike history for as many whole periods as fit
+    # before `ticks` and moves the clock past them. Returns the new tick; a failed check (hash
+    # collision) clears detector.cycle and self.cycle and hands back to normal stepping.
+    def _extrapolate(self, t, ticks, history, fast_forward, detector):
+        import numpy as np
+        from src.history import SpikeHistory
+
+        period = detector.cycle.period
+        if ticks - t < 2 * period:
+            return t
+        replay = SpikeHistory(neurons=history.ids)
+        replay.bind(self)
+        end = t + period
+        while t < end:
+            t += self._step(t, end, [history, replay], fast_forward)
+            if not detector.confirm(t):
+                detector.reject()
+                self.cycle = None
+                return t
+
+        periods = (ticks - t) // period
+        if len(history.ids):
+            block = replay.as_array()
+            repeats = max(1, history.chunk_rows // period)
+            tiled = np.tile(block, (min(repeats, periods), 1))
+            for done in range(0, periods, repeats):
+                history.record_block(tiled[:min(repeats, periods - done) * period])
+        else:
+            history.record_repeat(self.backend, periods * period)
+        self.delay_queue.jump(periods * period)
+        return t + periods * period
+
     def plot_spike_evolution(self):
+        import matplotlib.pyplot as plt
+
+        history = self.spike_history
+        ticks = history.ticks
         plt.figure(figsize=(10, 6))
-        for neuron_id, spikes in self.spike_history.items():
-            plt.plot(spikes, label=neuron_id)
+        for neuron_id, spikes in history.items():
+            plt.plot(ticks[len(ticks) - len(spikes):], spikes, label=neuron_id)
         plt.xlabel("Tick")
         plt.ylabel("Spike Count")
         plt.title("Neuron Spike Evolution Over Time")
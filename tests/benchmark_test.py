@@ -1,32 +1,16 @@
 import time
+import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
-from src.neuron import Neuron
-from src.synapse import Synapse
 from src.system import SNSystem
 
 def create_massive_system(neuron_count, initial_spikes=1000, connection_gap=10, use_gpu=False):
     sn = SNSystem(use_gpu=use_gpu, verbose=False)
-
-    for i in range(neuron_count):
-        neuron = Neuron(
-            f"N{i}",
-            spike_count=initial_spikes,
-            verbose=False,
-            rules=[{
-                "consume": 10,
-                "produce": 20,
-                "delay": 1,
-                "condition": (lambda x: x >= 10) if not use_gpu else None,
-                "condition_threshold": 10 if use_gpu else None
-            }]
-        )
-        sn.add_neuron(neuron)
-
-    for i in range(0, neuron_count, connection_gap):
-        if i + 1 < neuron_count:
-            sn.add_synapse(Synapse(f"N{i}", f"N{i+1}"))
-
+    sources = np.arange(0, neuron_count - 1, connection_gap)
+    sn.build(neuron_count, spikes=initial_spikes, consumes=10, produces=20, delays=1,
+             thresholds=10, sources=sources, targets=sources + 1, prefix="N")
+    sn.record(neurons=["N0", "N1", f"N{neuron_count - 1}"])   # The timed runs measure ticks, not recording
+    sn.init_engine()    # Engine setup stays out of the timed runs
     return sn
 
 def run_single_benchmark(neuron_count, initial_spikes, connection_gap, ticks):
@@ -1,7 +1,9 @@
+import warnings
 import pytest
 from src.neuron import Neuron
 from src.synapse import Synapse
 from src.system import SNSystem
+from src.delay_queue import DelayQueue
 
 # -----------------------
 # Tests for Neuron
@@ -51,6 +53,28 @@ def test_neuron_rule_not_applied_if_condition_not_met():
     assert neuron.spike_count == 3  # no rule applied
     assert neuron.pending_spikes == []
 
+def test_neuron_rules_are_compiled_to_rule_objects():
+    from src.compiled import THRESHOLD, CALLABLE
+    from src.rule import Rule
+
+    condition = lambda x: x % 2 == 0
+    neuron = Neuron("n6", spike_count=4, rules=[
+        {"consume": 1, "produce": 2, "delay": 0, "condition_threshold": 5},
+        {"consume": 2, "produce": 1, "delay": 3, "condition": condition}
+    ])
+    first, second = neuron.rules
+    assert isinstance(first, Rule) and first.kind == THRESHOLD and first.threshold == 5
+    assert second.kind == CALLABLE and second["condition"] is condition
+    assert first["consume"] == 1 and first.get("condition") is None
+    assert first == {"consume": 1, "produce": 2, "delay": 0, "condition_threshold": 5}
+    with pytest.raises(AttributeError):
+        first.consume = 3
+    with pytest.raises(AttributeError):
+        neuron.color = "red"
+
+    assert neuron.fire() == (3, 1)
+    assert neuron.spike_count == 2
+
 # -----------------------
 # Tests for Synapse
 # -----------------------
@@ -60,6 +84,116 @@ def test_synapse_creation():
     assert syn.source_id == "n1"
     assert syn.target_id == "n2"
 
+# -----------------------
+# Tests for DelayQueue
+# -----------------------
+
+def test_delay_queue_delivers_after_delay():
+    import numpy as np
+
+    queue = DelayQueue(3, max_delay=2)
+    queue.schedule(np.array([0, 2, 2]), np.array([1, 2, 2]), np.array([4, 1, 1]))
+    counts = np.zeros(3, dtype=np.int64)
+
+    queue.deliver(counts)
+    assert counts.tolist() == [0, 4, 0]
+    queue.deliver(counts)
+    queue.deliver(counts)
+    assert counts.tolist() == [0, 4, 2]
+    assert queue.is_empty()
+
+def test_delay_queue_grows_without_losing_spikes():
+    import numpy as np
+
+    queue = DelayQueue(2, max_delay=1)
+    queue.schedule(np.array([1]), np.array([0]), np.array([5]))
+    queue.reserve(12)
+    queue.schedule(np.array([12]), np.array([1]), np.array([7]))
+    queue.resize(3)
+
+    assert queue.capacity >= 13
+    arrivals = [queue.pop() for _ in range(13)]
+    assert arrivals[1][0].tolist() == [0] and arrivals[1][1].tolist() == [5]
+    assert arrivals[12][0].tolist() == [1] and arrivals[12][1].tolist() == [7]
+    assert queue.is_empty()
+
+def test_delay_queue_hash_is_kept_incrementally():
+    import numpy as np
+
+    weights = np.array([3, 5, 7], dtype=np.uint64)
+    queue = DelayQueue(3, max_delay=2)
+    queue.track_hash(weights)
+    counts = np.zeros(3, dtype=np.int64)
+    for step in range(6):
+        queue.schedule(np.array([step % 3, 1]), np.array([step % 3, 2]), np.array([1, 2]))
+        queue.deliver(counts)
+        queue.reserve(step)
+        incremental = queue.hash
+        queue.track_hash(weights)
+        assert queue.hash == incremental
+
+    queue.jump(5)
+    assert queue.hash == incremental
+    queue.track_hash(weights)
+    assert queue.hash == incremental
+
+# -----------------------
+# Tests for SpikeHistory
+# -----------------------
+
+def build_counter_system(engine="python"):
+    system = SNSystem(engine=engine)
+    system.add_neuron(Neuron("src", spike_count=6, rules=[{
+        "consume": 1,
+        "produce": 1,
+        "delay": 0,
+        "condition_threshold": 1
+    }]))
+    system.add_neuron(Neuron("out"))
+    system.add_synapse(Synapse("src", "out"))
+    return system
+
+def test_spike_history_records_subset_every_k_ticks():
+    system = build_counter_system()
+    system.record(neurons=["out"], every=2, chunk_size=2)
+    system.run(7)
+
+    assert list(system.spike_history) == ["out"]
+    assert system.spike_history["out"].tolist() == [2, 4, 6]
+    assert system.spike_history.ticks.tolist() == [1, 3, 5]
+
+def test_spike_history_window_aggregates():
+    for aggregate, expected in (("min", [4, 2, 0]), ("max", [5, 3, 1])):
+        system = build_counter_system(engine="numpy")
+        history = system.record(neurons=["src"], every=2, aggregate=aggregate)
+        system.run(6)
+        assert history["src"].tolist() == expected
+
+def test_spike_history_adds_columns_for_new_neurons():
+    system = build_counter_system()
+    system.run(2)
+    system.add_neuron(Neuron("late", spike_count=9))
+    system.run(2)
+
+    assert len(system.spike_history["out"]) == 4
+    assert system.spike_history["late"].tolist() == [9, 9]
+
+def test_spike_history_sizes_chunks_by_recorded_values(monkeypatch):
+    import src.history as history_module
+
+    monkeypatch.setattr(history_module, "CHUNK_VALUES", 6)
+    expected = build_ring_system("numpy", size=4)
+    expected.run(20)
+
+    system = build_ring_system("numpy", size=4)
+    history = system.record()
+    system.run(1)
+    assert history.current.shape == (1, 4)
+    system.run(19)
+    assert all(len(chunk) == 1 for chunk in history.chunks)
+    assert history == expected.spike_history
+    assert history.num_rows == 20
+
 # -----------------------
 # Tests for SNSystem
 # -----------------------
@@ -78,6 +212,20 @@ def test_sn_system_add_neuron_and_synapse():
     assert system.neurons["n2"] == n2
     assert system.synapses[0] == syn
 
+def test_sn_system_adjacency_index():
+    system = SNSystem()
+    for n_id in ("n1", "n2", "n3"):
+        system.add_neuron(Neuron(n_id))
+    system.add_synapse(Synapse("n2", "n3"))
+    system.add_synapse(Synapse("n1", "n3"))
+    system.add_synapse(Synapse("n1", "n2"))
+
+    indptr, indices = system.adjacency.csr(3)
+    assert indptr.tolist() == [0, 2, 3, 3]
+    assert indices.tolist() == [2, 1, 2]
+    assert system.targets_of("n1") == ["n3", "n2"]
+    assert system.targets_of("n3") == []
+
 def test_sn_system_tick_cpu_spike_transmission():
     system = SNSystem()
     n1 = Neuron("n1", spike_count=2, rules=[{
@@ -114,6 +262,87 @@ def test_sn_system_run_ticks_accumulates_spike_history():
     assert "n1" in system.spike_history
     assert len(system.spike_history["n1"]) == 2  # two ticks recorded
 
+def test_sn_system_long_delays_are_not_dropped():
+    for engine in ("python", "numpy"):
+        system = SNSystem(engine=engine)
+        system.add_neuron(Neuron("n1", spike_count=1, rules=[{
+            "consume": 1,
+            "produce": 3,
+            "delay": 25,
+            "condition_threshold": 1
+        }]))
+        system.add_neuron(Neuron("n2"))
+        system.add_synapse(Synapse("n1", "n2"))
+
+        system.run(25)
+        assert system.neurons["n2"].spike_count == 0
+        system.run(1)
+        assert system.neurons["n2"].spike_count == 3
+
+def test_sn_system_fast_forward_matches_tick_by_tick_run():
+    for engine in ("python", "numpy"):
+        for every, aggregate in ((1, "last"), (3, "last"), (4, "min"), (4, "max")):
+            histories = []
+            for fast_forward in (True, False):
+                system = build_counter_system(engine)
+                system.add_neuron(Neuron("slow", spike_count=2, rules=[{
+                    "consume": 2,
+                    "produce": 1,
+                    "delay": 40,
+                    "condition_threshold": 2
+                }]))
+                system.add_synapse(Synapse("slow", "out"))
+                history = system.record(every=every, aggregate=aggregate)
+                assert system.run(100, fast_forward=fast_forward) == 100
+                histories.append(history.to_dict())
+            assert histories[0] == histories[1]
+
+def build_ring_system(engine, size=4):
+    system = SNSystem(engine=engine)
+    for i in range(size):
+        system.add_neuron(Neuron(f"r{i}", spike_count=int(i == 0), rules=[{
+            "consume": 1,
+            "produce": 1,
+            "delay": i % 2,
+            "condition_threshold": 1
+        }]))
+    for i in range(size):
+        system.add_synapse(Synapse(f"r{i}", f"r{(i + 1) % size}"))
+    return system
+
+def test_sn_system_detects_cycles_and_extrapolates():
+    for engine in ("python", "numpy"):
+        for every, aggregate in ((1, "last"), (4, "max")):
+            expected = build_ring_system(engine)
+            expected.record(every=every, aggregate=aggregate)
+            expected.run(1003)
+
+            system = build_ring_system(engine)
+            system.record(every=every, aggregate=aggregate)
+            assert system.run(1003, detect_cycles=True) == 1003
+
+            assert system.cycle == (0, 6)
+            assert system.spike_history == expected.spike_history
+            assert system.backend.counts_array().tolist() == expected.backend.counts_array().tolist()
+
+def test_sn_system_stops_on_cycle():
+    system = build_ring_system("numpy")
+    assert system.run(1000, detect_cycles=True, on_cycle="stop") == 6
+    assert system.cycle.transient == 0
+    assert system.cycle.period == 6
+
+    with pytest.raises(ValueError):
+        system.run(10, detect_cycles=True, on_cycle="ignore")
+
+def test_sn_system_run_stops_on_halt():
+    system = build_counter_system(engine="numpy")
+    ticks = system.run(1000, stop_on_halt=True)
+
+    assert system.halted
+    assert ticks == 7
+    assert system.neurons["out"].spike_count == 6
+    assert len(system.spike_history["out"]) == 7
+
 def test_sn_system_load_from_invalid_file(tmp_path):
     file_path = tmp_path / "invalid_system.txt"
     file_path.write_text("invalid content\n")
@@ -121,4 +350,939 @@ def test_sn_system_load_from_invalid_file(tmp_path):
     system = SNSystem()
     success = system.load_from_file(str(file_path))
     assert not success
-    assert system.neurons == {}
\ No newline at end of file
+    assert system.neurons == {}
+
+# -----------------------
+# Tests for the NumPy engine
+# -----------------------
+
+def build_mixed_system(engine=None):
+    system = SNSystem(engine=engine)
+    system.add_neuron(Neuron("a", spike_count=7, rules=[
+        {"consume": 3, "produce": 2, "delay": 2, "condition_threshold": 5},
+        {"consume": 1, "produce": 1, "delay": 0, "condition": lambda x: x % 2 == 0},
+        {"consume": 1, "produce": 3, "delay": 1, "condition_threshold": 1},
+    ]))
+    system.add_neuron(Neuron("b", spike_count=1, rules=[
+        {"consume": 2, "produce": 1, "delay": 0, "condition_threshold": 2},
+    ]))
+    system.add_neuron(Neuron("c"))
+    system.add_synapse(Synapse("a", "b"))
+    system.add_synapse(Synapse("a", "c"))
+    system.add_synapse(Synapse("b", "a"))
+    system.add_synapse(Synapse("b", "c"))
+    return system
+
+def test_numpy_engine_matches_cpu_path():
+    cpu = build_mixed_system()
+    vec = build_mixed_system(engine="numpy")
+
+    cpu.run(15)
+    vec.run(15)
+
+    assert vec.spike_history == cpu.spike_history
+    for n_id, neuron in cpu.neurons.items():
+        assert vec.neurons[n_id].spike_count == neuron.spike_count
+
+def test_numpy_engine_load_from_file():
+    system = SNSystem(engine="numpy")
+    assert system.load_from_file("./tests/example_model.snps")
+
+    system.run(6)
+
+    assert system.neurons["N3"].spike_count == 1
+
+
+# -----------------------
+# Tests for batched runs
+# -----------------------
+
+def test_batch_matches_individual_runs():
+    import numpy as np
+
+    initial = np.array([[6, 0], [2, 5], [0, 1], [9, 0]])
+    result = build_counter_system().run_batch(initial, 8)
+
+    for row, counts in zip(result.counts.tolist(), initial.tolist()):
+        system = build_counter_system(engine="numpy")
+        system.neurons["src"].spike_count, system.neurons["out"].spike_count = counts
+        system.run(8)
+        assert row == [system.neurons["src"].spike_count, system.neurons["out"].spike_count]
+    assert result.ticks.tolist() == [7, 3, 1, 8]
+    assert result.halted.tolist() == [True, True, True, False]
+
+def test_batch_with_callable_conditions_and_overrides():
+    system = SNSystem()
+    system.add_neuron(Neuron("A", rules=[
+        {"consume": 1, "produce": 3, "delay": 1, "condition": lambda x: x >= 1}
+    ]))
+    system.add_neuron(Neuron("Output"))
+    system.add_synapse(Synapse("A", "Output"))
+
+    result = system.run_batch([{"A": a} for a in range(6)], 10)
+    assert result["Output"].tolist() == [0, 3, 6, 9, 12, 15]
+    assert result["A"].tolist() == [0] * 6
+
+def test_batch_engine_cannot_sync_neurons():
+    from src.batch import BatchEngine
+    from src.compiled import compile_system
+
+    system = build_counter_system()
+    engine = BatchEngine(compile_system(system), [[6, 0], [2, 5]])
+    with pytest.raises(TypeError, match="no single configuration"):
+        engine.sync(system.neurons)
+
+# -----------------------
+# Tests for the explorer
+# -----------------------
+
+def build_generator_system():
+    # A either keeps the loop with B going (one more spike to Output) or stops
+    system = SNSystem()
+    system.add_neuron(Neuron("A", spike_count=1, rules=[
+        {"consume": 1, "produce": 1, "delay": 0, "condition_threshold": 1},
+        {"consume": 1, "produce": 0, "delay": 0, "condition_threshold": 1}
+    ]))
+    system.add_neuron(Neuron("B", rules=[
+        {"consume": 1, "produce": 1, "delay": 1, "condition_threshold": 1}
+    ]))
+    system.add_neuron(Neuron("Output"))
+    for source, target in (("A", "B"), ("B", "A"), ("A", "Output")):
+        system.add_synapse(Synapse(source, target))
+    return system
+
+def test_explore_deterministic_system_has_one_computation():
+    result = build_counter_system().explore(outputs="out")
+    assert result.outputs == {6: 1}
+    assert result.halting.tolist() == [[0, 6]]
+    assert result.depths.tolist() == [6]
+    assert not result.truncated
+
+def test_explore_generator_reaches_every_output():
+    result = build_generator_system().explore(outputs="Output", max_depth=30)
+    assert sorted(result.outputs) == list(range(10))
+    assert result.truncated
+    assert result.visited == build_generator_system().explore(max_depth=30, workers=2).visited
+
+# -----------------------
+# Tests for partitioned execution
+# -----------------------
+
+def test_partition_graph_balances_blocks_and_cuts_few_synapses():
+    import numpy as np
+    from src.adjacency import build_csr
+    from src.partition import partition_graph, cut_size
+
+    # Two shuffled clusters of 20 densely connected neurons, joined by one synapse
+    order = np.random.default_rng(0).permutation(40)
+    pairs = [(i, j) for i in range(40) for j in range(40) if i != j and i // 20 == j // 20 and (i + j) % 3]
+    sources = [order[i] for i, _ in pairs] + [order[0]]
+    targets = [order[j] for _, j in pairs] + [order[20]]
+    indptr, indices = build_csr(sources, targets, 40)
+
+    labels = partition_graph(indptr, indices, 40, 2)
+    assert np.bincount(labels).tolist() == [20, 20]
+    assert cut_size(indptr, indices, labels) == 1
+
+def test_partitioned_engine_matches_numpy_engine():
+    expected = build_mixed_system(engine="numpy")
+    expected.run(15)
+
+    system = build_mixed_system(engine="partitioned")
+    system.engine_options = {"parts": 2}
+    system.run(15)
+
+    assert system.backend.parts == 2
+    assert system.spike_history == expected.spike_history
+    for n_id, neuron in expected.neurons.items():
+        assert system.neurons[n_id].spike_count == neuron.spike_count
+
+    system.add_neuron(Neuron("d", spike_count=1))
+    assert system.backend is None
+    system.run(5)
+    expected.add_neuron(Neuron("d", spike_count=1))
+    expected.run(5)
+    assert system.spike_history == expected.spike_history
+    system.release_engine()
+
+# A chain that idles while a delayed spike is in flight, then halts
+def build_delay_chain(engine=None):
+    system = SNSystem(engine=engine)
+    system.add_neuron(Neuron("a", spike_count=2, rules=[
+        {"consume": 1, "produce": 1, "delay": 9, "condition_threshold": 1},
+    ]))
+    system.add_neuron(Neuron("b", rules=[
+        {"consume": 1, "produce": 2, "delay": 0, "condition_threshold": 1},
+    ]))
+    system.add_neuron(Neuron("c"))
+    system.add_synapse(Synapse("a", "b"))
+    system.add_synapse(Synapse("b", "c"))
+    return system
+
+def test_partitioned_engine_runs_blocks_of_ticks(monkeypatch):
+    import src.engines.partitioned as partitioned
+
+    monkeypatch.setattr(partitioned, "BLOCK_TICKS", 4)
+    for build in (build_mixed_system, build_delay_chain):
+        for options in ({}, {"stop_on_halt": True}, {"fast_forward": False}):
+            expected = build(engine="numpy")
+            expected.run(60, **options)
+
+            system = build(engine="partitioned")
+            system.engine_options = {"parts": 2}
+            system.run(60, **options)
+
+            assert system.spike_history == expected.spike_history
+            assert system.halted == expected.halted
+            for n_id, neuron in expected.neurons.items():
+                assert system.neurons[n_id].spike_count == neuron.spike_count
+            system.release_engine()
+
+    system = build_delay_chain(engine="numpy")
+    system.run(60, stop_on_halt=True)
+    assert system.halted and len(system.spike_history["c"]) < 60
+
+def test_partitioned_engine_ticks_one_at_a_time(monkeypatch):
+    import src.engines.partitioned as partitioned
+
+    # Rows for fewer values than there are neurons still hold one tick of each
+    monkeypatch.setattr(partitioned, "ROW_VALUES", 4)
+    expected = build_ring_system("numpy")
+    expected.run(40)
+
+    system = build_ring_system("partitioned")
+    system.engine_options = {"parts": 2}
+    system.run(20)
+    profiler = system.profile()
+    system.run(20)
+    assert profiler.counters["firings"] > 0
+    system.profile(enabled=False)
+    assert system.spike_history == expected.spike_history
+    system.release_engine()
+
+    system = build_ring_system("partitioned")
+    system.engine_options = {"parts": 2}
+    assert system.run(1000, detect_cycles=True, on_cycle="stop") == 6
+    assert system.cycle.period == 6
+    system.release_engine()
+
+# -----------------------
+# Tests for the ensemble runner
+# -----------------------
+
+def test_ensemble_runs_models_on_a_process_pool(tmp_path):
+    from src.ensemble import Job, run_ensemble, write_summary
+    from src.parser import parse_snps
+
+    (tmp_path / "bad.snps").write_text("invalid content\n")
+    jobs = [
+        Job("./tests/example_model.snps", 10),
+        Job(parse_snps("./tests/example_model.snps"), 3, name="compiled"),
+        Job(str(tmp_path / "bad.snps"), 10),
+    ]
+    results = {r.name: r for r in run_ensemble(jobs, workers=2, cache_dir=str(tmp_path / "cache"))}
+
+    assert results["./tests/example_model.snps"].status == "halted"
+    assert results["./tests/example_model.snps"].counts.tolist() == [0, 0, 1]
+    assert results["compiled"].status == "ok"
+    assert results["compiled"].ticks == 3
+    assert results[str(tmp_path / "bad.snps")].status == "error"
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+    write_summary(results.values(), str(tmp_path / "summary.csv"))
+    assert (tmp_path / "summary.csv").read_text().splitlines()[0].startswith("name,status,ticks")
+
+def test_ensemble_job_timeout():
+    from src.compiled import compile_system
+    from src.ensemble import Job, run_job
+
+    result = run_job(Job(compile_system(build_ring_system("python")), 10 ** 9, timeout=0.2))
+
+    assert result.status == "timeout"
+    assert 0 < result.ticks < 10 ** 9
+
+# -----------------------
+# Tests for checkpoints
+# -----------------------
+
+def test_checkpoint_resumes_in_another_engine(tmp_path):
+    path = str(tmp_path / "ring.npz")
+    expected = build_ring_system("numpy")
+    expected.run(20)
+
+    system = build_ring_system("numpy")
+    system.run(9, checkpoint=path, checkpoint_every=4)
+    resumed = build_ring_system("python")
+    assert resumed.load_checkpoint(path) == 9
+    resumed.run(11)
+
+    assert resumed.spike_history == expected.spike_history
+    assert {n_id: n.spike_count for n_id, n in resumed.neurons.items()} == \
+        {n_id: n.spike_count for n_id, n in expected.neurons.items()}
+
+def test_checkpoint_of_compiled_model(tmp_path):
+    path = str(tmp_path / "model.npz")
+    system = SNSystem(engine="numpy")
+    system.load_from_file("./tests/example_model.snps")
+    system.run(2)
+    system.save_checkpoint(path)
+
+    restored = SNSystem(engine="python")
+    restored.load_from_file("./tests/example_model.snps")
+    restored.load_checkpoint(path)
+    assert restored.neurons["N2"].spike_count == system.neurons["N2"].spike_count
+    restored.run(3)
+    system.run(3)
+    assert restored.spike_history == system.spike_history
+
+    other = build_counter_system()
+    with pytest.raises(ValueError):
+        other.load_checkpoint(path)
+
+# -----------------------
+# Tests for the profiler
+# -----------------------
+
+def test_profiler_counts_firings_and_spikes():
+    import io
+    import json
+
+    for engine in ("python", "numpy"):
+        system = build_counter_system(engine)
+        stream = io.StringIO()
+        profiler = system.profile(stream=stream)
+        system.run(10)
+        summary = profiler.summary()
+
+        assert summary["ticks"] == 7 and summary["skipped"] == 3
+        assert summary["counters"] == {"firings": 6, "active_neurons": 6,
+                                       "spikes_emitted": 6, "spikes_delivered": 6}
+        assert summary["seconds"]["rules"] > 0
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line["tick"] for line in lines] == list(range(7))
+        assert lines[-1]["skipped"] == 3 and lines[-1]["firings"] == 0
+
+def test_profiler_can_be_disabled():
+    system = build_counter_system("numpy")
+    profiler = system.profile()
+    system.run(2)
+    system.profile(enabled=False)
+    system.run(2)
+
+    assert system.backend.profiler is None
+    assert profiler.summary()["ticks"] == 2
+
+# -----------------------
+# Tests for the benchmark harness
+# -----------------------
+
+def test_benchmarks_cover_every_topology_and_flag_regressions():
+    import copy
+    from src.benchmark import TOPOLOGIES, compare, run_benchmarks
+
+    report = run_benchmarks(sizes=[20], engines=["numpy"], ticks=3, repeats=2, warmup=0)
+    assert [entry["topology"] for entry in report["results"]] == list(TOPOLOGIES)
+    for entry in report["results"]:
+        assert entry["neurons"] == 20 and len(entry["seconds"]) == 2
+        assert entry["ticks_per_second"] > 0 and entry["peak_bytes"] > 0
+
+    faster = copy.deepcopy(report)
+    faster["results"][0]["median"] /= 2
+    regressions = compare(report, faster)
+    assert len(regressions) == 1 and regressions[0][2] > 1.5
+    assert compare(report, report) == []
+
+def test_benchmarks_skip_engines_that_cannot_start(monkeypatch):
+    import src.engines as engines
+    from src.benchmark import usable_engines
+
+    get_engine = engines.get_engine
+
+    # CuPy without a usable device raises a RuntimeError subclass
+    def get_engine_without_device(name):
+        if name == "cuda":
+            raise RuntimeError("cudaErrorNoDevice: no CUDA-capable device is detected")
+        return get_engine(name)
+
+    monkeypatch.setattr(engines, "get_engine", get_engine_without_device)
+    usable = usable_engines()
+    assert "cuda" not in usable and "numpy" in usable
+
+# -----------------------
+# Tests for the engine registry
+# -----------------------
+
+def test_engine_registry_resolves_known_engines():
+    from src.engines import available_engines, get_engine
+    from src.engines.numpy_engine import NumpyEngine
+
+    assert {"python", "numpy", "cuda"} <= set(available_engines())
+    assert get_engine("numpy") is NumpyEngine
+    with pytest.raises(ValueError):
+        get_engine("no-such-engine")
+
+def test_importing_system_does_not_load_optional_backends():
+    import subprocess
+    import sys
+
+    code = ("import sys; from src.system import SNSystem; "
+            "print(any(m in sys.modules for m in ('cupy', 'matplotlib')))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+def test_numpy_engine_selects_first_applicable_rule_from_file(tmp_path):
+    file_path = tmp_path / "multi_rule.snps"
+    file_path.write_text(
+        "*N\n"
+        "N1 9 0 2 4 1 0 6 1 2 1 1\n"
+        "N2 0 0 2 3 1 0 3 1 5 0 1\n"
+        "N3 0 0 0\n"
+        "*S\n"
+        "N1 N2\n"
+        "N2 N3\n"
+    )
+    systems = [SNSystem(engine=engine) for engine in ("python", "numpy")]
+    for system in systems:
+        assert system.load_from_file(str(file_path))
+        system.run(10)
+
+    assert systems[1].spike_history == systems[0].spike_history
+
+
+# -----------------------
+# Tests for the .snps parser and compiled models
+# -----------------------
+
+def test_parse_snps_builds_compiled_arrays():
+    from src.parser import parse_snps
+
+    model = parse_snps("./tests/example_model_gpu.snps")
+    assert model.ids == ["N1", "N2", "N3"]
+    assert model.spikes.tolist() == [1, 0, 0]
+    assert model.rule_ptr.tolist() == [0, 1, 2, 3]
+    assert model.thresholds.tolist() == [1, 1, 9999]
+    assert model.indptr.tolist() == [0, 1, 2, 2]
+    assert model.indices.tolist() == [1, 2]
+
+def test_parse_snps_rejects_truncated_rules(tmp_path):
+    file_path = tmp_path / "truncated.snps"
+    file_path.write_text("*N\nN1 1 0 2 1 1 1 1\nN2 0 0 0\n*S\nN1 N2\n")
+
+    system = SNSystem()
+    assert not system.load_from_file(str(file_path))
+    assert system.neurons == {}
+
+def test_compiled_model_round_trip(tmp_path):
+    system = SNSystem(engine="numpy")
+    system.load_from_file("./tests/example_model.snps")
+    system.save_compiled(str(tmp_path / "model"))
+
+    loaded = SNSystem(engine="numpy")
+    loaded.load_compiled(str(tmp_path / "model"))
+    assert not loaded.model.indices.flags.writeable     # read-only memory map
+    assert loaded.model.ids == system.model.ids
+
+    loaded.run(6)
+    assert loaded.neurons["N3"].spike_count == 1
+
+def test_compiled_system_materializes_for_the_reference_engine():
+    system = SNSystem(engine="numpy")
+    system.load_from_file("./tests/example_model.snps")
+    system.run(3)
+
+    system.add_neuron(Neuron("N4"))
+    system.add_synapse(Synapse("N3", "N4"))
+    system.run(3)
+    assert system.model.num_synapses == 3
+
+    system.materialize()
+    assert system.model is None
+    assert system.neurons["N3"].spike_count == 1
+    assert len(system.synapses) == 3
+
+def test_writes_through_neurons_of_a_loaded_model_take_effect():
+    system = SNSystem(engine="numpy")
+    system.load_from_file("./tests/example_model.snps")
+    system.run(2)
+    neuron = system.neurons["N1"]
+    with pytest.raises(AttributeError):
+        neuron.rules.append({"consume": 1, "produce": 1, "delay": 0, "condition_threshold": 1})
+
+    neuron.spike_count = 5
+    system.neurons["N2"].rules = []
+    assert system.model is None
+    assert system.neurons["N1"].spike_count == 5 and system.neurons["N2"].rules == []
+
+    expected = SNSystem(engine="numpy")
+    expected.load_from_file("./tests/example_model.snps")
+    expected.run(2)
+    expected.materialize()
+    expected.neurons["N1"].spike_count = 5
+    expected.neurons["N2"].rules = []
+    for sn in (expected, system):
+        sn.run(4)
+    assert system.spike_history == expected.spike_history
+
+# -----------------------
+# Tests for regular-expression conditions
+# -----------------------
+
+def test_regex_conditions_compile_to_predicates():
+    from src.regex import RegexError, compile_regex
+
+    assert compile_regex("a(aa)*") == ((1, 2, False),)
+    assert compile_regex("aa+") == ((2, 1, False),)
+    assert compile_regex("a{2,3}") == ((2, 0, True), (3, 0, True))
+    assert compile_regex("a^2|a(a^3)*") == ((1, 3, False), (2, 0, True))
+    with pytest.raises(RegexError):
+        compile_regex("a(b)*")
+
+def test_regex_rules_in_snps_files_run_on_array_engines(tmp_path):
+    from src.compiled import REGEX
+    from src.parser import parse_snps
+
+    file_path = tmp_path / "parity.snps"
+    file_path.write_text("*N\nN1 7 0 2 1 1 0 a(aa)* 2 1 0 aa(aa)*\nN2 0 0 0\n*S\nN1 N2\n")
+    model = parse_snps(str(file_path))
+    assert model.kinds.tolist() == [REGEX, REGEX]
+    assert model.callables == {}
+
+    histories = []
+    for engine in ("python", "numpy"):
+        system = SNSystem(engine=engine)
+        system.load_from_file(str(file_path))
+        system.run(6)
+        histories.append(system.spike_history.to_dict())
+    # Odd counts lose one spike, even counts two at a time: 7 -> 6 -> 4 -> 2 -> 0
+    assert histories[0] == histories[1]
+    assert histories[1]["N1"] == [6, 4, 2, 0, 0, 0]
+    assert histories[1]["N2"] == [1, 2, 3, 4, 4, 4]
+
+    system.save_compiled(str(tmp_path / "model"))
+    loaded = SNSystem(engine="numpy")
+    loaded.load_compiled(str(tmp_path / "model"))
+    assert loaded.neurons["N1"].rules[0]["condition"] == "a(aa)*"
+
+def test_regex_rules_from_the_rule_api():
+    system = build_counter_system("numpy")
+    system.neurons["src"].rules = [{"consume": 2, "produce": 1, "delay": 0, "condition": "a{3,}"}]
+    system.run(5)
+    assert system.neurons["src"].spike_count == 2
+    assert system.neurons["out"].spike_count == 2
+
+# -----------------------
+# Tests for the jit engine
+# -----------------------
+
+@pytest.mark.parametrize("options", [{}, {"interpret": True}])
+def test_jit_engine_matches_numpy_engine(options):
+    expected = build_mixed_system(engine="numpy")
+    expected.record(every=3, aggregate="max")
+    expected.run(40)
+
+    system = build_mixed_system(engine="jit")
+    system.engine_options = options
+    system.record(every=3, aggregate="max")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        system.run(40)
+
+    assert system.spike_history == expected.spike_history
+    assert system.halted == expected.halted
+    for n_id, neuron in expected.neurons.items():
+        assert system.neurons[n_id].spike_count == neuron.spike_count
+
+def test_jit_engine_runs_ticks_in_blocks():
+    system = build_counter_system("jit")
+    system.engine_options = {"interpret": True}
+    system.record(neurons=["out"])
+    assert system.run(1000, stop_on_halt=True) == 7
+    assert system.halted
+    assert system.spike_history["out"].tolist() == [1, 2, 3, 4, 5, 6, 6]
+    assert type(system.backend).__name__ == "JitEngine"
+    assert system.delay_queue.tick == 7
+
+# -----------------------
+# Tests for the CUDA engine
+# -----------------------
+
+def test_cuda_engine_fires_first_applicable_rule_once_like_numpy():
+    cp = pytest.importorskip("cupy")
+    if cp.cuda.runtime.getDeviceCount() == 0:
+        pytest.skip("no CUDA device")
+
+    systems = []
+    for engine in ("numpy", "cuda"):
+        system = SNSystem(engine=engine)
+        system.add_neuron(Neuron("a", spike_count=9, rules=[
+            {"consume": 3, "produce": 2, "delay": 1, "condition_threshold": 6},
+            {"consume": 1, "produce": 1, "delay": 0, "condition": "a(aa)*"},
+            {"consume": 2, "produce": 1, "delay": 0, "condition_threshold": 2},
+        ]))
+        system.add_neuron(Neuron("b", spike_count=4, rules=[
+            {"consume": 1, "produce": 1, "delay": 0, "condition_threshold": 1},
+        ]))
+        system.add_synapse(Synapse("a", "b"))
+        system.add_synapse(Synapse("b", "a"))
+        system.run(15)
+        systems.append(system)
+
+    expected, system = systems
+    assert system.spike_history == expected.spike_history
+
+# -----------------------
+# Tests for streaming runs
+# -----------------------
+
+def test_iter_run_yields_tick_views_without_history():
+    system = build_mixed_system(engine="numpy")
+    views = list(system.iter_run(6, neurons=["c"]))
+    assert [view.tick for view in views] == [0, 1, 2, 3, 4, 5]
+    assert views[0].firings == 1 and views[0].emitted == 4
+    assert views[0].changed == ["a"]
+    assert [view.values.tolist() for view in views] == [[0], [1], [4], [8], [12], [16]]
+    assert system.history is None and system.profiler is None
+    assert system.neurons["c"].spike_count == 16
+
+def test_iter_run_fast_forwards_and_stops_early():
+    system = build_counter_system("python")
+    system.neurons["src"].rules = [{"consume": 1, "produce": 1, "delay": 3, "condition_threshold": 1}]
+    system.neurons["src"].spike_count = 1
+    views = list(system.iter_run(20))
+    assert [(view.tick, view.skipped) for view in views] == [(0, 0), (1, 1), (3, 0), (4, 15)]
+    assert views[2]["out"] == 1 and views[2].changed == ["out"]
+    assert views[0].emitted == 1 and views[1].changed == []
+
+    system = build_counter_system("numpy")
+    for view in system.iter_run(100):
+        if view["out"] == 3:
+            break
+    assert view.tick == 2
+    assert system.neurons["out"].spike_count == 3
+
+def test_iter_run_reports_changes_on_every_engine():
+    expected = build_mixed_system(engine="numpy")
+    expected.run(12, fast_forward=False)
+    rows = [[7, 1, 0]] + [[expected.spike_history[n_id][t] for n_id in "abc"] for t in range(12)]
+    changes = [[n_id for n_id, old, new in zip("abc", rows[t], rows[t + 1]) if old != new] for t in range(12)]
+
+    for engine in ("python", "numpy", "jit", "partitioned"):
+        system = build_mixed_system(engine=engine)
+        system.engine_options = {"parts": 2} if engine == "partitioned" else {}
+        profiler = system.profile() if engine == "numpy" else None
+        views = list(system.iter_run(12, neurons=["a"], fast_forward=False))
+        assert [view.changed for view in views] == changes
+        assert [view.values.tolist() for view in views] == [[row[0]] for row in rows[1:]]
+        assert system.profiler is profiler
+        if profiler is not None:
+            assert profiler.touched is None and profiler.ticks == 12
+        system.release_engine()
+
+def test_run_on_tick_callback_can_stop_the_run():
+    system = build_counter_system("jit")
+    ticks = system.run(100, on_tick=lambda view: view["out"] >= 4)
+    assert ticks == 4
+    assert system.spike_history["out"].tolist() == [1, 2, 3, 4]
+
+# -----------------------
+# Tests for the job server
+# -----------------------
+
+def test_job_server_streams_results_and_cancels(tmp_path):
+    import os
+    import subprocess
+    import sys
+    import time
+    from src.server import Client
+
+    expected = SNSystem(engine="numpy")
+    expected.load_from_file("./tests/example_model.snps")
+    expected.run(50, stop_on_halt=True)
+    ring = tmp_path / "ring.snps"
+    ring.write_text("*N\nA 1 0 1 1 1 0 1\nB 0 0 1 1 1 0 1\n*S\nA B\nB A\n")
+
+    path = str(tmp_path / "server.sock")
+    server = subprocess.Popen([sys.executable, "-m", "src.server", "--socket", path, "--workers", "1"])
+    try:
+        deadline = time.time() + 30
+        while not os.path.exists(path) and time.time() < deadline:
+            time.sleep(0.05)
+        client = Client(path, timeout=30)
+
+        events = list(client.run("first", "./tests/example_model.snps", 50, neurons=["N3"]))
+        assert [e["event"] for e in events[:2]] == ["queued", "started"]
+        streamed = [count for e in events if e["event"] == "progress" for count in e["history"]["N3"]]
+        assert streamed == expected.spike_history["N3"].tolist()
+        assert events[-1]["status"] == "halted" and events[-1]["counts"] == {"N3": 1}
+        assert not events[-1]["cached"]
+        assert list(client.run("again", "./tests/example_model.snps", 50))[-1]["cached"]
+
+        client.send(op="run", id="long", model=str(ring), ticks=10 ** 9, neurons=["A"])
+        client.send(op="run", id="waiting", model=str(ring), ticks=10, neurons=["A"])
+        assert [client.receive()["event"] for _ in range(3)] == ["queued", "started", "queued"]
+        client.cancel("waiting")
+        client.cancel("long")
+        results = {}
+        while len(results) < 2:
+            event = client.receive()
+            if event["event"] == "result":
+                results[event["id"]] = event["status"]
+        assert results == {"waiting": "cancelled", "long": "cancelled"}
+        client.close()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    assert not os.path.exists(path)
+
+def test_job_server_drops_oldest_progress_for_slow_clients():
+    import asyncio
+    import json
+    from src.server import Connection
+
+    # A client that reads nothing until the gate opens
+    class Writer:
+        def __init__(self):
+            self.messages = []
+            self.gate = asyncio.Event()
+
+        def write(self, data):
+            self.messages.append(json.loads(data))
+
+        async def drain(self):
+            await self.gate.wait()
+
+    async def scenario():
+        writer = Writer()
+        connection = Connection(writer, max_progress=3)
+        for tick in range(6):
+            connection.send({"id": "a", "event": "progress", "tick": tick})
+        connection.send({"id": "a", "event": "result", "status": "ok"})
+        for tick in range(2):
+            connection.send({"id": "b", "event": "progress", "tick": tick})
+        writer.gate.set()
+        connection.send(None)
+        await connection.sender
+        return writer.messages, connection.dropped
+
+    messages, dropped = asyncio.run(scenario())
+    assert [(m["id"], m["event"], m.get("tick")) for m in messages] == [
+        ("a", "progress", 5), ("a", "result", None), ("b", "progress", 0), ("b", "progress", 1)]
+    assert dropped == 5
+
+# -----------------------
+# Tests for the result cache
+# -----------------------
+
+def run_ring(ticks, cache_dir=None):
+    system = build_ring_system("numpy")
+    cache = system.cache_results(cache_dir) if cache_dir else None
+    ran = system.run(ticks)
+    counts = {n_id: neuron.spike_count for n_id, neuron in system.neurons.items()}
+    return ran, system.spike_history.to_dict(), counts, cache, system
+
+def test_result_cache_answers_repeated_shorter_and_longer_runs(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    assert run_ring(40, cache_dir)[3].stats() == {"hits": 0, "resumed": 0, "misses": 1}
+
+    for ticks, stats in ((40, {"hits": 1, "resumed": 0, "misses": 0}),
+                         (25, {"hits": 0, "resumed": 1, "misses": 0}),
+                         (70, {"hits": 0, "resumed": 1, "misses": 0})):
+        expected = run_ring(ticks)
+        cached = run_ring(ticks, cache_dir)
+        assert cached[:3] == expected[:3]
+        assert cached[3].stats() == stats
+
+    # The cached end state carries the in-flight spikes, so the run continues exactly
+    expected[4].run(5)
+    cached[4].run(5)
+    assert cached[4].spike_history == expected[4].spike_history
+
+def test_result_cache_evicts_least_recently_used_entries(tmp_path):
+    from src.result_cache import ResultCache
+
+    cache_dir = tmp_path / "cache"
+    for spikes in (1, 2, 3):
+        system = build_ring_system("numpy")
+        system.neurons["r0"].spike_count = spikes
+        system.cache_results(str(cache_dir))
+        system.run(30)
+    entries = sorted(cache_dir.iterdir(), key=lambda f: f.stat().st_mtime_ns)
+    assert len(entries) == 3
+
+    ResultCache(str(cache_dir), max_bytes=entries[-1].stat().st_size).evict()
+    assert list(cache_dir.iterdir()) == entries[-1:]
+
+def test_result_cache_skips_runs_that_detect_cycles(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    stopped = build_ring_system("numpy")
+    stopped.cache_results(cache_dir)
+    ran = stopped.run(100, detect_cycles=True, on_cycle="stop")
+    assert stopped.cycle is not None and ran < 100
+
+    expected = run_ring(100)
+    cached = run_ring(100, cache_dir)
+    assert cached[:3] == expected[:3]
+    assert cached[3].stats() == {"hits": 0, "resumed": 0, "misses": 1}
+
+# -----------------------
+# Tests for incremental model edits
+# -----------------------
+
+def edit_ring(system):
+    system.add_neuron(Neuron("x", spike_count=2, rules=[{
+        "consume": 1, "produce": 1, "delay": 2, "condition": "a(aa)*"}]))
+    system.add_synapse(Synapse("r1", "x"))
+    system.add_synapse(Synapse("x", "r3"))
+    system.remove_synapse("r2", "r3")
+    system.set_rules("r3", [{"consume": 2, "produce": 1, "delay": 0, "condition_threshold": 2}])
+    system.remove_neuron("r0")
+
+def test_compiled_system_edits_match_object_system():
+    from src.compiled import compile_system
+
+    expected = build_ring_system("numpy")
+    system = SNSystem(engine="numpy")
+    system.load_model(compile_system(build_ring_system("numpy")))
+    for sn in (expected, system):
+        sn.run(5)
+        edit_ring(sn)
+        sn.run(12)
+
+    assert system.editor is None and system.model.ids == ["r1", "r2", "r3", "x"]
+    assert system.spike_history == expected.spike_history
+    assert system.spike_history["r0"][-12:].tolist() == [0] * 12
+    assert {n_id: n.spike_count for n_id, n in system.neurons.items()} == \
+           {n_id: n.spike_count for n_id, n in expected.neurons.items()}
+
+def test_model_editor_keeps_edits_out_of_the_base_model():
+    from src.compiled import compile_system
+    from src.incremental import GrowableArray, ModelEditor
+
+    array = GrowableArray("int64", capacity=2)
+    for value in range(5):
+        array.append(value)
+    assert array.view().tolist() == [0, 1, 2, 3, 4] and len(array.data) == 8
+
+    base = compile_system(build_ring_system("numpy"))
+    editor = ModelEditor(base)
+    editor.add_neuron(Neuron("x", spike_count=2, rules=[{
+        "consume": 1, "produce": 1, "delay": 2, "condition": "a(aa)*"}]))
+    editor.add_synapse("r1", "x")
+    editor.add_synapse("x", "r3")
+    editor.remove_synapse("r2", "r3")
+    editor.set_rules("r3", [{"consume": 2, "produce": 1, "delay": 0, "condition_threshold": 2}])
+    editor.remove_neuron("r0")
+    assert base.num_neurons == 4 and base.num_synapses == 4
+    assert editor.removed == {0} and editor.tail_ids == ["x"]
+
+    model, kept = editor.compile()
+    assert kept.tolist() == [1, 2, 3, 4]
+    assert model.ids == ["r1", "r2", "r3", "x"]
+    assert model.spikes.tolist() == [0, 0, 0, 2]
+    assert [model.ids[i] for i in model.indices.tolist()] == ["r2", "x", "r3"]
+    assert model.rules_of(2)[0].threshold == 2
+    assert model.rules_of(3)[0].condition == "a(aa)*"
+
+    with pytest.raises(KeyError):
+        editor.remove_synapse("r1", "r3")
+
+# -----------------------
+# Tests for bulk model builders
+# -----------------------
+
+def test_build_matches_systems_built_from_objects():
+    import numpy as np
+
+    expected = SNSystem(engine="numpy")
+    rules = [[{"consume": 2, "produce": 1, "delay": 1, "condition_threshold": 3},
+              {"consume": 1, "produce": 2, "delay": 0, "condition_threshold": 1}], [],
+             [{"consume": 1, "produce": 1, "delay": 2, "condition_threshold": 1}]]
+    for i, (spikes, neuron_rules) in enumerate(zip((5, 0, 1), rules)):
+        expected.add_neuron(Neuron(f"n{i}", spike_count=spikes, rules=neuron_rules))
+    for source, target in ((0, 1), (0, 2), (2, 0)):
+        expected.add_synapse(Synapse(f"n{source}", f"n{target}"))
+
+    system = SNSystem(engine="numpy")
+    system.build(3, spikes=[5, 0, 1], rule_counts=[2, 0, 1], consumes=[2, 1, 1],
+                 produces=[1, 2, 1], delays=[1, 0, 2], thresholds=[3, 1, 1],
+                 sources=np.array([0, 0, 2]), targets=np.array([1, 2, 0]))
+    assert system.neuron_ids == ["n0", "n1", "n2"]
+    assert "n01" not in system.neurons and system.neuron_index["n2"] == 2
+
+    for sn in (expected, system):
+        sn.run(12)
+    assert system.spike_history == expected.spike_history
+
+    with pytest.raises(ValueError):
+        system.build(3, sources=[0], targets=[3])
+    with pytest.raises(ValueError):
+        system.build(3, consumes=[1, 2])
+
+def test_generated_circuits():
+    system = SNSystem(engine="numpy")
+    system.generate("multiply", 7, 5)
+    system.run(8)
+    assert system.neurons["Output"].spike_count == 35
+
+    system.generate("polynomial", [3, 2, 5], 4)
+    system.run(1000, stop_on_halt=True)
+    assert system.halted and system.neurons["Output"].spike_count == 3 + 2 * 4 + 5 * 4 ** 2
+
+    system.generate("layered", [2, 3, 1])
+    assert system.model.num_synapses == 2 * 3 + 3 * 1
+    system.generate("ring", 1000000, spikes=3)
+    assert system.model.num_synapses == 1000000 and system.neuron_ids[-1] == "n999999"
+
+    with pytest.raises(ValueError):
+        system.generate("torus", 10)
+
+# -----------------------
+# Tests for weighted synapses
+# -----------------------
+
+@pytest.mark.parametrize("engine", ["numpy", "jit", "python"])
+def test_weighted_synapse_matches_parallel_synapses(engine):
+    from src.compiled import compile_system
+
+    systems = []
+    for synapses in ([Synapse("a", "b"), Synapse("a", "b"), Synapse("a", "b")], [Synapse("a", "b", 3)]):
+        system = SNSystem(engine=engine)
+        system.add_neuron(Neuron("a", spike_count=2, rules=[
+            {"consume": 1, "produce": 2, "delay": 1, "condition_threshold": 1}]))
+        system.add_neuron(Neuron("b"))
+        for synapse in synapses:
+            system.add_synapse(synapse)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            system.run(5)
+        systems.append(system)
+
+    parallel, weighted = systems
+    assert weighted.spike_history == parallel.spike_history
+    assert weighted.neurons["b"].spike_count == 2 * 2 * 3
+    model = compile_system(parallel)
+    assert model.num_synapses == 1 and model.weights.tolist() == [3]
+
+def test_snps_synapse_weights_survive_compile_and_edits(tmp_path):
+    from src.parser import SNPSFormatError, parse_snps
+
+    file_path = tmp_path / "weighted.snps"
+    file_path.write_text("*N\nA 3 0 1 1 1 0 1\nB 0 0 0\nC 0 0 0\n*S\nA B 2\nA C\nA B\n")
+    model = parse_snps(str(file_path))
+    assert model.indices.tolist() == [1, 2] and model.weights.tolist() == [3, 1]
+
+    system = SNSystem(engine="numpy")
+    system.load_from_file(str(file_path))
+    system.save_compiled(str(tmp_path / "model"))
+    system.load_compiled(str(tmp_path / "model"))
+    assert system.model.weights.tolist() == [3, 1]
+
+    system.add_synapse(Synapse("B", "C", 4))
+    system.remove_synapse("A", "B")
+    assert system.model.weights.tolist() == [1, 4]
+    system.run(4)
+    assert system.neurons["C"].spike_count == 3
+
+    file_path.write_text("*N\nA 1 0 0\nB 0 0 0\n*S\nA B 0\n")
+    with pytest.raises(SNPSFormatError):
+        parse_snps(str(file_path))